@@ -1,58 +1,155 @@
 import os
 import json
+import hashlib
 import pandas as pd
 from datetime import datetime
 from openai import OpenAI
 import re
+from concurrent.futures import ThreadPoolExecutor
+from table_store import schema_of, column_types_of
+from relationship_candidates import generate_candidates, cluster_candidates, resolve_relationships, type_family
+from llm_structured import structured_call, batched_call, RELATIONSHIPS_SCHEMA
 
 client = OpenAI(api_key="OpenAiApikey")
 
 
-def predict_relationships(table_schemas):
+RELATIONSHIP_WORKERS = 4
+# candidates this strong are kept even when their cluster's prompt fails
+FALLBACK_SCORE = 4
+
+
+def strong_key_matches(candidates):
+    """Candidates kept without asking the LLM: directed key matches with a high score"""
+
+    return [
+        dict({k: c[k] for k in ("FromTable", "FromColumn", "ToTable", "ToColumn")},
+             Cardinality="ManyToOne", CrossFilterDirection="Both", Active=True)
+        for c in candidates if c["directed"] and c["score"] >= FALLBACK_SCORE
+    ]
+
+
+def local_relationships(table_schemas, column_types=None):
+    """LLM-free relationships from the strong key matches alone"""
+
+    candidates = generate_candidates(table_schemas, column_types)
+    relationships, _ = resolve_relationships(strong_key_matches(candidates), candidates)
+    return relationships
+
+
+RELATIONSHIP_RULES = """
+- Only use pairs from the candidate list
+- "To" is the lookup (one) side, "From" is the many side; swap them if needed
+- Avoid circular relationships and several paths between the same tables"""
+
+
+def _cluster_tables(cluster):
+    return sorted({c["FromTable"] for c in cluster} | {c["ToTable"] for c in cluster})
+
+
+def _cluster_pairs(cluster):
+    return [
+        {k: c[k] for k in ("FromTable", "FromColumn", "ToTable", "ToColumn")} for c in cluster
+    ]
+
+
+def _predict_cluster(cluster, failed):
+    tables = _cluster_tables(cluster)
+    pairs = _cluster_pairs(cluster)
 
     prompt = f"""
 You are a Power BI data modeling expert.
-Based on the below table schemas, predict the best possible Power BI relationships.
+Below are candidate join columns between the tables {", ".join(tables)},
+found by matching key-like column names. Pick the pairs that are real relationships.
 
-Rules:
-- Prefer primary key -> foreign key patterns
-- Match by column name similarity
-- Prefer ID / Key columns
-- Avoid circular relationships
+Rules:{RELATIONSHIP_RULES}
 - Return ONLY VALID JSON in this format:
 
-[
-  {{
-    "FromTable": "",
-    "FromColumn": "",
-    "ToTable": "",
-    "ToColumn": "",
-    "Cardinality": "OneToMany",
-    "CrossFilterDirection": "Both",
-    "Active": true
-  }}
-]
-
-TABLE SCHEMA:
-{json.dumps(table_schemas)}
+{{
+  "relationships": [
+    {{
+      "FromTable": "",
+      "FromColumn": "",
+      "ToTable": "",
+      "ToColumn": "",
+      "Cardinality": "ManyToOne",
+      "CrossFilterDirection": "Both",
+      "Active": true
+    }}
+  ]
+}}
+
+CANDIDATE PAIRS:
+{json.dumps(pairs)}
 """
 
-    response = client.responses.create(
-        model="gpt-5-nano",
-        input=prompt
-    )
+    try:
+        result = structured_call(client, "relationships", prompt, RELATIONSHIPS_SCHEMA, "relationships")
+        return result["relationships"]
+    except Exception as e:
+        print(f"⚠️ Relationship prompt for {', '.join(tables)} failed ({e}); keeping strong key matches")
+        failed.append(tables)
+        return strong_key_matches(cluster)
 
-    text = response.output_text.strip()
 
-    try:
-        json_match = re.search(r"\[.*\]", text, re.S)
-        if json_match:
-            return json.loads(json_match.group())
-        return []
-    except:
-        print("⚠️ Could not parse relationship JSON")
+def _batch_prompt(batch):
+    clusters = "\n".join(f"CLUSTER {i}: {pairs}" for i, pairs in batch.items())
+    return f"""
+You are a Power BI data modeling expert.
+Each cluster below lists candidate join columns between a few tables, found by matching
+key-like column names. The clusters are independent: for each one, pick the pairs that
+are real relationships and return them as that cluster's result.
+
+Rules:{RELATIONSHIP_RULES}
+- Cardinality is usually ManyToOne, CrossFilterDirection Both, Active true
+
+{clusters}
+"""
+
+
+def predict_relationships(table_schemas, column_types=None, stats=None):
+    """Prunes column pairs locally, then asks the LLM about each connected cluster in parallel.
+    stats["failed_clusters"] counts clusters that fell back to the strong key matches"""
+
+    stats = {} if stats is None else stats
+    stats["failed_clusters"] = 0
+    candidates = generate_candidates(table_schemas, column_types, stats)
+
+    print(
+        f"🔎 Relationship candidates: {stats['all_pairs']} column pairs, "
+        f"{stats['key_like_columns']} key-like columns, "
+        f"{stats['name_index_pairs']} name matches, "
+        f"{stats['type_compatible_pairs']} type-compatible with a key side"
+    )
+
+    if not candidates:
         return []
 
+    clusters = cluster_candidates(candidates)
+    print(f"🧩 {len(clusters)} cluster prompt(s), largest {max(len(c) for c in clusters)} pairs")
+
+    # small clusters share a request; big ones and unanswered ones get their own
+    answered, single = batched_call(
+        client, "relationships",
+        {i: json.dumps(_cluster_pairs(c)) for i, c in enumerate(clusters)},
+        _batch_prompt, RELATIONSHIPS_SCHEMA, "relationships",
+    )
+    by_cluster = {i: result["relationships"] for i, result in answered.items()}
+    failed = []
+    if single:
+        with ThreadPoolExecutor(max_workers=min(RELATIONSHIP_WORKERS, len(single))) as pool:
+            by_cluster.update(zip(single, pool.map(
+                lambda c: _predict_cluster(c, failed), [clusters[i] for i in single]
+            )))
+    stats["failed_clusters"] = len(failed)
+    proposed = [r for i in range(len(clusters)) for r in by_cluster.get(i, [])]
+
+    relationships, demoted = resolve_relationships(proposed, candidates)
+    print(
+        f"🔗 {len(proposed)} proposed, {len(relationships)} kept, "
+        f"{demoted} set inactive to avoid ambiguous paths"
+    )
+    return relationships
+
 
 def map_dtype_to_tmdl(dtype):
     dtype = str(dtype).lower()
@@ -64,7 +161,186 @@ def map_dtype_to_tmdl(dtype):
     return "string"
 
 
-def build_tmdl_with_relationships(dataframes_dict, metadata):
+def dax_for_table(dax, kind, table):
+    """Translated DAX items of one kind ('measures' / 'calculated_columns') that belong to a table"""
+
+    if not dax:
+        return []
+    return [
+        item for item in dax.get(kind, [])
+        if item.get("expression") and str(item["table"]).lower() == str(table).lower()
+    ]
+
+
+TMDL_DIR = "TMDL_Model"
+BIM_FILE = "FEX_Semantic_Model.bim"
+MANIFEST_FILE = os.path.join(TMDL_DIR, "manifest.json")
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def schema_hash(table_schemas):
+    return content_hash(json.dumps(
+        {str(t): [str(c) for c in cols] for t, cols in table_schemas.items()}, sort_keys=True
+    ))
+
+
+def write_atomic(path, text):
+    """Writes next to the target and renames, so readers never see a half-written file"""
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def load_manifest(path=MANIFEST_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def relationships_key(table_schemas, column_types=None):
+    """Cache key of a relationship prediction: column names and their type families"""
+
+    column_types = column_types or {}
+    return content_hash(json.dumps({
+        str(t): {str(c): type_family(column_types.get(t, {}).get(c)) for c in cols}
+        for t, cols in table_schemas.items()
+    }, sort_keys=True))
+
+
+def relationships_for(table_schemas, manifest=None, column_types=None, local_only=False, stats=None):
+    """Relationships from the last build when the schemas are unchanged, else a fresh prediction.
+    stats["reusable"] is False for results a later run should predict again: empty,
+    LLM-free (local_only) or partly failed predictions"""
+
+    stats = {} if stats is None else stats
+    manifest = load_manifest() if manifest is None else manifest
+    if manifest.get("relationships") and manifest.get("relationships_key") == relationships_key(
+        table_schemas, column_types
+    ):
+        print("♻️ Schemas unchanged since the last build, reusing its relationships")
+        stats["reusable"] = True
+        return manifest["relationships"]
+    if local_only:
+        stats["reusable"] = False
+        return local_relationships(table_schemas, column_types)
+    relationships = predict_relationships(table_schemas, column_types, stats)
+    stats["reusable"] = bool(relationships) and not stats["failed_clusters"]
+    return relationships
+
+
+def _relationship_name(r):
+    return f"{r['FromTable']}_{r['FromColumn']}_to_{r['ToTable']}_{r['ToColumn']}"
+
+
+def render_model_tmdl(model_name, relationships, generated_on):
+    lines = [
+        "Model:",
+        f"  Name: {model_name}",
+        "  Culture: en-US",
+        "  CompatibilityLevel: 1560",
+        "",
+        "  Annotations:",
+        "  - Name: GeneratedBy",
+        '    Value: "FEX Analysis Agent"',
+        "  - Name: GeneratedOn",
+        f'    Value: "{generated_on}"',
+    ]
+
+    if relationships:
+        lines += ["", "  Relationships:"]
+        for r in relationships:
+            lines += [
+                "",
+                f"  - Name: {_relationship_name(r)}",
+                f"    FromTable: {r['FromTable']}",
+                f"    FromColumn: {r['FromColumn']}",
+                f"    ToTable: {r['ToTable']}",
+                f"    ToColumn: {r['ToColumn']}",
+                f"    Cardinality: {r['Cardinality']}",
+                f"    CrossFilterDirection: {r['CrossFilterDirection']}",
+                f"    IsActive: {str(r['Active']).lower()}",
+            ]
+
+    return "\n".join(lines)
+
+
+def render_table_tmdl(table, column_types, dax=None):
+    """column_types maps each column to its TMDL data type"""
+
+    lines = ["Table:", f"  Name: {table}", "  Columns:"]
+
+    for col, data_type in column_types.items():
+        lines += [f"  - Name: {col}", f"    DataType: {data_type}"]
+
+    for c in dax_for_table(dax, "calculated_columns", table):
+        lines += [
+            f"  - Name: {c['name']}",
+            f"    DataType: {c['data_type']}",
+            "    Type: calculated",
+            f"    Expression: {c['expression']}",
+        ]
+        if c.get("format_string"):
+            lines.append(f"    FormatString: {c['format_string']}")
+
+    measures = dax_for_table(dax, "measures", table)
+    if measures:
+        lines.append("  Measures:")
+    for m in measures:
+        lines += [f"  - Name: {m['name']}", f"    Expression: {m['expression']}"]
+        if m.get("format_string"):
+            lines.append(f"    FormatString: {m['format_string']}")
+        if m.get("description"):
+            lines.append(f"    Description: {m['description']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def bim_table(table, column_types, dax=None):
+    t = {
+        "name": table,
+        "columns": [
+            {"name": col, "dataType": data_type} for col, data_type in column_types.items()
+        ]
+    }
+
+    for c in dax_for_table(dax, "calculated_columns", table):
+        column = {
+            "type": "calculated",
+            "name": c["name"],
+            "dataType": c["data_type"],
+            "expression": c["expression"]
+        }
+        if c.get("format_string"):
+            column["formatString"] = c["format_string"]
+        t["columns"].append(column)
+
+    measures = []
+    for m in dax_for_table(dax, "measures", table):
+        measure = {
+            "name": m["name"],
+            "expression": m["expression"],
+            "description": m.get("description", "")
+        }
+        if m.get("format_string"):
+            measure["formatString"] = m["format_string"]
+        measures.append(measure)
+
+    if measures:
+        t["measures"] = measures
+    return t
+
+
+def build_tmdl_with_relationships(dataframes_dict, metadata, relationships=None, dax=None, confirm=True,
+                                  reusable=False):
+    """reusable marks caller-supplied relationships as a complete prediction that later
+    builds of the same schema may reuse without asking the LLM again"""
 
     if not dataframes_dict:
         print("❌ No tables received. Cannot build TMDL")
@@ -72,69 +348,68 @@ def build_tmdl_with_relationships(dataframes_dict, metadata):
 
     model_name = metadata.get("report_name", "FEX_Semantic_Model")
 
-    schema_dict = {table: list(df.columns) for table, df in dataframes_dict.items()}
-    relationships = predict_relationships(schema_dict)
+    manifest = load_manifest()
+    files = manifest.get("files", {})
+    # schemas and dtypes only: a TableStore answers both without rehydrating spilled tables
+    schema_dict = schema_of(dataframes_dict)
+    current_schema = schema_hash(schema_dict)
+    column_types = {
+        table: {col: map_dtype_to_tmdl(dtype) for col, dtype in types.items()}
+        for table, types in column_types_of(dataframes_dict).items()
+    }
+    current_key = relationships_key(schema_dict, column_types)
+
+    # relationships may already have been predicted in the background by the caller
+    if relationships is None:
+        stats = {}
+        relationships = relationships_for(schema_dict, manifest, column_types, stats=stats)
+        reusable = stats["reusable"]
+
+    reused = (
+        bool(relationships)
+        and manifest.get("relationships_key") == current_key
+        and relationships == manifest.get("relationships")
+    )
 
     if not relationships:
         print("\n⚠️ No relationships predicted.")
+    elif reused:
+        print(f"\n♻️ Keeping the {len(relationships)} relationships applied in the last build")
     else:
         print("\n🔮 Predicted Relationships:")
         for r in relationships:
             print(f"  {r['FromTable']}.{r['FromColumn']}  --->  {r['ToTable']}.{r['ToColumn']}")
 
-        confirm = input("\n❓ Do you want to apply these relationships? (yes/no): ").strip().lower()
-        if confirm not in ["yes", "y"]:
-            relationships = []
+        if confirm:
+            answer = input("\n❓ Do you want to apply these relationships? (yes/no): ").strip().lower()
+            if answer not in ["yes", "y"]:
+                relationships = []
+                reusable = False
 
     print("\n🏗️ Generating TMDL + BIM Models...")
-    os.makedirs("TMDL_Model/Tables", exist_ok=True)
-
-    model_tmdl = f"""
-Model:
-  Name: {model_name}
-  Culture: en-US
-  CompatibilityLevel: 1560
-
-  Annotations:
-  - Name: GeneratedBy
-    Value: "FEX Analysis Agent"
-  - Name: GeneratedOn
-    Value: "{datetime.now()}"
-"""
-
-    if relationships:
-        model_tmdl += "\n  Relationships:\n"
-        for r in relationships:
-            model_tmdl += f"""
-  - Name: {r['FromTable']}_{r['FromColumn']}_to_{r['ToTable']}_{r['ToColumn']}
-    FromTable: {r['FromTable']}
-    FromColumn: {r['FromColumn']}
-    ToTable: {r['ToTable']}
-    ToColumn: {r['ToColumn']}
-    Cardinality: {r['Cardinality']}
-    CrossFilterDirection: {r['CrossFilterDirection']}
-    IsActive: {str(r['Active']).lower()}
-"""
-
-    with open("TMDL_Model/model.tmd", "w", encoding="utf-8") as f:
-        f.write(model_tmdl.strip())
-
-
-    for table, df in dataframes_dict.items():
-        os.makedirs(f"TMDL_Model/Tables/{table}", exist_ok=True)
-
-        table_def = "Table:\n"
-        table_def += f"  Name: {table}\n"
-        table_def += "  Columns:\n"
-
-        for col in df.columns:
-            dtype = map_dtype_to_tmdl(df[col].dtype)
-            table_def += f"  - Name: {col}\n"
-            table_def += f"    DataType: {dtype}\n"
-
-        with open(f"TMDL_Model/Tables/{table}/table.tmd", "w", encoding="utf-8") as f:
-            f.write(table_def)
-
+    os.makedirs(os.path.join(TMDL_DIR, "Tables"), exist_ok=True)
+
+    new_files = {}
+    written, unchanged = [], 0
+
+    def write_if_changed(rel_path, text, key_text=None):
+        nonlocal unchanged
+        path = os.path.join(TMDL_DIR, rel_path) if rel_path != BIM_FILE else BIM_FILE
+        digest = content_hash(text if key_text is None else key_text)
+        new_files[rel_path] = digest
+        if files.get(rel_path) == digest and os.path.exists(path):
+            unchanged += 1
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        write_atomic(path, text)
+        written.append(rel_path)
+
+    # the timestamp is left out of the hash so an unchanged model keeps its file
+    write_if_changed(
+        "model.tmd",
+        render_model_tmdl(model_name, relationships, datetime.now()),
+        key_text=render_model_tmdl(model_name, relationships, ""),
+    )
 
     bim = {
         "name": model_name,
@@ -144,41 +419,57 @@ Model:
         }
     }
 
-    for table, df in dataframes_dict.items():
-        t = {
-            "name": table,
-            "columns": []
-        }
-
-        for col in df.columns:
-            t["columns"].append({
-                "name": col,
-                "dataType": map_dtype_to_tmdl(df[col].dtype)
-            })
-
-        bim["model"]["tables"].append(t)
-
+    for table, types in column_types.items():
+        write_if_changed(f"Tables/{table}/table.tmd", render_table_tmdl(table, types, dax))
+        bim["model"]["tables"].append(bim_table(table, types, dax))
 
     if relationships:
-        bim_relationships = []
-
-        for r in relationships:
-            bim_relationships.append({
-                "name": f"{r['FromTable']}_{r['FromColumn']}_to_{r['ToTable']}_{r['ToColumn']}",
+        bim["model"]["relationships"] = [
+            {
+                "name": _relationship_name(r),
                 "fromTable": r["FromTable"],
                 "fromColumn": r["FromColumn"],
                 "toTable": r["ToTable"],
                 "toColumn": r["ToColumn"],
-                "crossFilteringBehavior": "bothDirections",
+                "crossFilteringBehavior": "bothDirections" if r["CrossFilterDirection"] == "Both" else "oneDirection",
                 "isActive": r["Active"]
-            })
-
-        bim["model"]["relationships"] = bim_relationships
-
-
-    with open("FEX_Semantic_Model.bim", "w") as f:
-        json.dump(bim, f, indent=4)
+            }
+            for r in relationships
+        ]
+
+    write_if_changed(BIM_FILE, json.dumps(bim, indent=4))
+
+    # tables dropped since the last build
+    for rel_path in set(files) - set(new_files):
+        path = os.path.join(TMDL_DIR, rel_path)
+        if os.path.exists(path):
+            os.remove(path)
+            written.append(f"{rel_path} (removed)")
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+
+    write_atomic(MANIFEST_FILE, json.dumps({
+        "model_name": model_name,
+        "schema_hash": current_schema,
+        "relationships": relationships,
+        # only a complete, applied prediction is reused by the next build
+        "relationships_key": current_key if relationships and (reusable or reused) else None,
+        "files": new_files,
+    }, indent=2))
+
+    if dax:
+        placed = sum(
+            len(dax_for_table(dax, kind, table))
+            for kind in ("measures", "calculated_columns") for table in dataframes_dict
+        )
+        print(f"\n🧮 DAX objects written: {placed}")
+
+    print(f"\n📝 {len(written)} file(s) rewritten, {unchanged} unchanged")
+    for rel_path in written:
+        print(f"  • {rel_path}")
 
     print("\n🎯 TMDL + BIM Generated Successfully!")
-    print("📁 Output Folder: TMDL_Model")
-    print("📄 BIM File: FEX_Semantic_Model.bim\n")
+    print(f"📁 Output Folder: {TMDL_DIR}")
+    print(f"📄 BIM File: {BIM_FILE}\n")
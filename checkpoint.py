@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import shutil
+import threading
+import hashlib
+
+import pandas as pd
+
+from table_store import TableStore, HAS_PYARROW
+
+
+RUNS_DIR = ".fexa_runs"
+STATE_FILE = "state.json"
+
+# pipeline order; each fingerprint includes the outputs it was built from, so a
+# changed stage invalidates everything after it
+STAGES = ["source", "metadata", "tables", "schema", "relationships", "tmdl", "pbix"]
+
+
+def fingerprint(*parts):
+    """Stable hash of JSON-able inputs, used as the cache key of a stage"""
+
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(paths):
+    """Files are keyed by path, size and mtime: cheap enough for 1 GB extracts"""
+
+    out = []
+    for path in paths:
+        st = os.stat(path)
+        out.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    return fingerprint(out)
+
+
+def content_fingerprint(paths):
+    """Hash of the files' bytes, None when one is missing; for small shared outputs
+    (the TMDL manifest) that another FEX's build can overwrite in place"""
+
+    digest = hashlib.sha256()
+    for path in paths:
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _write_json(path, value):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(value, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+class RunCheckpoint:
+    """Stage outputs of one FEX run, stored under RUNS_DIR/<fex fingerprint>"""
+
+    def __init__(self, fex_content, runs_dir=RUNS_DIR):
+        self.run_id = fingerprint(fex_content)[:16]
+        self.path = os.path.join(runs_dir, self.run_id)
+        self.state_path = os.path.join(self.path, STATE_FILE)
+        os.makedirs(self.path, exist_ok=True)
+        self.state = self._load_state()
+        self.reused = []
+        self._lock = threading.Lock()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring unreadable checkpoint state {self.state_path}: {e}")
+        return {}
+
+    def completed(self):
+        return [s for s in STAGES if s in self.state]
+
+    def reset(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+        self.state = {}
+
+    def _output(self, stage):
+        return os.path.join(self.path, f"{stage}.json")
+
+    def valid(self, stage, fp, outputs=None):
+        """outputs, when given, must match what the stage recorded for its files on disk"""
+
+        entry = self.state.get(stage)
+        if entry is None or entry["fingerprint"] != fp:
+            return False
+        return outputs is None or entry.get("outputs") == outputs
+
+    def outputs(self, stage):
+        return (self.state.get(stage) or {}).get("outputs") or {}
+
+    def load(self, stage, fp):
+        """The stage's saved output when its fingerprint still matches, else None"""
+
+        if not self.valid(stage, fp):
+            return None
+        path = self._output(stage)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+        self.reused.append(stage)
+        print(f"♻️ {stage}: reused from checkpoint")
+        return value
+
+    def save(self, stage, fp, value=None, outputs=None):
+        if value is not None:
+            _write_json(self._output(stage), value)
+        # stages finish on different graph threads
+        with self._lock:
+            self.state[stage] = {"fingerprint": fp, "completed_at": time.time(), "outputs": outputs}
+            _write_json(self.state_path, self.state)
+
+    def stage(self, name, fp, compute):
+        """Returns the checkpointed output of a stage, running compute() only when it is stale"""
+
+        value = self.load(name, fp)
+        if value is None:
+            value = compute()
+            self.save(name, fp, value)
+        return value
+
+    def mark(self, stage, fp, outputs):
+        """Records a stage whose output lives outside the run directory (TMDL folder, PBIX).
+        Those files are shared by every FEX, so outputs fingerprints them as written"""
+
+        self.save(stage, fp, outputs=outputs)
+
+    # ---------- table data ----------
+
+    def _tables_dir(self):
+        return os.path.join(self.path, "tables")
+
+    def save_tables(self, fp, tables):
+        if not HAS_PYARROW:
+            return
+        out = self._tables_dir()
+        shutil.rmtree(out, ignore_errors=True)
+        os.makedirs(out)
+        names = list(tables)
+        for i, name in enumerate(names):
+            tables[name].to_parquet(os.path.join(out, f"{i}.parquet"), index=False)
+        self.save("tables", fp, names)
+
+    def load_tables(self, fp):
+        names = self.load("tables", fp) if HAS_PYARROW else None
+        if names is None:
+            return None
+        store = TableStore()
+        for i, name in enumerate(names):
+            store[name] = pd.read_parquet(os.path.join(self._tables_dir(), f"{i}.parquet"))
+        return store
+
+    def report(self):
+        done = self.completed()
+        print(f"\n💾 Checkpoints ({self.path}): {', '.join(done) or 'none'}")
+        if self.reused:
+            print(f"  reused this run: {', '.join(self.reused)}")
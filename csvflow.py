@@ -4,21 +4,98 @@ import json
 import openpyxl
 import chardet
 import csv
+import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from table_store import TableStore, HAS_PYARROW, schema_of
+from fex_projection import referenced_columns, project_columns, describe_projection
+from report_writer import write_report
 
 
-def smart_read_csv(path):
+if HAS_PYARROW:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+# Arrow reports undecodable bytes as ArrowInvalid
+DECODE_ERRORS = (UnicodeDecodeError, pa.ArrowInvalid) if HAS_PYARROW else (UnicodeDecodeError,)
+
+CSV_WORKERS = min(8, os.cpu_count() or 1)
+# files at least this big go through the block-parallel Arrow reader
+ARROW_MIN_BYTES = 64 * 1024 * 1024
+ARROW_BLOCK_SIZE = 16 * 1024 * 1024
+# chardet on a whole 1 GB extract takes longer than parsing it
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+
+
+def detect_format(path, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """Encoding and dialect of a CSV; sample_bytes=None sniffs the encoding on the whole file"""
+
     with open(path, 'rb') as f:
-        enc = chardet.detect(f.read())['encoding']
+        enc = chardet.detect(f.read(sample_bytes or -1))['encoding'] or "utf-8"
+    # an all-ASCII sample says nothing about the rest of the file; UTF-8 is a superset
+    if enc.lower() == "ascii":
+        enc = "utf-8"
 
     with open(path, 'r', encoding=enc) as f:
         sample = f.read(4096)
-        f.seek(0)
         dialect = csv.Sniffer().sniff(sample)
 
-    print(f"Detected Encoding: {enc} | Delimiter: {dialect.delimiter}")
+    return enc, dialect
+
+
+def read_csv_arrow(path, enc, dialect, usecols=None):
+    """Multithreaded Arrow parse; strings come back Arrow-backed, dates stay text as with pandas"""
+
+    table = pa_csv.read_csv(
+        path,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE, encoding=enc),
+        parse_options=pa_csv.ParseOptions(delimiter=dialect.delimiter, quote_char=dialect.quotechar or False),
+        convert_options=pa_csv.ConvertOptions(include_columns=usecols, strings_can_be_null=True),
+    )
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_temporal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+
+    strings = pd.StringDtype("pyarrow")
+    return table.to_pandas(
+        types_mapper={pa.string(): strings, pa.large_string(): strings}.get,
+        self_destruct=True,
+        split_blocks=True,
+    )
+
+
+def smart_read_csv(path, refs=None, table_name=None):
+    enc, dialect = detect_format(path)
+    try:
+        return _read_csv(path, enc, dialect, refs, table_name)
+    except DECODE_ERRORS as e:
+        if os.path.getsize(path) <= ENCODING_SAMPLE_BYTES:
+            raise
+        # the sampled head didn't represent the file: detect on all of it, and when that
+        # still says the encoding that just failed, read it as Windows-1252
+        print(f"⚠️ {os.path.basename(path)}: {e}; detecting the encoding on the whole file")
+        full_enc, _ = detect_format(path, None)
+        return _read_csv(path, full_enc if full_enc != enc else "cp1252", dialect, refs, table_name)
+
+
+def _read_csv(path, enc, dialect, refs=None, table_name=None):
+
+    usecols = None
+    if refs is not None:
+        header = pd.read_csv(path, encoding=enc, delimiter=dialect.delimiter, nrows=0).columns
+        usecols = project_columns(refs, table_name, header)
+        describe_projection(table_name, usecols, header)
+
+    use_arrow = HAS_PYARROW and os.path.getsize(path) >= ARROW_MIN_BYTES
+    print(f"Detected Encoding: {enc} | Delimiter: {dialect.delimiter} | Reader: {'arrow' if use_arrow else 'pandas'}")
+
+    if use_arrow:
+        return read_csv_arrow(path, enc, dialect, usecols)
 
-    return pd.read_csv(path, encoding=enc, delimiter=dialect.delimiter, low_memory=False)
+    return pd.read_csv(
+        path, encoding=enc, delimiter=dialect.delimiter, low_memory=False, usecols=usecols
+    )
 
 
 def infer_dtype(series):
@@ -37,30 +114,42 @@ def infer_dtype(series):
     return "string"
 
 
-def semantic_csv_analysis(csv_df, metadata_columns):
+def source_dtypes(tables, columns):
+    """infer_dtype of the given columns, reading one table at a time so a TableStore
+    rehydrates only the tables that hold them"""
+
+    dtype_map = {}
+    for table, cols in schema_of(tables).items():
+        wanted = [c for c in cols if c in columns and c not in dtype_map]
+        if not wanted:
+            continue
+        df = tables[table]
+        for c in wanted:
+            dtype_map[c] = infer_dtype(df[c])
+    return dtype_map
+
+
+def semantic_csv_analysis(source, metadata_columns):
+    """source is one DataFrame or a table mapping (dict or TableStore)"""
+
     print("\n🧠 Performing Semantic Relationship & Metadata Compatibility Analysis...")
 
     if not metadata_columns:
         print("⚠️ No metadata output columns found. Skipping semantic analysis.")
         return pd.DataFrame()
 
+    tables = {"": source} if isinstance(source, pd.DataFrame) else source
     rows = []
-    source_cols = list(csv_df.columns)
-
-    dtype_map = {}
-    for c in source_cols:
-        dtype_map[c] = infer_dtype(csv_df[c])
+    source_cols = list(dict.fromkeys(c for cols in schema_of(tables).values() for c in cols))
 
     for meta_col in metadata_columns:
         best_match = None
         match_type = "None"
-        dtype_match = "Unknown"
 
         for col in source_cols:
             if col.lower() == meta_col.lower():
                 best_match = col
                 match_type = "Exact"
-                dtype_match = dtype_map[col]
                 break
 
         if best_match is None:
@@ -69,16 +158,19 @@ def semantic_csv_analysis(csv_df, metadata_columns):
                         col.replace("_", "").replace(" ", "").lower():
                     best_match = col
                     match_type = "Semantic"
-                    dtype_match = dtype_map[col]
                     break
 
         rows.append({
             "Metadata Column": meta_col,
             "Matched Source Column": best_match if best_match else "Not Found",
             "Match Type": match_type,
-            "Detected Data Type": dtype_match,
         })
 
+    # only matched columns need their data type, and only their tables are read
+    dtype_map = source_dtypes(tables, {r["Matched Source Column"] for r in rows if r["Match Type"] != "None"})
+    for r in rows:
+        r["Detected Data Type"] = dtype_map.get(r["Matched Source Column"], "Unknown")
+
     result_df = pd.DataFrame(rows)
 
     print("\n📊 Semantic Relationship Result:")
@@ -87,14 +179,12 @@ def semantic_csv_analysis(csv_df, metadata_columns):
     return result_df
 
 
-def handle_csv_flow(fex_content, metadata, metadata_df):
+def prompt_csv_paths():
 
     print("\n📂 CSV Mode Selected")
     print("You can provide SINGLE or MULTIPLE CSV files.")
     print("Enter file paths separated by comma (,)\n")
 
-    tables_dict = {}
-
     while True:
         paths = input("Enter CSV file path(s): ").strip()
         csv_files = [p.strip() for p in paths.split(",")]
@@ -104,25 +194,47 @@ def handle_csv_flow(fex_content, metadata, metadata_df):
             print(f"❌ These files do not exist:\n{missing}")
             continue
 
-        try:
-            for f in csv_files:
-                print(f"\n📥 Loading: {f}")
-                df = smart_read_csv(f)
-                print(f"👍 Loaded {len(df)} rows, {len(df.columns)} columns")
+        return csv_files
 
-                table_name = os.path.splitext(os.path.basename(f))[0]
-                tables_dict[table_name] = df
 
-            break
+def _load_one(path, refs):
+    table_name = os.path.splitext(os.path.basename(path))[0]
+    started = time.perf_counter()
+    df = smart_read_csv(path, refs, table_name)
+    elapsed = time.perf_counter() - started
+    size_mb = os.path.getsize(path) / 1048576
+    print(
+        f"👍 Loaded {table_name}: {len(df)} rows, {len(df.columns)} columns, "
+        f"{size_mb:.1f} MB in {elapsed:.2f}s ({size_mb / max(elapsed, 1e-6):.1f} MB/s)"
+    )
+    return table_name, df
 
-        except Exception as e:
-            print(f"❌ Failed to process CSV files: {e}")
-            continue
 
+def load_csv_tables(csv_files, refs=None, memory_budget_mb=None):
+
+    tables_dict = TableStore(memory_budget_mb)
+    total_mb = sum(os.path.getsize(f) for f in csv_files) / 1048576
+
+    print(f"\n📥 Loading {len(csv_files)} CSV file(s), {total_mb:.1f} MB")
+    started = time.perf_counter()
 
-    csv_data = pd.concat(list(tables_dict.values()), ignore_index=True, sort=False)
+    # files load concurrently; the parsers release the GIL, so this scales with cores
+    with ThreadPoolExecutor(max_workers=max(1, min(CSV_WORKERS, len(csv_files)))) as pool:
+        futures = [pool.submit(_load_one, f, refs) for f in csv_files]
+        for future in futures:
+            table_name, df = future.result()
+            tables_dict[table_name] = df
 
-    all_columns = set(csv_data.columns)
+    elapsed = time.perf_counter() - started
+    print(f"⚡ CSV load: {total_mb:.1f} MB in {elapsed:.2f}s ({total_mb / max(elapsed, 1e-6):.1f} MB/s aggregate)")
+
+    return tables_dict
+
+
+def validate_csv_tables(tables_dict, metadata, metadata_df):
+
+    # column names come from the schema: concatenating would rehydrate every spilled table
+    all_columns = {c for cols in schema_of(tables_dict).values() for c in cols}
     source_columns = list(all_columns)
 
     raw_meta_cols = metadata.get("output_columns", []) or []
@@ -164,21 +276,31 @@ def handle_csv_flow(fex_content, metadata, metadata_df):
         })
 
 
-    semantic_df = semantic_csv_analysis(csv_data, metadata_columns)
+    semantic_df = semantic_csv_analysis(tables_dict, metadata_columns)
 
     print("\n💾 Creating consolidated Excel report...")
 
-    with pd.ExcelWriter("FEX_Validation_Report.xlsx", engine="openpyxl") as writer:
+    sheets = [("FEX_Metadata", metadata_df), ("Column_Validation", validation_df)]
+    if not semantic_df.empty:
+        sheets.append(("Semantic_Analysis", semantic_df))
+
+    write_report("FEX_Validation_Report.xlsx", sheets, label="Consolidated Report")
 
-        if metadata_df is not None:
-            metadata_df.to_excel(writer, sheet_name="FEX_Metadata", index=False)
+    any_df = next(iter(tables_dict.values()))
+    return any_df, matched
 
-        validation_df.to_excel(writer, sheet_name="Column_Validation", index=False)
 
-        if not semantic_df.empty:
-            semantic_df.to_excel(writer, sheet_name="Semantic_Analysis", index=False)
+def handle_csv_flow(fex_content, metadata, metadata_df):
 
-    print("✅ Consolidated Excel Generated: FEX_Validation_Report.xlsx")
+    while True:
+        csv_files = prompt_csv_paths()
+        try:
+            tables_dict = load_csv_tables(csv_files, referenced_columns(fex_content, metadata))
+            break
+        except Exception as e:
+            print(f"❌ Failed to process CSV files: {e}")
+            continue
 
-    return csv_data, matched, tables_dict
+    any_df, matched = validate_csv_tables(tables_dict, metadata, metadata_df)
 
+    return any_df, matched, tables_dict
@@ -2,6 +2,9 @@ import pandas as pd
 import os
 import openpyxl
 import numpy as np
+from table_store import TableStore, schema_of
+from fex_projection import referenced_columns, project_columns, describe_projection
+from report_writer import write_report
 
 def infer_dtypes(series):
     s = series.dropna()
@@ -52,7 +55,7 @@ def semantic_excel_analysis(df,metadata_columns):
     return pd.DataFrame(rows)
 
 
-def handle_excel_flow(fex_content, metadata, metadata_df):
+def prompt_excel_path():
     print("\n📘 Excel Mode Selected")
     print("Provide Excel file path (.xlsx)")
 
@@ -61,15 +64,23 @@ def handle_excel_flow(fex_content, metadata, metadata_df):
         if not os.path.exists(excel_path):
             print("❌ File not found. Try again.")
             continue
-        break
+        return excel_path
+
 
+def load_excel_tables(excel_path, refs=None, memory_budget_mb=None):
     print("\n📥 Loading Excel workbook...")
     xls = pd.ExcelFile(excel_path)
-    tables_dict = {}
+    tables_dict = TableStore(memory_budget_mb)
 
     for sheet in xls.sheet_names:
         print(f"\n📄 Reading sheet: {sheet}")
-        df = pd.read_excel(xls, sheet_name=sheet)
+        usecols = None
+        if refs is not None:
+            header = pd.read_excel(xls, sheet_name=sheet, nrows=0).columns
+            usecols = project_columns(refs, sheet, header)
+            describe_projection(sheet, usecols, header)
+
+        df = pd.read_excel(xls, sheet_name=sheet, usecols=usecols)
 
         if df.empty:
             print(f"⚠️ Sheet '{sheet}' is empty. Skipping.")
@@ -78,10 +89,10 @@ def handle_excel_flow(fex_content, metadata, metadata_df):
         tables_dict[sheet] = df
         print(f"👍 Loaded {len(df)} rows, {len(df.columns)} columns")
 
-    if not tables_dict:
-        print("❌ No usable sheets found.")
-        return None, False, {}
+    return tables_dict
+
 
+def validate_excel_tables(tables_dict, metadata, metadata_df):
     raw_meta_cols = metadata.get("output_columns", []) or []
     metadata_columns = []
 
@@ -92,8 +103,8 @@ def handle_excel_flow(fex_content, metadata, metadata_df):
             metadata_columns.append(item)
 
     all_source_columns = set()
-    for df in tables_dict.values():
-        all_source_columns.update(df.columns)
+    for cols in schema_of(tables_dict).values():
+        all_source_columns.update(cols)
 
     print("\n📝 Checking column compatibility...")
     print("Metadata Columns:", metadata_columns)
@@ -123,17 +134,24 @@ def handle_excel_flow(fex_content, metadata, metadata_df):
 
     print("\n💾 Creating Excel validation report...")
 
-    with pd.ExcelWriter("FEX_Excel_Validation_Report.xlsx", engine="openpyxl") as writer:
+    sheets = [("FEX_Metadata", metadata_df), ("Column_Validation", validation_df)]
+    if not semantic_df.empty:
+        sheets.append(("Semantic_Analysis", semantic_df))
 
-        if metadata_df is not None:
-            metadata_df.to_excel(writer, sheet_name="FEX_Metadata", index=False)
+    write_report("FEX_Excel_Validation_Report.xlsx", sheets, label="Excel Validation Report")
 
-        validation_df.to_excel(writer, sheet_name="Column_Validation", index=False)
+    return any_df, matched
 
-        if not semantic_df.empty:
-            semantic_df.to_excel(writer, sheet_name="Semantic_Analysis", index=False)
 
-    print("✅ Excel Validation Report Generated: FEX_Excel_Validation_Report.xlsx")
+def handle_excel_flow(fex_content, metadata, metadata_df):
+    excel_path = prompt_excel_path()
+    tables_dict = load_excel_tables(excel_path, referenced_columns(fex_content, metadata))
+
+    if not tables_dict:
+        print("❌ No usable sheets found.")
+        return None, False, {}
+
+    any_df, matched = validate_excel_tables(tables_dict, metadata, metadata_df)
 
     return any_df, matched, tables_dict
 
@@ -0,0 +1,200 @@
+import re
+import json
+
+from fex_minify import count_tokens
+
+
+CHUNK_TOKEN_TARGET = 3000
+
+REQUEST_START = re.compile(r"^(TABLE|GRAPH|MATCH)\s+FILE\b", re.I)
+DEFINE_START = re.compile(r"^DEFINE\s+FILE\b", re.I)
+JOIN_START = re.compile(r"^JOIN\b", re.I)
+JOIN_END = re.compile(r"^(AS\s+\S+|END)\s*$", re.I)
+JOIN_INLINE_END = re.compile(r"\s(AS\s+\S+|END)\s*$", re.I)
+# RUN also ends a request (and sends it); DEFINE FILE blocks end with END
+REQUEST_END = re.compile(r"^(END|RUN)\s*$", re.I)
+HEADER_FIELD = re.compile(r"^-\*\s*[A-Za-z][\w ]*:")
+
+LIST_FIELDS = [
+    "inputs", "filters", "output_columns", "dependencies",
+    "performance_risks", "recommendations",
+]
+SCALAR_FIELDS = ["report_name", "description", "author", "output_type"]
+METADATA_FIELDS = [
+    "report_name", "description", "author", "inputs", "datasources", "joins",
+    "filters", "output_columns", "output_type", "dependencies",
+    "performance_risks", "recommendations",
+]
+
+
+def _kind(line):
+    if REQUEST_START.match(line):
+        return "request"
+    if DEFINE_START.match(line):
+        return "define"
+    if JOIN_START.match(line) and not re.match(r"^JOIN\s+CLEAR\b", line, re.I):
+        return "join"
+    if line.startswith("-"):
+        return "dm"
+    return None
+
+
+def split_fex_sections(fex_content):
+    """Splits a FEX into header, JOIN, DEFINE, request and Dialogue Manager sections"""
+
+    header = []
+    sections = []
+    current = None
+
+    def close():
+        nonlocal current
+        if current and current["lines"]:
+            sections.append(current)
+        current = None
+
+    for raw in fex_content.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+
+        if HEADER_FIELD.match(line) and not sections and current is None:
+            header.append(line)
+            continue
+
+        if current and current["kind"] in ("request", "define"):
+            # an unterminated request still ends where the next one starts
+            if REQUEST_START.match(line) or DEFINE_START.match(line):
+                close()
+                current = {"kind": _kind(line), "lines": [line]}
+                continue
+            current["lines"].append(line)
+            if REQUEST_END.match(line):
+                close()
+            continue
+
+        kind = _kind(line)
+
+        if current and current["kind"] == "join" and kind not in ("request", "define", "join"):
+            current["lines"].append(line)
+            if JOIN_END.match(line):
+                close()
+            continue
+
+        if kind in ("request", "define", "join"):
+            close()
+            current = {"kind": kind, "lines": [line]}
+            if kind == "join" and JOIN_INLINE_END.search(line):
+                close()
+            continue
+
+        if kind == "dm":
+            if not current or current["kind"] != "dm":
+                close()
+                current = {"kind": "dm", "lines": []}
+            current["lines"].append(line)
+            continue
+
+        # loose statements (JOIN CLEAR, SET leftovers...) travel with whatever is open
+        if current is None:
+            current = {"kind": "other", "lines": []}
+        current["lines"].append(line)
+
+    close()
+    return header, sections
+
+
+def split_fex_requests(fex_content, target_tokens=CHUNK_TOKEN_TARGET):
+    """Groups FEX sections into prompt sized chunks, never splitting a section"""
+
+    header, sections = split_fex_sections(fex_content)
+    header_text = "\n".join(header)
+
+    chunks = []
+    buffer = []
+    buffer_tokens = 0
+
+    for section in sections:
+        text = "\n".join(section["lines"])
+        tokens = count_tokens(text)
+
+        if buffer and buffer_tokens + tokens > target_tokens:
+            chunks.append(buffer)
+            buffer, buffer_tokens = [], 0
+
+        buffer.append(text)
+        buffer_tokens += tokens
+
+    if buffer:
+        chunks.append(buffer)
+
+    return [
+        "\n".join(([header_text] if header_text else []) + parts)
+        for parts in chunks
+    ]
+
+
+def count_requests(fex_content):
+    _, sections = split_fex_sections(fex_content)
+    return sum(1 for s in sections if s["kind"] == "request")
+
+
+def _key(value):
+    if isinstance(value, str):
+        return value.strip().lower()
+    return json.dumps(value, sort_keys=True).lower()
+
+
+def _union(target, values, seen):
+    for v in values or []:
+        k = _key(v)
+        if k not in seen:
+            seen.add(k)
+            target.append(v)
+
+
+def merge_metadata(parts):
+    """Merges per-chunk metadata in chunk order so the result never depends on timing"""
+
+    merged = {field: "" for field in SCALAR_FIELDS}
+    merged["datasources"] = []
+    merged["joins"] = []
+    for field in LIST_FIELDS:
+        merged[field] = []
+
+    datasources = {}
+    joins = {}
+    seen = {field: set() for field in LIST_FIELDS}
+
+    for part in parts:
+        for field in SCALAR_FIELDS:
+            if not merged[field] and part.get(field):
+                merged[field] = part[field]
+
+        for ds in part.get("datasources", []) or []:
+            if not isinstance(ds, dict) or not ds.get("table_name"):
+                continue
+            k = ds["table_name"].strip().lower()
+            if k not in datasources:
+                datasources[k] = dict(ds)
+                merged["datasources"].append(datasources[k])
+            elif ds.get("type") == "explicit":
+                datasources[k]["type"] = "explicit"
+
+        for j in part.get("joins", []) or []:
+            if not isinstance(j, dict):
+                continue
+            k = tuple(
+                str(j.get(f, "")).strip().lower()
+                for f in ("left_table", "left_column", "right_table", "right_column")
+            )
+            if k not in joins:
+                joins[k] = dict(j)
+                merged["joins"].append(joins[k])
+            elif j.get("identified_from") == "explicit":
+                joins[k]["identified_from"] = "explicit"
+                joins[k]["join_type"] = j.get("join_type", joins[k].get("join_type"))
+
+        for field in LIST_FIELDS:
+            _union(merged[field], part.get(field), seen[field])
+
+    return {field: merged[field] for field in METADATA_FIELDS}
@@ -0,0 +1,375 @@
+import re
+
+from fex_parser import parse_fex, parse_expression, column_name, split_field
+from fex_engine import AGGREGATING_VERBS
+
+
+DATE_FORMATS = {
+    "YYMD": "yyyy-mm-dd", "MDYY": "mm/dd/yyyy", "DMYY": "dd/mm/yyyy",
+    "YMD": "yy-mm-dd", "MDY": "mm/dd/yy", "DMY": "dd/mm/yy",
+    "YYM": "yyyy-mm", "MYY": "mm/yyyy", "YY": "yyyy",
+    "HYYMDS": "yyyy-mm-dd hh:nn:ss", "HYYMDM": "yyyy-mm-dd hh:nn",
+}
+NUMERIC_FORMAT = re.compile(r"^([IFDP])(\d+)(?:\.(\d+))?([A-Z%!]*)$", re.I)
+
+DAX_COMPARISONS = {"EQ": "=", "NE": "<>", "GT": ">", "GE": ">=", "LT": "<", "LE": "<="}
+DAX_FUNCTIONS = {"ABS": "ABS", "INT": "TRUNC", "SQRT": "SQRT", "LOG": "LN", "EXP": "EXP"}
+
+# prefix operator -> (DAX aggregation, measure name label)
+DAX_AGGREGATES = {
+    None: ("SUM", "Total"),
+    "SUM": ("SUM", "Total"),
+    "TOT": ("SUM", "Total"),
+    "AVE": ("AVERAGE", "Average"),
+    "MAX": ("MAX", "Max"),
+    "MIN": ("MIN", "Min"),
+    "CNT": ("COUNT", "Count"),
+    "CNT.DST": ("DISTINCTCOUNT", "Distinct Count"),
+}
+
+
+def dax_format(fmt):
+    """FEX display format -> Power BI format string: D12.2 -> #,##0.00, P6.2% -> 0.00"%" """
+
+    if not fmt:
+        return None
+    fmt = fmt.strip().upper()
+
+    if fmt in DATE_FORMATS:
+        return DATE_FORMATS[fmt]
+
+    m = NUMERIC_FORMAT.match(fmt)
+    if not m:
+        return None
+
+    kind, _, decimals, options = m.groups()
+    # D shows thousands separators by default, the others only with the C option
+    comma = kind == "D" or "C" in options
+    pattern = ("#,##0" if comma else "0") + ("." + "0" * int(decimals) if decimals and int(decimals) else "")
+
+    if "M" in options or "N" in options:
+        pattern = "$" + pattern
+    if "%" in options:
+        # FEX appends a literal percent sign, it does not scale by 100
+        pattern += '"%"'
+    if "B" in options:
+        pattern = f"{pattern};({pattern})"
+    return pattern
+
+
+def dax_data_type(fmt, node=None):
+    fmt = (fmt or "").strip().upper()
+    if fmt.startswith("A"):
+        return "string"
+    if fmt in DATE_FORMATS:
+        return "dateTime"
+    if not fmt and node is not None and (node[0] == "str" or (node[0] == "bin" and node[1] == "||")):
+        return "string"
+    return "double"
+
+
+def quote_table(table):
+    return "'" + str(table).replace("'", "''") + "'"
+
+
+def quote_name(name):
+    return "[" + str(name).replace("]", "]]") + "]"
+
+
+def _literal(value):
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return repr(value)
+
+
+def to_dax(node, column_ref, top=True):
+    """Renders a parsed FEX expression as DAX; column_ref maps a FEX field name to a DAX reference"""
+
+    kind = node[0]
+
+    if kind in ("num", "str"):
+        return _literal(node[1])
+    if kind == "col":
+        return column_ref(node[1])
+    if kind == "neg":
+        return "-" + to_dax(node[1], column_ref, top=False)
+
+    if kind == "bin":
+        a, b = to_dax(node[2], column_ref, top=False), to_dax(node[3], column_ref, top=False)
+        op = node[1]
+        if op == "/":
+            # FEX yields 0 when dividing by zero
+            return f"DIVIDE({to_dax(node[2], column_ref)}, {to_dax(node[3], column_ref)}, 0)"
+        if op == "**":
+            return f"POWER({to_dax(node[2], column_ref)}, {to_dax(node[3], column_ref)})"
+        out = f"{a} {'&' if op == '||' else op} {b}"
+        return out if top else f"({out})"
+
+    if kind == "cmp":
+        out = f"{to_dax(node[2], column_ref, top=False)} {DAX_COMPARISONS[node[1]]} {to_dax(node[3], column_ref, top=False)}"
+        return out if top else f"({out})"
+
+    if kind in ("and", "or"):
+        out = f"{to_dax(node[1], column_ref, top=False)} {'&&' if kind == 'and' else '||'} {to_dax(node[2], column_ref, top=False)}"
+        return out if top else f"({out})"
+    if kind == "not":
+        return f"NOT({to_dax(node[1], column_ref)})"
+
+    if kind == "if":
+        return f"IF({to_dax(node[1], column_ref)}, {to_dax(node[2], column_ref)}, {to_dax(node[3], column_ref)})"
+
+    if kind == "call":
+        fn = DAX_FUNCTIONS.get(node[1])
+        if fn is None:
+            raise ValueError(f"FEX function {node[1]} has no DAX translation")
+        return f"{fn}({', '.join(to_dax(arg, column_ref) for arg in node[2])})"
+
+    raise ValueError(f"Unknown expression node {kind}")
+
+
+class DaxTranslator:
+    """Turns the DEFINEs, COMPUTEs and aggregated fields of a FEX into DAX model objects"""
+
+    def __init__(self, schema=None, relationships=None):
+        self.schema = schema or {}
+        self.lookups = self._lookup_paths(relationships or [])
+        self.tables = {str(t).lower(): t for t in self.schema}
+        self.column_home = {}
+        for table, columns in self.schema.items():
+            for col in columns:
+                self.column_home.setdefault(str(col).lower(), table)
+        self.defines = {}
+        self.used_names = set(self.column_home)
+        self.measures = []
+        self.calculated_columns = []
+
+    @staticmethod
+    def _lookup_paths(relationships):
+        """{table: tables reachable toward the one side}, the tables RELATED can read from it"""
+
+        edges = {}
+        for r in relationships:
+            if not r.get("Active", True):
+                continue
+            many, one = str(r["FromTable"]).lower(), str(r["ToTable"]).lower()
+            cardinality = r.get("Cardinality", "ManyToOne")
+            if cardinality in ("ManyToOne", "OneToOne"):
+                edges.setdefault(many, set()).add(one)
+            if cardinality in ("OneToMany", "OneToOne"):
+                edges.setdefault(one, set()).add(many)
+
+        paths = {}
+        for start in edges:
+            seen, stack = set(), [start]
+            while stack:
+                for nxt in edges.get(stack.pop(), ()):
+                    if nxt not in seen:
+                        seen.add(nxt)
+                        stack.append(nxt)
+            paths[start] = seen
+        return paths
+
+    def table_of(self, name):
+        if name is None:
+            return None
+        return self.tables.get(str(name).lower(), name)
+
+    def home_of(self, field, default):
+        table, _, col = field.rpartition(".")
+        if table:
+            return self.table_of(table)
+        if col.lower() in self.defines:
+            return self.defines[col.lower()]["table"]
+        return self.column_home.get(col.lower(), default)
+
+    def unique_name(self, name):
+        candidate = name
+        n = 1
+        while candidate.lower() in self.used_names:
+            n += 1
+            candidate = f"{name} Measure" if n == 2 else f"{name} Measure {n - 1}"
+        self.used_names.add(candidate.lower())
+        return candidate
+
+    def column_dax(self, field, table):
+        return f"{quote_table(table)}{quote_name(column_name(field))}"
+
+    def row_ref(self, home):
+        """Row-context reference: same-table columns directly, one-side tables through RELATED"""
+
+        def ref(field):
+            table = self.home_of(field, home)
+            col = self.column_dax(field, table)
+            if table == home:
+                return col
+            # RELATED only follows many -> one; a many-side column has no single row value
+            if str(table).lower() not in self.lookups.get(str(home).lower(), ()):
+                raise ValueError(f"{col} is not on the one side of a relationship from {quote_table(home)}")
+            return f"RELATED({col})"
+        return ref
+
+    def add_item(self, target, item, source, build):
+        try:
+            node = parse_expression(source["tokens"])
+            item["expression"] = build(node)
+            item["data_type"] = dax_data_type(source["format"], node)
+        except ValueError as e:
+            item["expression"] = None
+            item["description"] = f"Not translated: {e}"
+        target.append(item)
+        return item
+
+    def translate_define(self, define, default_table):
+        home = self.table_of(define.get("file")) or default_table
+        item = {
+            "table": home,
+            "name": define["name"],
+            "format_string": dax_format(define["format"]),
+            "description": define.get("title") or "FEX DEFINE field",
+            "fex_expression": f"{define['name']}/{define['format']} = {define['expression']};"
+            if define["format"] else f"{define['name']} = {define['expression']};",
+        }
+        self.defines[define["name"].lower()] = item
+        self.used_names.add(define["name"].lower())
+        self.add_item(self.calculated_columns, item, define, lambda node: to_dax(node, self.row_ref(home)))
+
+    def aggregate_measure(self, field, home):
+        agg, label = DAX_AGGREGATES.get(field["prefix"], DAX_AGGREGATES[None])
+        if field["verb"] == "COUNT" and not field["prefix"]:
+            agg, label = DAX_AGGREGATES["CNT"]
+
+        table = self.home_of(field["field"], home)
+        expression = f"{agg}({self.column_dax(field['field'], table)})"
+
+        for m in self.measures:
+            if m["expression"] == expression and m["table"] == table:
+                return m
+
+        name = self.unique_name(field["title"] or f"{label} {column_name(field['field'])}")
+        prefixed = f"{field['prefix']}.{field['field']}" if field["prefix"] else field["field"]
+        item = {
+            "table": table,
+            "name": name,
+            "expression": expression,
+            "format_string": dax_format(field["format"]),
+            "description": f"FEX {field['verb']} aggregate",
+            "fex_expression": f"{field['verb']} {prefixed}",
+        }
+        self.measures.append(item)
+        return item
+
+    def translate_request(self, request):
+        home = self.table_of(request["file"]) or next(iter(self.schema), None)
+        aggregating = any(f["verb"] in AGGREGATING_VERBS for f in request["fields"])
+
+        if not aggregating:
+            # detail reports evaluate COMPUTE per row, the DAX equivalent is a calculated column
+            for c in request["computes"]:
+                self.used_names.add(c["name"].lower())
+                item = {
+                    "table": home,
+                    "name": c["name"],
+                    "format_string": dax_format(c["format"]),
+                    "description": c.get("title") or "FEX COMPUTE on a detail report",
+                    "fex_expression": f"COMPUTE {c['name']}/{c['format']} = {c['expression']};",
+                }
+                self.defines[c["name"].lower()] = item
+                self.add_item(self.calculated_columns, item, c, lambda node: to_dax(node, self.row_ref(home)))
+            return
+
+        aggregated = {}
+        for f in request["fields"]:
+            if f["verb"] in AGGREGATING_VERBS and f["field"] != "*":
+                name = self.aggregate_measure(f, home)["name"]
+                # COMPUTE names 'AVE.AMOUNT' for the prefixed aggregate; a bare 'AMOUNT' is
+                # only this measure when listed without a prefix, else the sum (as in fex_engine)
+                if f["prefix"]:
+                    aggregated[f"{f['prefix']}.{column_name(f['field'])}".lower()] = name
+                else:
+                    aggregated.setdefault(column_name(f["field"]).lower(), name)
+
+        keys = {column_name(f["field"]).lower() for f in request["by"] + request["across"]}
+        keys |= {column_name(f["field"]).lower() for f in request["fields"] if f["verb"] not in AGGREGATING_VERBS}
+        computed = {}
+
+        def measure_ref(field):
+            prefix, _ = split_field(field)
+            if prefix and f"{prefix}.{column_name(field)}".lower() in aggregated:
+                return quote_name(aggregated[f"{prefix}.{column_name(field)}".lower()])
+            field = split_field(field)[1]
+            name = column_name(field).lower()
+            if name in computed:
+                return quote_name(computed[name])
+            if not prefix and name in aggregated:
+                return quote_name(aggregated[name])
+            table = self.home_of(field, home)
+            if not prefix and name in keys:
+                return f"SELECTEDVALUE({self.column_dax(field, table)})"
+            # COMPUTE operands the verbs don't list are aggregated by their prefix, else summed, as in FEX
+            agg, _ = DAX_AGGREGATES.get(prefix, DAX_AGGREGATES[None])
+            return f"{agg}({self.column_dax(field, table)})"
+
+        for c in request["computes"]:
+            item = {
+                "table": home,
+                "name": self.unique_name(c["name"]),
+                "format_string": dax_format(c["format"]),
+                "description": c.get("title") or "FEX COMPUTE",
+                "fex_expression": f"COMPUTE {c['name']}/{c['format']} = {c['expression']};",
+            }
+            self.add_item(self.measures, item, c, lambda node: to_dax(node, measure_ref))
+            item.pop("data_type", None)
+            computed[c["name"].lower()] = item["name"]
+
+
+def translate_fex(fex_content, schema=None, relationships=None):
+    """Deterministic DAX for a FEX: {'measures': [...], 'calculated_columns': [...]}
+
+    schema ({table: [columns]}) places each column on its real table; without it
+    fields are assumed to live on the request's FILE. relationships decide which
+    other tables a calculated column can reach with RELATED.
+    """
+
+    parsed = parse_fex(fex_content)
+    translator = DaxTranslator(schema, relationships)
+    default_table = next((r["file"] for r in parsed["requests"] if r["file"]), None)
+
+    for define in parsed["defines"]:
+        translator.translate_define(define, translator.table_of(default_table))
+    for request in parsed["requests"]:
+        translator.translate_request(request)
+
+    return {
+        "measures": translator.measures,
+        "calculated_columns": translator.calculated_columns,
+    }
+
+
+def suggest_visuals(fex_content):
+    """Rule-based visual suggestions from the shape of each request"""
+
+    visuals = []
+    for request in parse_fex(fex_content)["requests"]:
+        aggregating = any(f["verb"] in AGGREGATING_VERBS for f in request["fields"])
+        by = [column_name(f["field"]) for f in request["by"]]
+        across = [column_name(f["field"]) for f in request["across"]]
+        dated = [b for b in by if re.search(r"DATE|MONTH|YEAR|PERIOD|_DT$", b, re.I)]
+        source = f"TABLE FILE {request['file']}"
+
+        if not aggregating:
+            visuals.append({"visual": "Table", "reason": f"{source} is a detail (PRINT) report"})
+        elif across:
+            visuals.append({"visual": "Matrix", "reason": f"{source} sorts BY {', '.join(by) or '-'} ACROSS {', '.join(across)}"})
+        elif dated:
+            visuals.append({"visual": "Line chart", "reason": f"{source} aggregates over {dated[0]}"})
+        elif len(by) == 1:
+            visuals.append({"visual": "Clustered bar chart", "reason": f"{source} aggregates BY {by[0]}"})
+        elif by:
+            visuals.append({"visual": "Matrix", "reason": f"{source} aggregates BY {', '.join(by)}"})
+        else:
+            visuals.append({"visual": "Card", "reason": f"{source} returns grand totals only"})
+
+        if aggregating and by and not across:
+            visuals.append({"visual": "Slicer", "reason": f"Lets users filter on {by[0]} like the FEX sort field"})
+
+    return visuals
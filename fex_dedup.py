@@ -0,0 +1,206 @@
+import re
+import copy
+import difflib
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+
+from fex_minify import minify_fex, HEADER_FIELD
+from fex_parser import tokenize
+
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+LSH_BANDS = 16  # 16 bands x 8 rows: pairs above ~0.7 Jaccard almost always collide
+SIMILARITY_THRESHOLD = 0.85
+
+_rng = np.random.default_rng(20240601)
+PERM_MASKS = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+PERM_MULT = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+
+
+def _is_literal(tok):
+    return tok[0] in "'\"" or tok[0].isdigit()
+
+
+def split_header(fex_content):
+    """([(header field, value)], body tokens) of the minified FEX"""
+
+    header, body = [], []
+    for line in minify_fex(fex_content).splitlines():
+        m = HEADER_FIELD.match(line)
+        if m:
+            header.append((m.group(1).strip().upper(), m.group(2).strip()))
+        else:
+            body.append(line)
+    return header, tokenize("\n".join(body))
+
+
+def normalized_tokens(fex_content):
+    """Token stream for similarity: no comments, styling, header fields or literal values"""
+
+    body = [line for line in minify_fex(fex_content).splitlines() if not HEADER_FIELD.match(line)]
+    out = []
+    for tok in tokenize("\n".join(body)):
+        if tok[0] in "'\"":
+            out.append("'?'")
+        elif tok[0].isdigit():
+            out.append("0")
+        else:
+            out.append(tok.upper())
+    return out
+
+
+def _shingle_hashes(tokens):
+    if len(tokens) < SHINGLE_SIZE:
+        grams = [" ".join(tokens)]
+    else:
+        grams = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "little") for g in grams],
+        dtype=np.uint64,
+    )
+
+
+def minhash(tokens):
+    shingles = _shingle_hashes(tokens)
+    with np.errstate(over="ignore"):
+        mixed = (shingles[:, None] ^ PERM_MASKS[None, :]) * PERM_MULT[None, :]
+    return mixed.min(axis=0)
+
+
+def estimated_similarity(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+
+def cluster_fexes(contents, threshold=SIMILARITY_THRESHOLD):
+    """Groups near-duplicate FEX texts ({key: content}) into clusters; returns a list of key lists"""
+
+    keys = list(contents)
+    tokens = {k: normalized_tokens(contents[k]) for k in keys}
+    signatures = {k: minhash(tokens[k]) for k in keys}
+
+    rows = NUM_PERM // LSH_BANDS
+    buckets = defaultdict(list)
+    for k in keys:
+        sig = signatures[k]
+        for band in range(LSH_BANDS):
+            buckets[(band, sig[band * rows:(band + 1) * rows].tobytes())].append(k)
+
+    parent = {k: k for k in keys}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a, b) in checked or find(a) == find(b):
+                    continue
+                checked.add((a, b))
+                if estimated_similarity(signatures[a], signatures[b]) >= threshold:
+                    parent[find(b)] = find(a)
+
+    clusters = defaultdict(list)
+    for k in keys:
+        clusters[find(k)].append(k)
+    return list(clusters.values())
+
+
+def token_substitutions(rep_content, member_content):
+    """{rep value: member value} when the two FEXes differ only by literal values
+    (and header field values such as the title or author), else None"""
+
+    rep_header, rep = split_header(rep_content)
+    member_header, member = split_header(member_content)
+    if [k for k, _ in rep_header] != [k for k, _ in member_header]:
+        return None
+
+    subs = {}
+
+    def swap(a, b):
+        if subs.get(a, b) != b:
+            return False
+        subs[a] = b
+        return True
+
+    for (_, a), (_, b) in zip(rep_header, member_header):
+        if a != b and not swap(a, b):
+            return None
+
+    matcher = difflib.SequenceMatcher(a=rep, b=member, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        if op != "replace" or i2 - i1 != j2 - j1:
+            return None
+        for a, b in zip(rep[i1:i2], member[j1:j2]):
+            # a different operator, keyword, verb or field changes what the report means
+            if not (_is_literal(a) and _is_literal(b)) or not swap(a, b):
+                return None
+    return subs
+
+
+def _unquote(tok):
+    return tok[1:-1] if tok[0] in "'\"" else tok
+
+
+def _substitute(text, pattern, replacements):
+    return pattern.sub(lambda m: replacements[m.group(0)], text)
+
+
+def derive_metadata(rep_metadata, substitutions):
+    """Applies the representative -> member token swaps to every string in its metadata"""
+
+    replacements = {_unquote(a): _unquote(b) for a, b in substitutions.items()}
+    replacements = {a: b for a, b in replacements.items() if a and a != b}
+    if not replacements:
+        return copy.deepcopy(rep_metadata)
+
+    # longest first so 'NORTH AMERICA' wins over 'NORTH'; word edges only where the value has them
+    parts = []
+    for a in sorted(replacements, key=len, reverse=True):
+        left = r"\b" if re.match(r"\w", a) else ""
+        right = r"\b" if re.search(r"\w$", a) else ""
+        parts.append(f"{left}{re.escape(a)}{right}")
+    pattern = re.compile("|".join(parts))
+
+    def walk(value):
+        if isinstance(value, str):
+            return _substitute(value, pattern, replacements)
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        if isinstance(value, dict):
+            return {k: walk(v) for k, v in value.items()}
+        return value
+
+    return walk(rep_metadata)
+
+
+def plan_batch(contents, threshold=SIMILARITY_THRESHOLD):
+    """Splits a batch into representatives to analyse and members derivable from them
+
+    Returns (analyse, derived) where analyse is a list of keys and derived maps
+    member key -> (representative key, substitutions).
+    """
+
+    analyse, derived = [], {}
+    for cluster in cluster_fexes(contents, threshold):
+        cluster = sorted(cluster)
+        reps = []
+        for key in cluster:
+            for rep in reps:
+                subs = token_substitutions(contents[rep], contents[key])
+                if subs is not None:
+                    derived[key] = (rep, subs)
+                    break
+            else:
+                # structurally different despite the similarity: analysed on its own
+                reps.append(key)
+        analyse += reps
+    return analyse, derived
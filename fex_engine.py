@@ -0,0 +1,423 @@
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from fex_parser import parse_fex, parse_expression, expression_identifiers, column_name, split_field, tokenize
+from fex_filters import collect_predicates, predicates_for_table, apply_filters_client
+
+
+CHUNK_ROWS = 1_000_000
+AGGREGATING_VERBS = {"SUM", "WRITE", "ADD", "COUNT"}
+
+# prefix operator -> (per-chunk aggregation, how partials are combined)
+PREFIX_AGGREGATES = {
+    None: ("sum", "sum"),
+    "SUM": ("sum", "sum"),
+    "MAX": ("max", "max"),
+    "MIN": ("min", "min"),
+    "CNT": ("count", "sum"),
+    "FST": ("first", "first"),
+    "LST": ("last", "last"),
+    "TOT": ("sum", "sum"),
+}
+
+FUNCTIONS = {
+    "ABS": np.abs,
+    "INT": np.trunc,
+    "SQRT": np.sqrt,
+    "LOG": np.log,
+    "EXP": np.exp,
+}
+
+
+class OperatorTimings:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.rows = defaultdict(int)
+
+    def track(self, name, fn, *args, rows=None, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds[name] += time.perf_counter() - start
+        if rows is not None:
+            self.rows[name] += rows
+        return result
+
+    def report(self):
+        print("\n⏱️ FEX engine operator timings:")
+        for name, seconds in self.seconds.items():
+            rows = f"{self.rows[name]:>12,} rows" if name in self.rows else ""
+            print(f"  {name:<10} {seconds:8.3f}s {rows}")
+        return dict(self.seconds)
+
+
+def _lookup(mapping, name):
+    if name in mapping:
+        return name
+    lower = str(name).lower()
+    for key in mapping:
+        if str(key).lower() == lower:
+            return key
+    return None
+
+
+def _resolve(df, name):
+    col = _lookup({c: None for c in df.columns}, column_name(name))
+    if col is None:
+        raise KeyError(f"Column {name} not found in the joined data")
+    return col
+
+
+def evaluate(node, df):
+    """Vectorised evaluation of a parsed FEX expression against a frame"""
+
+    kind = node[0]
+
+    if kind == "num" or kind == "str":
+        return node[1]
+    if kind == "col":
+        # 'AVE.COST' is its own output column; 'ORDERS.COST' falls back to COST
+        return df[_lookup(dict.fromkeys(df.columns), node[1]) or _resolve(df, node[1])]
+    if kind == "neg":
+        return -evaluate(node[1], df)
+
+    if kind == "bin":
+        a, b = evaluate(node[2], df), evaluate(node[3], df)
+        op = node[1]
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            # FEX yields 0 instead of an error when dividing by zero
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out = a / b
+            return out.replace([np.inf, -np.inf], 0).fillna(0) if isinstance(out, pd.Series) else out
+        if op == "**":
+            return a ** b
+        if op == "||":
+            return a.astype("string") + b.astype("string") if isinstance(a, pd.Series) else str(a) + str(b)
+
+    if kind == "cmp":
+        a, b = evaluate(node[2], df), evaluate(node[3], df)
+        if node[1] in ("GT", "GE", "LT", "LE"):
+            # unordered categoricals (TableStore) reject <, >; compare on the underlying values
+            a, b = (
+                v.astype(v.cat.categories.dtype)
+                if isinstance(v, pd.Series) and isinstance(v.dtype, pd.CategoricalDtype) else v
+                for v in (a, b)
+            )
+        return {
+            "EQ": lambda: a == b, "NE": lambda: a != b, "GT": lambda: a > b,
+            "GE": lambda: a >= b, "LT": lambda: a < b, "LE": lambda: a <= b,
+        }[node[1]]()
+
+    if kind == "and":
+        return evaluate(node[1], df) & evaluate(node[2], df)
+    if kind == "or":
+        return evaluate(node[1], df) | evaluate(node[2], df)
+    if kind == "not":
+        return ~evaluate(node[1], df)
+
+    if kind == "if":
+        cond = evaluate(node[1], df)
+        then, other = evaluate(node[2], df), evaluate(node[3], df)
+        return pd.Series(np.where(cond, then, other), index=df.index)
+
+    if kind == "call":
+        fn = FUNCTIONS.get(node[1])
+        if fn is None:
+            raise ValueError(f"FEX function {node[1]} is not supported by the local engine")
+        return fn(*[evaluate(arg, df) for arg in node[2]])
+
+    raise ValueError(f"Unknown expression node {kind}")
+
+
+def _widen(df):
+    """Undo TableStore downcasting before arithmetic so int8 * int8 can't overflow"""
+
+    for col in df.columns:
+        dtype = df[col].dtype
+        if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+            if dtype != np.int64:
+                df[col] = df[col].astype(np.int64)
+        elif pd.api.types.is_float_dtype(dtype) and dtype != np.float64:
+            df[col] = df[col].astype(np.float64)
+    return df
+
+
+def _join_plan(request, joins, tables):
+    """Orders the JOINs reachable from the request's FILE into (right_frame, left_on, right_on, how)"""
+
+    base = _lookup(tables, request["file"])
+    if base is None:
+        raise KeyError(f"Table {request['file']} of the request was not loaded")
+
+    joined = {str(base).lower()}
+    plan = []
+    pending = list(joins)
+
+    progress = True
+    while pending and progress:
+        progress = False
+        for j in list(pending):
+            if j["left_table"].lower() not in joined:
+                continue
+            pending.remove(j)
+            right = _lookup(tables, j["right_table"])
+            if right is None:
+                print(f"⚠️ JOIN target {j['right_table']} was not loaded, skipping")
+                continue
+            plan.append((right, j["left_columns"], j["right_columns"], j["join_type"]))
+            joined.add(str(right).lower())
+            progress = True
+
+    return base, plan
+
+
+def _apply_joins(chunk, plan, tables):
+    for right, left_on, right_on, how in plan:
+        right_df = tables[right]
+        l_cols = [_resolve(chunk, c) for c in left_on]
+        r_cols = [_resolve(right_df, c) for c in right_on]
+
+        # keep only right columns that don't already exist, plus the keys
+        extra = [c for c in right_df.columns if c not in chunk.columns or c in r_cols]
+        right_part = right_df[extra]
+
+        chunk = chunk.merge(
+            right_part, left_on=l_cols, right_on=r_cols,
+            how=how if how != "full" else "outer", suffixes=("", f"_{right}"),
+        )
+        for l, r in zip(l_cols, r_cols):
+            if l != r and r in chunk.columns:
+                chunk = chunk.drop(columns=r)
+    return chunk
+
+
+def _aggregate_spec(request, key_cols):
+    """Returns [(output name, source field, prefix)] for aggregated output"""
+
+    specs = []
+    for f in request["fields"]:
+        if f["verb"] not in AGGREGATING_VERBS:
+            continue
+        name = f["field"] if not f["prefix"] else f"{f['prefix']}.{f['field']}"
+        specs.append((name, f["field"], f["prefix"] or ("CNT" if f["verb"] == "COUNT" else None)))
+
+    # output names as COMPUTE sees them: AVE.COST produces AVE.COST, not COST
+    # (fex_dax's measure_ref reads the bare name the same way)
+    def output_name(field):
+        prefix, field = split_field(field)
+        return (f"{prefix}.{column_name(field)}" if prefix else column_name(field)).lower()
+
+    produced = {output_name(s[0]) for s in specs} | {k.lower() for k in key_cols}
+    computed = {c["name"].lower() for c in request["computes"]}
+
+    # COMPUTE may reference fields the verbs never list, or list only with another
+    # prefix; FEX aggregates them silently (a bare name is summed)
+    for c in request["computes"]:
+        for name in expression_identifiers(c["tokens"]):
+            out = output_name(name)
+            if out in produced or name.lower() in computed:
+                continue
+            prefix, field = split_field(name)
+            specs.append((f"{prefix}.{column_name(field)}" if prefix else column_name(field), field, prefix))
+            produced.add(out)
+    return specs
+
+
+def _partial_aggregate(chunk, keys, specs):
+    named = {}
+    distinct = []
+    for out, field, prefix in specs:
+        src = _resolve(chunk, field)
+        if prefix == "AVE":
+            named[f"{out}__sum"] = (src, "sum")
+            named[f"{out}__cnt"] = (src, "count")
+        elif prefix == "CNT.DST":
+            distinct.append((out, src))
+        else:
+            named[out] = (src, PREFIX_AGGREGATES.get(prefix, ("sum", "sum"))[0])
+
+    if keys:
+        partial = chunk.groupby(keys, observed=True, dropna=False, sort=False).agg(**named) if named else \
+            chunk[keys].drop_duplicates().set_index(keys)
+    else:
+        partial = pd.DataFrame({k: [chunk[src].agg(how)] for k, (src, how) in named.items()})
+
+    pairs = {out: chunk[keys + [src]].drop_duplicates().rename(columns={src: out}) for out, src in distinct}
+    return partial, pairs
+
+
+def _combine(partials, pair_parts, keys, specs):
+    how = {}
+    for out, _, prefix in specs:
+        if prefix == "AVE":
+            how[f"{out}__sum"] = "sum"
+            how[f"{out}__cnt"] = "sum"
+        elif prefix != "CNT.DST":
+            how[out] = PREFIX_AGGREGATES.get(prefix, ("sum", "sum"))[1]
+
+    combined = pd.concat(partials)
+    if keys:
+        combined = combined.groupby(level=list(range(len(keys))), observed=True, dropna=False).agg(how) \
+            if how else combined[~combined.index.duplicated()]
+        combined = combined.reset_index()
+    else:
+        combined = combined.agg(how).to_frame().T if how else pd.DataFrame(index=[0])
+
+    for out, _, prefix in specs:
+        if prefix == "AVE":
+            s, c = combined.pop(f"{out}__sum"), combined.pop(f"{out}__cnt")
+            combined[out] = (s / c.replace(0, np.nan)).fillna(0)
+        elif prefix == "CNT.DST":
+            pairs = pd.concat(pair_parts[out]).drop_duplicates()
+            counts = pairs.groupby(keys, observed=True, dropna=False)[out].nunique().reset_index() \
+                if keys else pd.DataFrame({out: [pairs[out].nunique()]})
+            combined = combined.merge(counts, on=keys, how="left") if keys else combined.assign(**{out: counts[out].iloc[0]})
+
+    return combined
+
+
+def compile_filters(texts, what):
+    """Predicates for the filters the pushdown parser understands, expression trees for the rest.
+    A filter neither can read fails the run: ignoring it would keep rows the report drops"""
+
+    predicates, skipped = collect_predicates(texts)
+    # after the joins every table's columns live in one frame
+    predicates = [dict(p, table=None) for p in predicates]
+    expressions = []
+    for text in skipped:
+        try:
+            expressions.append((text, parse_expression(tokenize(text))))
+        except ValueError as e:
+            raise Exception(f"❌ Local engine cannot evaluate {what} '{text}': {e}")
+    return predicates, expressions
+
+
+def apply_compiled_filters(df, compiled, what):
+    predicates, expressions = compiled
+    applicable = predicates_for_table(predicates, None, df.columns)
+    lookup = dict.fromkeys(df.columns)
+    for pred in predicates:
+        if _lookup(lookup, pred["column"]) is None:
+            raise Exception(f"❌ {what} '{pred['text']}': column {pred['column']} not found in the data")
+        if "variable" in pred["kinds"]:
+            raise Exception(f"❌ {what} '{pred['text']}' uses an unresolved &variable")
+        if "column" in pred["kinds"] and any(_lookup(lookup, v) is None for v in pred["values"]):
+            raise Exception(f"❌ {what} '{pred['text']}' compares with a column not found in the data")
+    df = apply_filters_client(df, applicable)
+
+    for text, node in expressions:
+        try:
+            mask = evaluate(node, df)
+        except (KeyError, ValueError, TypeError) as e:
+            raise Exception(f"❌ Local engine cannot evaluate {what} '{text}': {e}")
+        if not isinstance(mask, pd.Series):
+            raise Exception(f"❌ {what} '{text}' is not a row condition")
+        df = df[mask.fillna(False).astype(bool)]
+    return df
+
+
+def execute_request(request, tables, joins=(), defines=(), chunk_rows=CHUNK_ROWS, timings=None):
+    """Executes one parsed TABLE FILE request against loaded tables with pandas/NumPy.
+    Returns the report frame, its key columns (BY/ACROSS and grouped detail fields) and the timings"""
+
+    timings = timings or OperatorTimings()
+    base, plan = _join_plan(request, joins, tables)
+    base_df = tables[base]
+
+    record_filters = compile_filters(request["filters"], "filter")
+    total_filters = compile_filters(request.get("total_filters", []), "WHERE TOTAL")
+
+    define_nodes = [(d["name"], parse_expression(d["tokens"])) for d in defines]
+    compute_nodes = [(c["name"], parse_expression(c["tokens"])) for c in request["computes"]]
+    compute_refs = [n for c in request["computes"] for n in expression_identifiers(c["tokens"])]
+
+    by = [f["field"] for f in request["by"]] + [f["field"] for f in request["across"]]
+    aggregating = any(f["verb"] in AGGREGATING_VERBS for f in request["fields"])
+
+    partials, pair_parts, details = [], defaultdict(list), []
+    keys = specs = None
+
+    for start in range(0, max(len(base_df), 1), chunk_rows):
+        chunk = timings.track("scan", lambda: base_df.iloc[start:start + chunk_rows].copy())
+        chunk = timings.track("join", _apply_joins, chunk, plan, tables, rows=len(chunk))
+        chunk = _widen(chunk)
+
+        for name, node in define_nodes:
+            chunk[name] = timings.track("define", evaluate, node, chunk)
+
+        chunk = timings.track("filter", apply_compiled_filters, chunk, record_filters, "filter", rows=len(chunk))
+
+        if keys is None:
+            keys = [_resolve(chunk, f) for f in by]
+            if aggregating:
+                # PRINT/LIST fields next to SUM are treated as extra detail keys
+                keys += [
+                    _resolve(chunk, f["field"]) for f in request["fields"]
+                    if f["verb"] not in AGGREGATING_VERBS and _resolve(chunk, f["field"]) not in keys
+                ]
+                specs = _aggregate_spec(request, keys)
+
+        if aggregating:
+            partial, pairs = timings.track("aggregate", _partial_aggregate, chunk, keys, specs, rows=len(chunk))
+            partials.append(partial)
+            for out, frame in pairs.items():
+                pair_parts[out].append(frame)
+        else:
+            cols = keys + [
+                _resolve(chunk, f["field"]) for f in request["fields"]
+                if _resolve(chunk, f["field"]) not in keys
+            ]
+            lookup = dict.fromkeys(chunk.columns)
+            needed = set(cols) | {_lookup(lookup, n) for n in compute_refs} - {None}
+            details.append(chunk[[c for c in chunk.columns if c in needed]])
+
+    if aggregating:
+        result = timings.track("combine", _combine, partials, pair_parts, keys, specs)
+    else:
+        result = pd.concat(details, ignore_index=True) if details else pd.DataFrame()
+
+    for name, node in compute_nodes:
+        result[name] = timings.track("compute", evaluate, node, result)
+
+    if request.get("total_filters"):
+        result = timings.track(
+            "filter", apply_compiled_filters, result, total_filters, "WHERE TOTAL", rows=len(result)
+        ).reset_index(drop=True)
+
+    if keys:
+        result = timings.track("sort", lambda: result.sort_values(keys, kind="stable").reset_index(drop=True))
+
+    # hidden helper sums for COMPUTE stay out of the report output
+    visible = keys + [
+        (f["field"] if not f["prefix"] else f"{f['prefix']}.{f['field']}")
+        for f in request["fields"] if f["verb"] in AGGREGATING_VERBS or not aggregating
+    ] + [name for name, _ in compute_nodes]
+    visible = [c if c in result.columns else _resolve(result, c) for c in dict.fromkeys(visible)]
+
+    return result[visible], keys or [], timings
+
+
+def run_fex_locally(fex_content, tables, chunk_rows=CHUNK_ROWS):
+    """Parses a FEX and executes every request, returning (frame, key columns) per request"""
+
+    parsed = parse_fex(fex_content)
+    timings = OperatorTimings()
+    results = []
+
+    for request in parsed["requests"]:
+        defines = [d for d in parsed["defines"] if not d.get("file") or d["file"].lower() == str(request["file"]).lower()]
+        print(f"\n⚙️ Executing TABLE FILE {request['file']} locally...")
+        df, keys, _ = execute_request(request, tables, parsed["joins"], defines, chunk_rows, timings)
+        print(f"👍 {len(df)} output rows, {len(df.columns)} columns")
+        results.append((df, keys))
+
+    timings.report()
+    return results
@@ -0,0 +1,407 @@
+import re
+
+import pandas as pd
+
+
+WHERE_LINE = re.compile(r"^\s*WHERE\s+(?!TOTAL\b)(.+?)\s*;?\s*$", re.I)
+WHERE_TOTAL_LINE = re.compile(r"^\s*WHERE\s+TOTAL\s+(.+?)\s*;?\s*$", re.I)
+# legacy record filter; "IF ... THEN ... ELSE" lines are COMPUTE/DEFINE expressions
+IF_LINE = re.compile(r"^\s*IF\s+(?!.*\bTHEN\b)(.+?)\s*;?\s*$", re.I)
+TOKEN = re.compile(
+    r"'(?:[^']|'')*'|\"[^\"]*\"|\(|\)|,|<>|>=|<=|=|>|<|&&?[\w.]+|[\w.\-]+|\S",
+)
+# one literal, &variable or column; "*", "+" etc. mean the value is an expression
+VALUE_TOKEN = re.compile(r"^(?:'.*'|\".*\"|&&?[\w.]+|[\w.\-]+)$", re.S)
+
+OPERATORS = {
+    "EQ": "EQ", "=": "EQ", "IS": "EQ",
+    "NE": "NE", "<>": "NE", "IS-NOT": "NE",
+    "GT": "GT", ">": "GT",
+    "GE": "GE", ">=": "GE",
+    "LT": "LT", "<": "LT",
+    "LE": "LE", "<=": "LE",
+    "IN": "IN",
+    "CONTAINS": "CONTAINS",
+    "OMITS": "OMITS",
+    "LIKE": "LIKE",
+    "FROM": "FROM",
+}
+
+SQL_COMPARISONS = {"EQ": "=", "NE": "<>", "GT": ">", "GE": ">=", "LT": "<", "LE": "<="}
+PLACEHOLDERS = {"sqlserver": "?", "mysql": "%s"}
+
+
+def _tokens(text):
+    return TOKEN.findall(text)
+
+
+def _split_top_level(tokens, word):
+    parts, current, depth = [], [], 0
+    for tok in tokens:
+        if tok == "(":
+            depth += 1
+        elif tok == ")":
+            depth -= 1
+        if depth == 0 and tok.upper() == word:
+            parts.append(current)
+            current = []
+        else:
+            current.append(tok)
+    parts.append(current)
+    return parts
+
+
+def _literal(tok):
+    """Returns (value, kind) for a value token; kind is literal, column or variable"""
+
+    if tok[0] in "'\"":
+        return tok[1:-1].replace("''", "'"), "literal"
+    if tok.startswith("&"):
+        return tok, "variable"
+    try:
+        return (int(tok) if re.fullmatch(r"-?\d+", tok) else float(tok)), "literal"
+    except ValueError:
+        return tok, "column"
+
+
+def parse_predicate(tokens):
+    """Parses '<field> <op> <value> [OR <value> ...]' into a predicate dict"""
+
+    if len(tokens) < 2:
+        return None
+
+    field = tokens[0]
+    rest = tokens[1:]
+    negate = False
+
+    if rest[0].upper() == "NOT" and len(rest) > 1:
+        negate = True
+        rest = rest[1:]
+    if rest[0].upper() == "NOT-FROM":
+        negate = True
+        rest = ["FROM"] + rest[1:]
+
+    op_word = rest[0].upper()
+
+    # IS MISSING / IS-NOT MISSING
+    if op_word in ("IS", "IS-NOT") and len(rest) == 2 and rest[1].upper() == "MISSING":
+        op, values = "MISSING", []
+        negate = negate or op_word == "IS-NOT"
+
+    elif op_word in OPERATORS:
+        op = OPERATORS[op_word]
+        value_tokens = [t for t in rest[1:] if t not in ("(", ")", ",")]
+
+        if op == "FROM":
+            if len(value_tokens) != 3 or value_tokens[1].upper() != "TO":
+                return None
+            value_tokens = [value_tokens[0], value_tokens[2]]
+        elif op != "IN":
+            # "REGION EQ 'A' OR 'B'" is a list of values for one field; anything
+            # else after the first value ("100 * 2", "COST * 1.1") is an expression
+            if any(t.upper() != "OR" for t in value_tokens[1::2]):
+                return None
+            value_tokens = value_tokens[0::2]
+
+        if not value_tokens or not all(VALUE_TOKEN.match(t) for t in value_tokens):
+            return None
+
+        if op in ("EQ", "NE") and len(value_tokens) > 1:
+            negate = negate or op == "NE"
+            op = "IN"
+
+    else:
+        return None
+
+    values, kinds, raw = [], set(), []
+    for tok in (value_tokens if op != "MISSING" else []):
+        value, kind = _literal(tok)
+        values.append(value)
+        kinds.add(kind)
+        raw.append(value if isinstance(value, str) else tok)
+
+    # literals mixed with columns or &variables are left to the expression evaluator
+    if len(kinds) > 1:
+        return None
+
+    table, _, column = field.rpartition(".")
+
+    return {
+        "table": table or None,
+        "column": column,
+        "op": op,
+        "negate": negate,
+        "values": values,
+        # token text of each value: '00123' is 123 only against a numeric column
+        "raw": raw,
+        "kinds": kinds,
+        "text": " ".join(tokens),
+    }
+
+
+def parse_filter(text):
+    """Parses one FEX WHERE expression into AND-ed predicates, or None if it can't"""
+
+    text = re.sub(r"^\s*WHERE\s+", "", str(text).strip().rstrip(";"), flags=re.I)
+    tokens = _tokens(text)
+    if not tokens:
+        return None
+
+    predicates = []
+    for part in _split_top_level(tokens, "AND"):
+        # OR between different fields can't be expressed as AND-ed predicates
+        ors = _split_top_level(part, "OR")
+        if len(ors) > 1 and any(
+            len(o) > 1 and o[0].upper() not in OPERATORS for o in ors[1:]
+        ):
+            return None
+        if part and part[0] == "(" and part[-1] == ")":
+            part = part[1:-1]
+        pred = parse_predicate(part)
+        if pred is None:
+            return None
+        predicates.append(pred)
+
+    return predicates
+
+
+def _extract_filters(fex_content, pattern):
+    filters = []
+    lines = fex_content.splitlines()
+    i = 0
+    while i < len(lines):
+        m = pattern.match(lines[i])
+        i += 1
+        if not m:
+            continue
+        text = m.group(1)
+        while (
+            not lines[i - 1].rstrip().endswith(";")
+            and i < len(lines)
+            and re.match(r"^\s*(AND|OR)\b", lines[i], re.I)
+        ):
+            text += " " + lines[i].strip().rstrip(";")
+            i += 1
+        filters.append(text)
+    return filters
+
+
+def extract_where_filters(fex_content):
+    """Returns the record-level WHERE expressions of a FEX, one string per statement"""
+
+    return _extract_filters(fex_content, WHERE_LINE)
+
+
+def extract_if_filters(fex_content):
+    """Record-level IF tests ("IF REGION EQ 'EAST'"), which filter like WHERE"""
+
+    return _extract_filters(fex_content, IF_LINE)
+
+
+def extract_total_filters(fex_content):
+    """WHERE TOTAL expressions, applied to the aggregated output rather than the records"""
+
+    return _extract_filters(fex_content, WHERE_TOTAL_LINE)
+
+
+def collect_predicates(filter_texts):
+    predicates, skipped = [], []
+    for text in filter_texts:
+        parsed = parse_filter(text)
+        if parsed is None:
+            skipped.append(text)
+        else:
+            predicates.extend(parsed)
+    return predicates, skipped
+
+
+def literal_values(pred, numeric):
+    """A literal predicate's values for its column: numbers when the column is numeric, the
+    token text otherwise; numeric=None (type unknown) keeps only numbers that print back as typed"""
+
+    out = []
+    for value, raw in zip(pred["values"], pred.get("raw", pred["values"])):
+        if isinstance(value, (int, float)) and (numeric is False or (numeric is None and str(value) != raw)):
+            value = raw
+        out.append(value)
+    return out
+
+
+def predicates_for_table(predicates, table_name, columns, numeric_columns=None):
+    """Picks the predicates that apply to a table, mapped to its real column names.
+    numeric_columns (when the column types are known) settles numeric-looking literals"""
+
+    by_lower = {str(c).lower(): c for c in columns}
+    selected = []
+    for pred in predicates:
+        if pred["table"] and pred["table"].lower() != str(table_name).lower():
+            continue
+        real = by_lower.get(pred["column"].lower())
+        if real is None:
+            continue
+        pred = dict(pred, column=real)
+        if numeric_columns is not None and pred["kinds"] == {"literal"}:
+            pred["values"] = literal_values(pred, real in numeric_columns)
+            pred["raw"] = pred["values"]
+        selected.append(pred)
+    return selected
+
+
+def quote_ident(name, dialect):
+    if dialect == "sqlserver":
+        return "[" + str(name).replace("]", "]]") + "]"
+    if dialect == "mysql":
+        return "`" + str(name).replace("`", "``") + "`"
+    raise Exception("❌ Unsupported DB type. Use: sqlserver or mysql")
+
+
+def _like_escape(value):
+    return str(value).replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def to_sql(pred, dialect):
+    """Returns (sql, params) for a predicate, or None when it must run client side"""
+
+    if pred["kinds"] - {"literal"}:
+        return None
+
+    col = quote_ident(pred["column"], dialect)
+    ph = PLACEHOLDERS[dialect]
+    op, values, negate = pred["op"], pred["values"], pred["negate"]
+
+    if op in SQL_COMPARISONS:
+        sql, params = f"{col} {SQL_COMPARISONS[op]} {ph}", [values[0]]
+    elif op == "IN":
+        sql, params = f"{col} IN ({', '.join([ph] * len(values))})", list(values)
+    elif op in ("CONTAINS", "OMITS"):
+        like = " OR ".join([f"{col} LIKE {ph} ESCAPE '!'"] * len(values))
+        sql, params = f"({like})", [f"%{_like_escape(v)}%" for v in values]
+        negate = negate != (op == "OMITS")
+    elif op == "LIKE":
+        sql, params = " OR ".join([f"{col} LIKE {ph}"] * len(values)), list(values)
+        sql = f"({sql})"
+    elif op == "FROM":
+        sql, params = f"{col} BETWEEN {ph} AND {ph}", list(values)
+    elif op == "MISSING":
+        return (f"{col} IS NOT NULL" if negate else f"{col} IS NULL"), []
+    else:
+        return None
+
+    if negate:
+        sql = f"NOT ({sql})"
+    return sql, params
+
+
+def build_where_clause(predicates, dialect):
+    """Splits predicates into a parameterised WHERE clause and a client-side remainder"""
+
+    clauses, params, client_side = [], [], []
+    for pred in predicates:
+        translated = to_sql(pred, dialect)
+        if translated is None:
+            client_side.append(pred)
+            continue
+        clauses.append(translated[0])
+        params.extend(translated[1])
+
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params, client_side
+
+
+def _like_regex(pattern):
+    parts = []
+    for ch in str(pattern):
+        if ch == "%":
+            parts.append(".*")
+        elif ch == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+    return "^" + "".join(parts) + "$"
+
+
+def _coerce(series, value):
+    if isinstance(value, str) and pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    return value
+
+
+def predicate_mask(df, pred):
+    s = df[pred["column"]]
+    op = pred["op"]
+    if isinstance(s.dtype, pd.CategoricalDtype) and op in ("GT", "GE", "LT", "LE", "FROM"):
+        # unordered categoricals reject <, >; compare on the underlying values
+        s = s.astype(s.cat.categories.dtype)
+
+    def operand(v, kind):
+        if kind == "column" and v in df.columns:
+            return df[v]
+        return _coerce(s, v)
+
+    if len(pred["kinds"]) > 1:
+        raise ValueError(f"Filter mixes literal and column values: {pred['text']}")
+    kind = min(pred["kinds"], default="literal")
+    values = pred["values"]
+    if kind == "literal":
+        dtype = s.cat.categories.dtype if isinstance(s.dtype, pd.CategoricalDtype) else s.dtype
+        values = literal_values(pred, pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype))
+    values = [operand(v, kind) for v in values]
+
+    if op == "EQ":
+        mask = s == values[0]
+    elif op == "NE":
+        mask = s != values[0]
+    elif op == "GT":
+        mask = s > values[0]
+    elif op == "GE":
+        mask = s >= values[0]
+    elif op == "LT":
+        mask = s < values[0]
+    elif op == "LE":
+        mask = s <= values[0]
+    elif op == "IN":
+        mask = s.isin(values)
+    elif op in ("CONTAINS", "OMITS"):
+        text = s.astype("string")
+        mask = pd.Series(False, index=df.index)
+        for v in values:
+            mask |= text.str.contains(str(v), regex=False, na=False)
+        if op == "OMITS":
+            mask = ~mask
+    elif op == "LIKE":
+        text = s.astype("string")
+        mask = pd.Series(False, index=df.index)
+        for v in values:
+            mask |= text.str.match(_like_regex(v), na=False)
+    elif op == "FROM":
+        mask = (s >= values[0]) & (s <= values[1])
+    elif op == "MISSING":
+        mask = s.isna()
+    else:
+        raise ValueError(f"Unsupported operator {op}")
+
+    mask = mask.fillna(False).astype(bool)
+    mask = ~mask if pred["negate"] else mask
+    if op != "MISSING":
+        # SQL never matches NULL, negated or not (<>, NOT IN, NOT LIKE); the client
+        # side drops missing values too so pushdown and pandas keep the same rows
+        for operand_values in [s] + [v for v in values if isinstance(v, pd.Series)]:
+            mask &= operand_values.notna()
+    return mask
+
+
+def apply_filters_client(df, predicates):
+    """Applies predicates with pandas; unresolved &variables are skipped with a warning"""
+
+    mask = pd.Series(True, index=df.index)
+    for pred in predicates:
+        if "variable" in pred["kinds"]:
+            print(f"⚠️ Skipping filter with unresolved variable: {pred['text']}")
+            continue
+        if "column" in pred["kinds"] and not all(
+            v in df.columns for v in pred["values"]
+        ):
+            print(f"⚠️ Skipping filter on unknown column: {pred['text']}")
+            continue
+        mask &= predicate_mask(df, pred)
+    return df[mask]
@@ -0,0 +1,227 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from concurrent.futures import Future
+
+from fex_minify import minify_fex
+from fex_chunker import merge_metadata
+
+
+INCLUDE_LINE = re.compile(r"^\s*-INCLUDE\s+(\S+)", re.I | re.M)
+FEX_EXTENSIONS = (".fex", ".txt")
+INCLUDE_CACHE_FILE = ".fex_include_cache.json"
+
+
+def find_includes(fex_content):
+    return [m.group(1).strip("'\"") for m in INCLUDE_LINE.finditer(fex_content)]
+
+
+def strip_includes(fex_content):
+    return INCLUDE_LINE.sub("", fex_content)
+
+
+def fingerprint(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IncludeResolver:
+    """Resolves -INCLUDE graphs under a FEX repository and memoises per-file metadata"""
+
+    def __init__(self, repo_root, extract_fn, cache_path=None, model=None, schema=None):
+        """model and schema (the JSON schema extract_fn answers in) are part of every cache key,
+        so switching either re-extracts instead of reusing stale metadata"""
+
+        self.repo_root = os.path.abspath(repo_root)
+        self.extract_fn = extract_fn
+        self.cache_path = cache_path or os.path.join(self.repo_root, INCLUDE_CACHE_FILE)
+        self._key_prefix = fingerprint(json.dumps([model, schema], sort_keys=True, default=str))
+        self._index = None
+        self._graph = {}
+        self._unresolved = {}
+        self._cache = self._load_cache()
+        self.hits = 0
+        self.misses = 0
+        # batch runs share one resolver across worker threads; one extraction per content hash
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _load_cache(self):
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable include cache {self.cache_path}: {e}")
+        return {}
+
+    def _save_cache(self):
+        # called with self._lock held
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f)
+        os.replace(tmp, self.cache_path)
+
+    def _build_index(self):
+        index = {}
+        for folder, _, files in os.walk(self.repo_root):
+            for name in files:
+                stem, ext = os.path.splitext(name)
+                if ext.lower() not in FEX_EXTENSIONS:
+                    continue
+                path = os.path.join(folder, name)
+                rel = os.path.relpath(path, self.repo_root).replace(os.sep, "/")
+                index.setdefault(stem.lower(), path)
+                index.setdefault(os.path.splitext(rel)[0].lower(), path)
+        return index
+
+    def find_include(self, name, from_path):
+        # -INCLUDE app/name, -INCLUDE name.fex and IBFS:/WFC/Repository/app/name all resolve here
+        ref = name.replace("\\", "/").split(":", 1)[-1].strip("/")
+
+        candidate = os.path.join(os.path.dirname(from_path), ref)
+        for ext in ("",) + FEX_EXTENSIONS:
+            if os.path.isfile(candidate + ext):
+                return os.path.abspath(candidate + ext)
+
+        with self._lock:
+            if self._index is None:
+                self._index = self._build_index()
+
+        key = os.path.splitext(ref)[0].lower()
+        parts = key.split("/")
+        for i in range(len(parts)):
+            path = self._index.get("/".join(parts[i:]))
+            if path:
+                return path
+        return None
+
+    def _read(self, path):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    def includes_of(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._graph:
+                return self._graph[path]
+
+        children, missing = [], []
+        for name in find_includes(self._read(path)):
+            resolved = self.find_include(name, path)
+            if resolved:
+                children.append(resolved)
+            else:
+                missing.append(name)
+
+        # threads resolving the same file store one result instead of appending twice
+        with self._lock:
+            if path not in self._graph:
+                self._graph[path] = children
+                if missing:
+                    self._unresolved[path] = missing
+            return self._graph[path]
+
+    def build_graph(self, root_path):
+        """Returns the include DAG reachable from root_path, raising on cycles"""
+
+        root_path = os.path.abspath(root_path)
+        state = {}
+        stack = []
+
+        def visit(path):
+            if state.get(path) == "done":
+                return
+            if state.get(path) == "active":
+                cycle = stack[stack.index(path):] + [path]
+                names = " -> ".join(os.path.relpath(p, self.repo_root) for p in cycle)
+                raise Exception(f"❌ -INCLUDE cycle detected: {names}")
+
+            state[path] = "active"
+            stack.append(path)
+            for child in self.includes_of(path):
+                visit(child)
+            stack.pop()
+            state[path] = "done"
+
+        visit(root_path)
+        return {p: self._graph[p] for p in state}
+
+    def own_metadata(self, path):
+        """Metadata of a single file without its includes, memoised by content hash"""
+
+        content = minify_fex(strip_includes(self._read(path)))
+        if not content.strip():
+            return None
+
+        key = fingerprint(self._key_prefix + content)
+
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+            else:
+                self.hits += 1
+
+        if not owner:
+            # the same include is being extracted for another report right now
+            return future.result()
+
+        try:
+            metadata = self.extract_fn(content)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if metadata is not None:
+                self._cache[key] = metadata
+                self._save_cache()
+            del self._inflight[key]
+        future.set_result(metadata)
+        return metadata
+
+    def expanded_metadata(self, root_path):
+        root_path = os.path.abspath(root_path)
+        graph = self.build_graph(root_path)
+
+        expanded = {}
+
+        def expand(path):
+            if path in expanded:
+                return expanded[path]
+
+            parts = [self.own_metadata(path)]
+            parts += [expand(child) for child in graph[path]]
+            parts = [p for p in parts if p is not None]
+            expanded[path] = merge_metadata(parts) if parts else None
+            return expanded[path]
+
+        metadata = expand(root_path)
+        if metadata is None:
+            return None
+
+        deps = [os.path.relpath(p, self.repo_root).replace(os.sep, "/") for p in graph if p != root_path]
+        with self._lock:
+            unresolved = list(self._unresolved.items())
+        for path, names in unresolved:
+            if path in graph:
+                deps += [f"{n} (unresolved)" for n in names]
+
+        metadata["dependencies"] = deps + [
+            d for d in metadata.get("dependencies", []) if d not in deps
+        ]
+
+        print(
+            f"🔗 Resolved {len(graph) - 1} include(s) | "
+            f"metadata cache hits: {self.hits}, extracted: {self.misses}"
+        )
+        return metadata
@@ -0,0 +1,123 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+MODEL_TOKEN_BUDGETS = {
+    "gpt-5-nano": 272000,
+    "gpt-5-mini": 272000,
+    "gpt-5": 272000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_TOKEN_BUDGET = 128000
+
+STYLE_START = re.compile(r"^\s*(ON\s+TABLE\s+SET\s+)?STYLE\s*\*", re.I)
+STYLE_END = re.compile(r"^\s*ENDSTYLE\b", re.I)
+SET_DIRECTIVE = re.compile(r"^\s*(ON\s+TABLE\s+)?SET\s+[\w\-]+\s*=?", re.I)
+HEADER_FIELD = re.compile(r"^-\*\s*([A-Za-z][\w ]*?)\s*:\s*(\S.*)$")
+QUOTED_OR_SPACE = re.compile(r"('[^']*'|\"[^\"]*\")|\s+")
+
+
+def _collapse_whitespace(line):
+    return QUOTED_OR_SPACE.sub(lambda m: m.group(1) or " ", line).strip()
+
+
+def minify_fex(fex_content):
+    """Strips comments, styling blocks, SET directives and extra whitespace"""
+
+    kept = []
+    in_style = False
+
+    for line in fex_content.splitlines():
+        stripped = line.strip()
+
+        if in_style:
+            if STYLE_END.match(stripped):
+                in_style = False
+            continue
+
+        if STYLE_START.match(stripped):
+            in_style = not STYLE_END.search(stripped)
+            continue
+
+        if not stripped:
+            continue
+
+        if stripped.startswith("-*"):
+            # banners are noise, but "-* AUTHOR : x" style header fields are metadata
+            field = HEADER_FIELD.match(stripped)
+            if field:
+                kept.append(f"-* {field.group(1)}: {_collapse_whitespace(field.group(2))}")
+            continue
+
+        if SET_DIRECTIVE.match(stripped):
+            continue
+
+        kept.append(_collapse_whitespace(stripped))
+
+    return "\n".join(kept)
+
+
+_ENCODINGS = {}
+
+
+def _encoding(model):
+    """tiktoken encoding of the model, or None when it cannot be loaded; cached either way"""
+
+    if tiktoken is None:
+        return None
+    if model not in _ENCODINGS:
+        try:
+            try:
+                enc = tiktoken.encoding_for_model(model)
+            except KeyError:
+                enc = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # the BPE file is downloaded on first use, which fails offline
+            print(f"⚠️ tiktoken encoding for {model} unavailable ({e}); estimating tokens from characters")
+            enc = None
+        _ENCODINGS[model] = enc
+    return _ENCODINGS[model]
+
+
+def count_tokens(text, model="gpt-5-nano"):
+    enc = _encoding(model)
+    if enc is not None:
+        return len(enc.encode(text))
+
+    # ~4 characters per token is close enough for budgeting without tiktoken
+    return (len(text) + 3) // 4
+
+
+def token_budget(model):
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+def prepare_fex_for_prompt(fex_content, model="gpt-5-nano"):
+    reduced = minify_fex(fex_content)
+
+    before = count_tokens(fex_content, model)
+    after = count_tokens(reduced, model)
+    budget = token_budget(model)
+    saved = (1 - after / before) * 100 if before else 0.0
+
+    stats = {
+        "original_chars": len(fex_content),
+        "reduced_chars": len(reduced),
+        "original_tokens": before,
+        "reduced_tokens": after,
+        "token_budget": budget,
+        "within_budget": after <= budget,
+    }
+
+    print(
+        f"✂️ FEX reduced: {len(fex_content)} → {len(reduced)} chars | "
+        f"{before} → {after} tokens ({saved:.1f}% smaller) | budget {budget} for {model}"
+    )
+    if not stats["within_budget"]:
+        print(f"⚠️ Reduced FEX still exceeds the {model} token budget ({after} > {budget})")
+
+    return reduced, stats
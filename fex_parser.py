@@ -0,0 +1,394 @@
+import re
+
+from fex_chunker import split_fex_sections, REQUEST_END
+from fex_filters import extract_where_filters, extract_if_filters, extract_total_filters
+
+
+TOKEN = re.compile(
+    r"'(?:[^']|'')*'|\"[^\"]*\"|[A-Za-z_&][\w.#$&]*|\d+(?:\.\d+)?|<>|>=|<=|\|\||[-+*/=;(),<>%]"
+)
+
+VERBS = {"PRINT", "LIST", "SUM", "WRITE", "ADD", "COUNT"}
+SORTS = {"BY", "ACROSS"}
+STOP_WORDS = VERBS | SORTS | {"COMPUTE", "END", "RECAP", "IF"}
+FIELD_NOISE = {"AND", "OVER", "NOPRINT", "NOSORT", "TOTAL", "HIGHEST", "LOWEST", "TOP"}
+PREFIX_OPERATORS = {
+    "SUM", "AVE", "MAX", "MIN", "CNT", "DST", "FST", "LST", "PCT", "TOT", "ASQ",
+    "RPCT", "MDN", "MDE",
+}
+SKIPPED_LINE = re.compile(r"^(WHERE|IF|ON|HEADING|FOOTING|SUBHEAD|SUBFOOT|\"|-)", re.I)
+FILTER_LINE = re.compile(r"^(WHERE|IF)\b", re.I)
+# a COMPUTE/DEFINE expression continued on a line of its own, not an IF test
+IF_EXPRESSION_LINE = re.compile(r"^IF\b.*\bTHEN\b", re.I)
+# "  AND STATUS NE 'X';" under an unterminated WHERE/IF belongs to that filter
+FILTER_CONTINUATION = re.compile(r"^(AND|OR)\b", re.I)
+STYLE_START = re.compile(r"^(ON\s+TABLE\s+)?SET\s+STYLE(SHEET)?\s*\*", re.I)
+OUTPUT_FORMAT = re.compile(r"^ON\s+TABLE\s+(?:PCHOLD|HOLD|SAVE)\b.*?\bFORMAT\s+(\w+)", re.I)
+JOIN_RE = re.compile(
+    r"^JOIN\s+(?:(LEFT_OUTER|RIGHT_OUTER|FULL_OUTER|INNER)\s+)?(.+?)\s+IN\s+(\S+)\s+"
+    r"TO\s+(?:(UNIQUE|MULTIPLE|ALL)\s+)?(.+?)\s+IN\s+(\S+)(?:\s+TAG\s+\S+)?"
+    r"(?:\s+AS\s+(\S+))?(?:\s+END)?\s*$",
+    re.I | re.S,
+)
+EXPRESSION_KEYWORDS = {
+    "IF", "THEN", "ELSE", "AND", "OR", "NOT", "EQ", "NE", "GT", "GE", "LT", "LE",
+    "IN", "IS", "MISSING", "CONTAINS", "OMITS", "LIKE", "FROM", "TO",
+}
+
+
+def tokenize(text):
+    return TOKEN.findall(text)
+
+
+def split_field(token):
+    """'AVE.ORDER_AMOUNT' -> ('AVE', 'ORDER_AMOUNT'); 'ORDERS.QTY' -> (None, 'ORDERS.QTY')"""
+
+    parts = token.split(".")
+    prefix = []
+    while len(parts) > 1 and parts[0].upper() in PREFIX_OPERATORS:
+        prefix.append(parts.pop(0).upper())
+    return (".".join(prefix) or None), ".".join(parts)
+
+
+def column_name(field):
+    return field.rpartition(".")[2]
+
+
+def _read_format(tokens, i):
+    """Reads '/D12.2' or '/P6.2%' style formats starting at tokens[i] == '/'"""
+
+    i += 1
+    if i >= len(tokens):
+        return "", i
+    fmt = tokens[i]
+    i += 1
+    if i < len(tokens) and tokens[i] == "%":
+        fmt += "%"
+        i += 1
+    return fmt, i
+
+
+def parse_assignments(tokens, i, kind, stop=()):
+    """Parses 'NAME/FMT = expr;' statements used by COMPUTE and DEFINE"""
+
+    fields = []
+    while i + 1 < len(tokens):
+        name = tokens[i]
+        if not re.match(r"^[A-Za-z_]", name) or name.upper() in stop:
+            break
+        if tokens[i + 1] not in ("/", "="):
+            break
+
+        i += 1
+        fmt = ""
+        if tokens[i] == "/":
+            fmt, i = _read_format(tokens, i)
+        if i >= len(tokens) or tokens[i] != "=":
+            break
+
+        i += 1
+        expr = []
+        while i < len(tokens) and tokens[i] != ";":
+            expr.append(tokens[i])
+            i += 1
+        i += 1
+
+        title = None
+        if i + 1 < len(tokens) and tokens[i].upper() == "AS" and tokens[i + 1][0] in "'\"":
+            title = tokens[i + 1][1:-1]
+            i += 2
+
+        fields.append({
+            "name": name,
+            "format": fmt,
+            "expression": " ".join(expr),
+            "tokens": expr,
+            "kind": kind,
+            "title": title,
+        })
+    return fields, i
+
+
+def expression_identifiers(expr_tokens):
+    names = []
+    for idx, tok in enumerate(expr_tokens):
+        if not re.match(r"^[A-Za-z_]", tok) or tok.upper() in EXPRESSION_KEYWORDS:
+            continue
+        if idx + 1 < len(expr_tokens) and expr_tokens[idx + 1] == "(":
+            continue  # function call
+        names.append(tok)
+    return names
+
+
+def parse_join(text):
+    m = JOIN_RE.match(" ".join(text.split()))
+    if not m:
+        return None
+
+    join_type, left, host, _, right, cross, alias = m.groups()
+    left_cols = [c.strip() for c in re.split(r"\s+AND\s+", left, flags=re.I)]
+    right_cols = [c.strip() for c in re.split(r"\s+AND\s+", right, flags=re.I)]
+
+    return {
+        "left_table": host,
+        "left_columns": [column_name(c) for c in left_cols],
+        "right_table": cross,
+        "right_columns": [column_name(c) for c in right_cols],
+        "join_type": {
+            "LEFT_OUTER": "left", "RIGHT_OUTER": "right", "FULL_OUTER": "full",
+        }.get((join_type or "").upper(), "inner"),
+        "alias": alias,
+    }
+
+
+def parse_request(lines):
+    """Parses one TABLE FILE ... END request into its verbs, sort fields and computes"""
+
+    request = {
+        "file": None,
+        "fields": [],
+        "by": [],
+        "across": [],
+        "computes": [],
+        "filters": extract_where_filters("\n".join(lines)) + extract_if_filters("\n".join(lines)),
+        "total_filters": extract_total_filters("\n".join(lines)),
+        "output_format": None,
+    }
+
+    body = []
+    in_style = False
+    in_filter = False
+    for line in lines:
+        stripped = line.strip()
+        # END or RUN closes the request
+        if REQUEST_END.match(stripped):
+            break
+        # inline StyleSheet blocks (TYPE=REPORT, ... $) are not report fields
+        if in_style or STYLE_START.match(stripped):
+            in_style = not stripped.upper().startswith("ENDSTYLE")
+            continue
+        if in_filter and FILTER_CONTINUATION.match(stripped):
+            in_filter = not stripped.endswith(";")
+            continue
+        in_filter = (
+            bool(FILTER_LINE.match(stripped))
+            and not IF_EXPRESSION_LINE.match(stripped)
+            and not stripped.endswith(";")
+        )
+        fmt = OUTPUT_FORMAT.match(stripped)
+        if fmt:
+            request["output_format"] = fmt.group(1).upper()
+        if not SKIPPED_LINE.match(stripped) or IF_EXPRESSION_LINE.match(stripped):
+            body.append(line)
+
+    tokens = tokenize("\n".join(body))
+    i = 0
+    verb = None
+
+    while i < len(tokens):
+        tok = tokens[i]
+        upper = tok.upper()
+
+        if upper in ("TABLE", "GRAPH", "MATCH") and i + 2 < len(tokens) and tokens[i + 1].upper() == "FILE":
+            request["file"] = tokens[i + 2]
+            i += 3
+            continue
+
+        if upper == "END":
+            break
+
+        if upper in VERBS:
+            verb = upper
+            i += 1
+            continue
+
+        if upper in SORTS:
+            i += 1
+            while i < len(tokens) and (tokens[i].upper() in FIELD_NOISE or tokens[i].isdigit()):
+                i += 1
+            if i < len(tokens):
+                field = {"field": tokens[i], "title": None}
+                i += 1
+                if i + 1 < len(tokens) and tokens[i].upper() == "AS":
+                    field["title"] = tokens[i + 1][1:-1]
+                    i += 2
+                request["by" if upper == "BY" else "across"].append(field)
+            continue
+
+        if upper == "COMPUTE":
+            computes, i = parse_assignments(tokens, i + 1, "compute", STOP_WORDS)
+            request["computes"].extend(computes)
+            continue
+
+        if verb and re.match(r"^[A-Za-z_*]", tok) and upper not in FIELD_NOISE:
+            prefix, field = split_field(tok)
+            entry = {"verb": verb, "prefix": prefix, "field": field, "format": "", "title": None}
+            i += 1
+            if i < len(tokens) and tokens[i] == "/":
+                entry["format"], i = _read_format(tokens, i)
+            if i + 1 < len(tokens) and tokens[i].upper() == "AS":
+                entry["title"] = tokens[i + 1][1:-1]
+                i += 2
+            request["fields"].append(entry)
+            continue
+
+        i += 1
+
+    return request
+
+
+def parse_define(lines):
+    tokens = tokenize("\n".join(lines))
+    # DEFINE FILE <name> [ADD]
+    i = 3 if len(tokens) > 2 else len(tokens)
+    if i < len(tokens) and tokens[i].upper() == "ADD":
+        i += 1
+    fields, _ = parse_assignments(tokens, i, "define", {"END"})
+    return tokens[2] if len(tokens) > 2 else None, fields
+
+
+def parse_fex(fex_content):
+    """Local, LLM-free parse of the joins, defines and requests in a FEX"""
+
+    _, sections = split_fex_sections(fex_content)
+    parsed = {"joins": [], "defines": [], "requests": []}
+
+    for section in sections:
+        if section["kind"] == "join":
+            join = parse_join("\n".join(section["lines"]))
+            if join:
+                parsed["joins"].append(join)
+        elif section["kind"] == "define":
+            file_name, fields = parse_define(section["lines"])
+            for f in fields:
+                f["file"] = file_name
+            parsed["defines"].extend(fields)
+        elif section["kind"] == "request":
+            parsed["requests"].append(parse_request(section["lines"]))
+
+    return parsed
+
+
+COMPARISONS = {
+    "EQ": "EQ", "=": "EQ", "NE": "NE", "<>": "NE", "GT": "GT", ">": "GT",
+    "GE": "GE", ">=": "GE", "LT": "LT", "<": "LT", "LE": "LE", "<=": "LE",
+}
+
+
+class ExpressionParser:
+    """Recursive-descent parser turning COMPUTE/DEFINE tokens into a small tuple AST"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.i = 0
+
+    def peek(self, offset=0):
+        j = self.i + offset
+        return self.tokens[j] if j < len(self.tokens) else None
+
+    def take(self, expected=None):
+        tok = self.peek()
+        if tok is None or (expected and tok.upper() != expected):
+            raise ValueError(f"Expected {expected or 'a token'} at position {self.i}, got {tok!r}")
+        self.i += 1
+        return tok
+
+    def parse(self):
+        node = self.expr()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected token {self.peek()!r} in expression")
+        return node
+
+    def expr(self):
+        if (self.peek() or "").upper() == "IF":
+            self.take("IF")
+            cond = self.expr_or()
+            self.take("THEN")
+            then = self.expr()
+            self.take("ELSE")
+            return ("if", cond, then, self.expr())
+        return self.expr_or()
+
+    def expr_or(self):
+        node = self.expr_and()
+        while (self.peek() or "").upper() == "OR":
+            self.take()
+            node = ("or", node, self.expr_and())
+        return node
+
+    def expr_and(self):
+        node = self.expr_not()
+        while (self.peek() or "").upper() == "AND":
+            self.take()
+            node = ("and", node, self.expr_not())
+        return node
+
+    def expr_not(self):
+        if (self.peek() or "").upper() == "NOT":
+            self.take()
+            return ("not", self.expr_not())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.additive()
+        op = COMPARISONS.get((self.peek() or "").upper())
+        if op:
+            self.take()
+            node = ("cmp", op, node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.term()
+        while self.peek() in ("+", "-", "||"):
+            op = self.take()
+            node = ("bin", op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.power()
+        while self.peek() in ("*", "/") and not (self.peek() == "*" and self.peek(1) == "*"):
+            op = self.take()
+            node = ("bin", op, node, self.power())
+        return node
+
+    def power(self):
+        node = self.unary()
+        while self.peek() == "*" and self.peek(1) == "*":
+            self.i += 2
+            node = ("bin", "**", node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek() == "-":
+            self.take()
+            return ("neg", self.unary())
+        if self.peek() == "+":
+            self.take()
+        return self.atom()
+
+    def atom(self):
+        tok = self.take()
+        if tok == "(":
+            node = self.expr()
+            self.take(")")
+            return node
+        if tok[0] in "'\"":
+            return ("str", tok[1:-1].replace("''", "'"))
+        if re.fullmatch(r"\d+(\.\d+)?", tok):
+            return ("num", float(tok) if "." in tok else int(tok))
+        if re.match(r"^[A-Za-z_&]", tok):
+            if self.peek() == "(":
+                self.take("(")
+                args = []
+                while self.peek() != ")":
+                    args.append(self.expr())
+                    if self.peek() == ",":
+                        self.take()
+                self.take(")")
+                return ("call", tok.upper(), args)
+            return ("col", tok)
+        raise ValueError(f"Unexpected token {tok!r} in expression")
+
+
+def parse_expression(tokens):
+    return ExpressionParser(list(tokens)).parse()
@@ -0,0 +1,106 @@
+from fex_parser import parse_fex, column_name, expression_identifiers, tokenize
+from fex_filters import collect_predicates
+
+
+ALL_COLUMNS = "*"
+
+
+def _add(refs, table, field):
+    table = (table or ALL_COLUMNS).lower()
+    refs.setdefault(table, set()).add(column_name(field).lower())
+
+
+def _metadata_columns(metadata, refs):
+    for item in metadata.get("output_columns", []) or []:
+        col = item.get("column") if isinstance(item, dict) else item
+        if isinstance(col, str) and col.strip():
+            table, _, name = col.strip().rpartition(".")
+            _add(refs, table or None, name)
+
+    for j in metadata.get("joins", []) or []:
+        if not isinstance(j, dict):
+            continue
+        for side in ("left", "right"):
+            if j.get(f"{side}_column"):
+                _add(refs, j.get(f"{side}_table"), str(j[f"{side}_column"]))
+
+    filters = [f for f in metadata.get("filters", []) or [] if isinstance(f, str)]
+    predicates, _ = collect_predicates(filters)
+    for p in predicates:
+        _add(refs, p["table"], p["column"])
+
+
+def referenced_columns(fex_content, metadata=None):
+    """Lower-cased column names the FEX touches, per table ('*' = any table), or None for all"""
+
+    parsed = parse_fex(fex_content)
+    refs = {}
+
+    for j in parsed["joins"]:
+        for c in j["left_columns"]:
+            _add(refs, j["left_table"], c)
+        for c in j["right_columns"]:
+            _add(refs, j["right_table"], c)
+
+    for d in parsed["defines"]:
+        for name in expression_identifiers(d["tokens"]):
+            _add(refs, None, name)
+
+    for request in parsed["requests"]:
+        if request["file"]:
+            refs.setdefault(request["file"].lower(), set())
+
+        for f in request["fields"]:
+            if f["field"] == "*":
+                return None
+            table, _, _ = f["field"].rpartition(".")
+            _add(refs, table or None, f["field"])
+
+        for f in request["by"] + request["across"]:
+            table, _, _ = f["field"].rpartition(".")
+            _add(refs, table or None, f["field"])
+
+        for c in request["computes"]:
+            for name in expression_identifiers(c["tokens"]):
+                _add(refs, None, name)
+
+        predicates, skipped = collect_predicates(request["filters"])
+        for p in predicates:
+            _add(refs, p["table"], p["column"])
+            for v in p["values"]:
+                if "column" in p["kinds"] and isinstance(v, str):
+                    _add(refs, None, v)
+
+        # the local engine evaluates these as expressions, so every name they use must load
+        for text in skipped + request["total_filters"]:
+            for name in expression_identifiers(tokenize(text)):
+                _add(refs, None, name)
+
+    if metadata:
+        _metadata_columns(metadata, refs)
+
+    if not parsed["requests"] and not refs:
+        return None
+    return refs
+
+
+def project_columns(refs, table_name, source_columns):
+    """Maps referenced names onto the real source columns; None means load everything"""
+
+    # tables the FEX never names (extra extracts) are kept whole
+    if refs is None or str(table_name).lower() not in refs:
+        return None
+
+    wanted = refs.get(ALL_COLUMNS, set()) | refs.get(str(table_name).lower(), set())
+    selected = [c for c in source_columns if str(c).lower() in wanted]
+
+    if not selected:
+        return None
+    return selected
+
+
+def describe_projection(table_name, selected, source_columns):
+    if selected is None:
+        print(f"📐 {table_name}: loading all {len(source_columns)} columns")
+    else:
+        print(f"📐 {table_name}: loading {len(selected)} of {len(source_columns)} columns")
@@ -0,0 +1,127 @@
+import os
+import time
+
+from fex_minify import HEADER_FIELD
+from fex_parser import parse_fex, column_name
+from lineage_catalog import FEX_EXTENSIONS
+
+
+WATCH_INTERVAL = 1.0
+# a save is only picked up once the files have been quiet this long
+DEBOUNCE_SECONDS = 0.75
+
+
+def list_fex_files(root):
+    if os.path.isfile(root):
+        return [os.path.abspath(root)]
+    return sorted(
+        os.path.abspath(os.path.join(d, f)) for d, _, names in os.walk(root) for f in names
+        if f.lower().endswith(FEX_EXTENSIONS)
+    )
+
+
+def snapshot(paths):
+    """{path: (mtime_ns, size)} for the paths that exist"""
+
+    state = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        state[path] = (st.st_mtime_ns, st.st_size)
+    return state
+
+
+class PollingWatcher:
+    """Stat-polls a FEX folder plus fixed source files and reports debounced change sets"""
+
+    def __init__(self, fex_root, source_files, interval=WATCH_INTERVAL, debounce=DEBOUNCE_SECONDS):
+        self.fex_root = fex_root
+        self.source_files = [os.path.abspath(p) for p in source_files]
+        self.interval = interval
+        self.debounce = debounce
+        self.state = self._scan()
+
+    def _scan(self):
+        return snapshot(list_fex_files(self.fex_root) + self.source_files)
+
+    def _diff(self, old, new):
+        return {p for p in set(old) | set(new) if old.get(p) != new.get(p)}
+
+    def wait_for_changes(self):
+        """Blocks until something changed and then stayed unchanged for the debounce window"""
+
+        while True:
+            time.sleep(self.interval)
+            current = self._scan()
+            if not self._diff(self.state, current):
+                continue
+
+            # editors and extract jobs write in bursts; wait for the burst to end
+            while True:
+                time.sleep(self.debounce)
+                settled = self._scan()
+                if not self._diff(current, settled):
+                    break
+                current = settled
+
+            # a file saved and then restored within the burst is not a change
+            changed = self._diff(self.state, current)
+            self.state = current
+            if changed:
+                return changed
+
+
+def header_fields(fex_content):
+    fields = {}
+    for line in fex_content.splitlines():
+        m = HEADER_FIELD.match(line.strip())
+        if m:
+            fields[m.group(1).strip().upper()] = m.group(2).strip()
+    return fields
+
+
+def local_metadata(fex_content, file_path):
+    """Metadata from the local parse only, for watch mode where an LLM round trip is too slow"""
+
+    parsed = parse_fex(fex_content)
+    header = header_fields(fex_content)
+
+    datasources, outputs, filters = [], [], []
+    for request in parsed["requests"]:
+        if request["file"] and request["file"] not in [d["table_name"] for d in datasources]:
+            datasources.append({"table_name": request["file"], "type": "explicit"})
+        for f in request["fields"] + request["by"] + request["across"]:
+            name = column_name(f["field"])
+            if f["field"] != "*" and name not in outputs:
+                outputs.append(name)
+        filters += request["filters"]
+
+    joins = [
+        {
+            "left_table": j["left_table"],
+            "left_column": column_name(lc),
+            "right_table": j["right_table"],
+            "right_column": column_name(rc),
+            "join_type": j["join_type"],
+            "identified_from": "explicit",
+        }
+        for j in parsed["joins"]
+        for lc, rc in zip(j["left_columns"], j["right_columns"])
+    ]
+
+    return {
+        "report_name": header.get("REPORT NAME") or os.path.splitext(os.path.basename(file_path))[0],
+        "description": header.get("DESCRIPTION", ""),
+        "author": header.get("AUTHOR", ""),
+        "inputs": [],
+        "datasources": datasources,
+        "joins": joins,
+        "filters": filters,
+        "output_columns": outputs,
+        "output_type": "",
+        "dependencies": [],
+        "performance_risks": [],
+        "recommendations": [],
+    }
@@ -0,0 +1,374 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+
+from fex_includes import fingerprint
+from fex_parser import parse_fex, column_name, expression_identifiers
+from fex_filters import collect_predicates
+
+
+CATALOG_PATH = "fex_lineage.db"
+FEX_EXTENSIONS = (".fex", ".txt")
+# part of every report's content hash, so a change to lineage_rows re-analyses indexed reports
+LINEAGE_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id    INTEGER PRIMARY KEY,
+    path         TEXT UNIQUE NOT NULL,
+    report_name  TEXT,
+    description  TEXT,
+    author       TEXT,
+    output_type  TEXT,
+    content_hash TEXT NOT NULL,
+    analysed_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS report_tables (
+    report_id  INTEGER NOT NULL REFERENCES reports(report_id) ON DELETE CASCADE,
+    table_name TEXT NOT NULL,
+    role       TEXT NOT NULL,
+    PRIMARY KEY (report_id, table_name, role)
+);
+CREATE TABLE IF NOT EXISTS report_columns (
+    report_id   INTEGER NOT NULL REFERENCES reports(report_id) ON DELETE CASCADE,
+    table_name  TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    role        TEXT NOT NULL,
+    PRIMARY KEY (report_id, table_name, column_name, role)
+);
+CREATE TABLE IF NOT EXISTS report_joins (
+    report_id    INTEGER NOT NULL REFERENCES reports(report_id) ON DELETE CASCADE,
+    left_table   TEXT, left_column  TEXT,
+    right_table  TEXT, right_column TEXT,
+    join_type    TEXT
+);
+CREATE TABLE IF NOT EXISTS report_filters (
+    report_id INTEGER NOT NULL REFERENCES reports(report_id) ON DELETE CASCADE,
+    filter    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS report_fields (
+    report_id  INTEGER NOT NULL REFERENCES reports(report_id) ON DELETE CASCADE,
+    name       TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    format     TEXT,
+    expression TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tables_name ON report_tables (table_name);
+CREATE INDEX IF NOT EXISTS idx_columns_name ON report_columns (column_name, table_name);
+CREATE INDEX IF NOT EXISTS idx_columns_table ON report_columns (table_name, column_name);
+CREATE INDEX IF NOT EXISTS idx_fields_name ON report_fields (name);
+"""
+
+# unqualified fields whose table can't be told from the FEX alone
+ANY_TABLE = "*"
+
+
+def _norm(name):
+    return str(name or "").strip().upper()
+
+
+def lineage_rows(fex_content, metadata=None):
+    """Tables, columns, joins, filters and computed fields a FEX uses, from the local parse plus metadata"""
+
+    parsed = parse_fex(fex_content)
+    tables, columns, joins, filters, fields = set(), set(), [], [], []
+
+    def add_column(field, default_table, role):
+        table, _, _ = field.rpartition(".")
+        columns.add((_norm(table or default_table or ANY_TABLE), _norm(column_name(field)), role))
+
+    def host_of(file_name):
+        """Table an unqualified field of a FILE belongs to; with JOINs it can be any joined table"""
+
+        joined, frontier = set(), {_norm(file_name)}
+        while frontier:
+            frontier = {
+                _norm(j["right_table"]) for j in parsed["joins"] if _norm(j["left_table"]) in frontier
+            } - joined
+            joined |= frontier
+        return None if joined else file_name
+
+    for j in parsed["joins"]:
+        tables.add((_norm(j["left_table"]), "join"))
+        tables.add((_norm(j["right_table"]), "join"))
+        for lc, rc in zip(j["left_columns"], j["right_columns"]):
+            add_column(lc, j["left_table"], "join")
+            add_column(rc, j["right_table"], "join")
+            joins.append((_norm(j["left_table"]), _norm(lc), _norm(j["right_table"]), _norm(rc), j["join_type"]))
+
+    for d in parsed["defines"]:
+        fields.append((d["name"], "define", d["format"], d["expression"]))
+        for name in expression_identifiers(d["tokens"]):
+            add_column(name, host_of(d.get("file")) if d.get("file") else None, "define_input")
+
+    for request in parsed["requests"]:
+        file_name = request["file"]
+        if file_name:
+            tables.add((_norm(file_name), "datasource"))
+        host = host_of(file_name) if file_name else None
+
+        for f in request["fields"]:
+            if f["field"] != "*":
+                add_column(f["field"], host, "output")
+        for f in request["by"] + request["across"]:
+            add_column(f["field"], host, "sort")
+
+        for c in request["computes"]:
+            fields.append((c["name"], "compute", c["format"], c["expression"]))
+            for name in expression_identifiers(c["tokens"]):
+                add_column(name, host, "compute_input")
+
+        filters += request["filters"]
+        predicates, _ = collect_predicates(request["filters"])
+        for p in predicates:
+            add_column(p["column"], p["table"] or host, "filter")
+
+    for ds in (metadata or {}).get("datasources", []) or []:
+        if isinstance(ds, dict) and ds.get("table_name"):
+            tables.add((_norm(ds["table_name"]), "datasource"))
+
+    for col in (metadata or {}).get("output_columns", []) or []:
+        if isinstance(col, str) and col.strip():
+            add_column(col.strip(), None, "output")
+
+    for f in (metadata or {}).get("filters", []) or []:
+        if isinstance(f, str) and f not in filters:
+            filters.append(f)
+
+    return {
+        "tables": sorted(tables),
+        "columns": sorted(columns),
+        "joins": sorted(set(joins)),
+        "filters": list(dict.fromkeys(filters)),
+        "fields": fields,
+    }
+
+
+class LineageCatalog:
+    """SQLite catalog of what every analysed report reads, indexed by table and column"""
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def upsert_report(self, path, fex_content, metadata=None):
+        """Inserts or replaces one report; unchanged content (same hash) is skipped"""
+
+        path = os.path.abspath(path)
+        content_hash = fingerprint(
+            f"{LINEAGE_VERSION}\n" + fex_content + repr(sorted((metadata or {}).items(), key=str))
+        )
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT report_id, content_hash FROM reports WHERE path = ?", (path,)
+            ).fetchone()
+            if row and row[1] == content_hash:
+                return False
+
+            rows = lineage_rows(fex_content, metadata)
+            meta = metadata or {}
+
+            with self.conn:
+                if row:
+                    # children go with the report via ON DELETE CASCADE
+                    self.conn.execute("DELETE FROM reports WHERE report_id = ?", (row[0],))
+
+                cur = self.conn.execute(
+                    "INSERT INTO reports (path, report_name, description, author, output_type, content_hash, analysed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        path, meta.get("report_name") or os.path.splitext(os.path.basename(path))[0],
+                        meta.get("description"), meta.get("author"), meta.get("output_type"),
+                        content_hash, time.time(),
+                    ),
+                )
+                rid = cur.lastrowid
+
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO report_tables VALUES (?, ?, ?)",
+                    [(rid, t, role) for t, role in rows["tables"]],
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO report_columns VALUES (?, ?, ?, ?)",
+                    [(rid, t, c, role) for t, c, role in rows["columns"]],
+                )
+                self.conn.executemany(
+                    "INSERT INTO report_joins VALUES (?, ?, ?, ?, ?, ?)",
+                    [(rid,) + j for j in rows["joins"]],
+                )
+                self.conn.executemany(
+                    "INSERT INTO report_filters VALUES (?, ?)", [(rid, f) for f in rows["filters"]]
+                )
+                self.conn.executemany(
+                    "INSERT INTO report_fields VALUES (?, ?, ?, ?, ?)", [(rid,) + f for f in rows["fields"]]
+                )
+            return True
+
+    def remove_report(self, path):
+        with self._lock, self.conn:
+            cur = self.conn.execute("DELETE FROM reports WHERE path = ?", (os.path.abspath(path),))
+            return cur.rowcount > 0
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            cur = self.conn.execute(sql, params)
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def reports_using_table(self, table):
+        """Reports that read a table, directly or through a JOIN"""
+
+        return self._query(
+            "SELECT r.report_name, r.path, GROUP_CONCAT(DISTINCT t.role) AS roles"
+            " FROM report_tables t JOIN reports r USING (report_id)"
+            " WHERE t.table_name = ? GROUP BY r.report_id ORDER BY r.report_name",
+            (_norm(table),),
+        )
+
+    def reports_using_column(self, column, table=None):
+        """Reports that touch a column; unqualified FEX fields match any table"""
+
+        if table:
+            where, params = "c.column_name = ? AND c.table_name IN (?, ?)", (_norm(column), _norm(table), ANY_TABLE)
+        else:
+            where, params = "c.column_name = ?", (_norm(column),)
+        return self._query(
+            "SELECT r.report_name, r.path, GROUP_CONCAT(DISTINCT c.role) AS roles"
+            f" FROM report_columns c JOIN reports r USING (report_id) WHERE {where}"
+            " GROUP BY r.report_id ORDER BY r.report_name",
+            params,
+        )
+
+    def impact(self, table, column=None):
+        """What breaks if a table (or one of its columns) changes: reports plus the fields built on it"""
+
+        reports = self.reports_using_column(column, table) if column else self.reports_using_table(table)
+        uses = re.compile(rf"\b{re.escape(column)}\b", re.I) if column else None
+        for r in reports:
+            fields = self._query(
+                "SELECT f.name, f.expression FROM report_fields f JOIN reports r USING (report_id) WHERE r.path = ?",
+                (r["path"],),
+            )
+            r["computed_fields"] = [
+                f["name"] for f in fields if uses is None or uses.search(f["expression"] or "")
+            ]
+        return reports
+
+    def report_lineage(self, name_or_path):
+        rows = self._query(
+            "SELECT report_id, report_name, path FROM reports WHERE path = ? OR report_name = ?",
+            (os.path.abspath(name_or_path), name_or_path),
+        )
+        out = []
+        for r in rows:
+            rid = r.pop("report_id")
+            r["tables"] = self._query("SELECT table_name, role FROM report_tables WHERE report_id = ?", (rid,))
+            r["columns"] = self._query(
+                "SELECT table_name, column_name, role FROM report_columns WHERE report_id = ?", (rid,)
+            )
+            r["joins"] = self._query(
+                "SELECT left_table, left_column, right_table, right_column, join_type"
+                " FROM report_joins WHERE report_id = ?", (rid,)
+            )
+            r["filters"] = [f["filter"] for f in self._query(
+                "SELECT filter FROM report_filters WHERE report_id = ?", (rid,)
+            )]
+            r["fields"] = self._query(
+                "SELECT name, kind, format, expression FROM report_fields WHERE report_id = ?", (rid,)
+            )
+            out.append(r)
+        return out
+
+    def stats(self):
+        counts = {}
+        for table in ("reports", "report_tables", "report_columns", "report_joins", "report_fields"):
+            counts[table] = self._query(f"SELECT COUNT(*) AS n FROM {table}")[0]["n"]
+        return counts
+
+    def index_paths(self, paths):
+        """Bulk (re)index FEX files or folders from the local parse only, no LLM calls"""
+
+        added = unchanged = 0
+        for root in paths:
+            files = [root] if os.path.isfile(root) else [
+                os.path.join(d, f) for d, _, names in os.walk(root) for f in names
+                if f.lower().endswith(FEX_EXTENSIONS)
+            ]
+            for path in files:
+                with open(path, "r", encoding="utf-8", errors="replace") as fh:
+                    if self.upsert_report(path, fh.read()):
+                        added += 1
+                    else:
+                        unchanged += 1
+        return added, unchanged
+
+
+def _print_rows(rows, started):
+    for r in rows:
+        extra = f"  [{r['roles']}]" if r.get("roles") else ""
+        fields = f"  computed: {', '.join(r['computed_fields'])}" if r.get("computed_fields") else ""
+        print(f"  {r['report_name']:<40} {r['path']}{extra}{fields}")
+    print(f"\n🔎 {len(rows)} report(s) in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the FEX lineage catalog")
+    parser.add_argument("--db", default=CATALOG_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("index", help="index FEX files or folders (local parse, no LLM)")
+    p.add_argument("paths", nargs="+")
+    p = sub.add_parser("table", help="reports that read a table")
+    p.add_argument("table")
+    p = sub.add_parser("column", help="reports that use a column (TABLE.COLUMN or COLUMN)")
+    p.add_argument("column")
+    p = sub.add_parser("impact", help="reports and computed fields affected by a table/column change")
+    p.add_argument("target")
+    p = sub.add_parser("report", help="full lineage of one report")
+    p.add_argument("report")
+    sub.add_parser("stats", help="catalog size")
+
+    args = parser.parse_args(argv)
+    catalog = LineageCatalog(args.db)
+    started = time.perf_counter()
+
+    if args.command == "index":
+        added, unchanged = catalog.index_paths(args.paths)
+        print(f"📚 {added} report(s) indexed, {unchanged} unchanged")
+    elif args.command == "table":
+        _print_rows(catalog.reports_using_table(args.table), started)
+    elif args.command == "column":
+        table, _, column = args.column.rpartition(".")
+        _print_rows(catalog.reports_using_column(column, table or None), started)
+    elif args.command == "impact":
+        table, _, column = args.target.partition(".")
+        _print_rows(catalog.impact(table, column or None), started)
+    elif args.command == "report":
+        for r in catalog.report_lineage(args.report):
+            print(f"\n📄 {r['report_name']} ({r['path']})")
+            for key in ("tables", "columns", "joins", "fields"):
+                print(f"  {key}:")
+                for item in r[key]:
+                    print("    " + ", ".join(f"{k}={v}" for k, v in item.items()))
+            print(f"  filters: {r['filters']}")
+    else:
+        for table, n in catalog.stats().items():
+            print(f"  {table:<16} {n}")
+
+    catalog.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import random
+import atexit
+import threading
+from collections import defaultdict, deque
+
+from fex_minify import count_tokens
+
+
+# cheapest first; a route only ever moves up from its first tier
+MODEL_TIERS = ["gpt-5-nano", "gpt-5-mini", "gpt-5"]
+
+# stage: (first tier, input tokens above which the next tier is used)
+ROUTES = {
+    "metadata": ("gpt-5-nano", 12000),
+    "metadata_batch": ("gpt-5-nano", 16000),
+    "relationships": ("gpt-5-nano", 4000),
+    "relationships_batch": ("gpt-5-nano", 8000),
+    "query_plan": ("gpt-5-nano", 4000),
+    "qa_answer": ("gpt-5-nano", 8000),
+    "qa": ("gpt-5-nano", 24000),
+}
+DEFAULT_ROUTE = ("gpt-5-nano", 16000)
+
+# a route whose recent success rate drops below this moves up a tier
+MIN_SUCCESS_RATE = 0.8
+MIN_ROUTE_SAMPLES = 10
+ROUTE_WINDOW = 50
+# share of calls that stay on a demoted tier so its success rate keeps being measured
+ROUTE_EXPLORE_RATE = 0.1
+
+# USD per 1M input / output tokens, only used to compare routes
+MODEL_PRICES = {
+    "gpt-5-nano": (0.05, 0.40),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5": (1.25, 10.00),
+}
+
+ROUTES_FILE = ".fexa_routes.json"
+
+# openai | stub
+LLM_BACKEND = "openai"
+# stub seconds per call and per 1k input tokens, roughly shaped like the real tiers
+STUB_LATENCY = {"gpt-5-nano": (0.3, 0.02), "gpt-5-mini": (0.6, 0.04), "gpt-5": (1.5, 0.08)}
+
+# multi-item prompts end with this line so the answer can be split back out by id
+BATCH_IDS_PREFIX = "ITEM IDS:"
+
+
+def stub_value(schema):
+    """Smallest document that satisfies a schema"""
+
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    kind = kind[0] if isinstance(kind, list) else kind
+    if kind == "object":
+        required = schema.get("required", [])
+        return {k: stub_value(v) for k, v in schema.get("properties", {}).items() if k in required}
+    if kind == "array":
+        return []
+    return {"string": "", "integer": 0, "number": 0, "boolean": False, "null": None}.get(kind)
+
+
+def _batch_ids(prompt):
+    for line in reversed(prompt.splitlines()):
+        if line.startswith(BATCH_IDS_PREFIX):
+            return json.loads(line[len(BATCH_IDS_PREFIX):])
+    return None
+
+
+class _StubResponse:
+    def __init__(self, output_text, input_tokens, output_tokens):
+        self.output_text = output_text
+        self.usage = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+class StubClient:
+    """Offline stand-in for the responses API: schema-minimal answers after a simulated latency"""
+
+    def __init__(self):
+        self.responses = self
+
+    def create(self, model, input, text=None):
+        tokens = count_tokens(input, model)
+        per_call, per_1k = STUB_LATENCY.get(model, (0.5, 0.04))
+        time.sleep(per_call + per_1k * tokens / 1000)
+
+        fmt = (text or {}).get("format", {})
+        if fmt.get("type") == "json_schema":
+            doc = stub_value(fmt["schema"])
+            ids = _batch_ids(input)
+            if ids is not None and "items" in doc:
+                item_schema = fmt["schema"]["properties"]["items"]["items"]["properties"]["result"]
+                doc["items"] = [{"id": i, "result": stub_value(item_schema)} for i in ids]
+            output = json.dumps(doc)
+        elif fmt.get("type") == "json_object":
+            output = "{}"
+        else:
+            output = f"(stub answer from {model})"
+        return _StubResponse(output, tokens, count_tokens(output, model))
+
+
+def _usage(response, prompt, output, model):
+    usage = getattr(response, "usage", None)
+    if isinstance(usage, dict):
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    if usage is not None and getattr(usage, "input_tokens", None) is not None:
+        return usage.input_tokens, usage.output_tokens
+    return count_tokens(prompt, model), count_tokens(output, model)
+
+
+class ModelRouter:
+    """Picks the model of each call and records latency, tokens and cost per (stage, model) route"""
+
+    FIELDS = ("calls", "failures", "seconds", "input_tokens", "output_tokens", "cost")
+
+    def __init__(self, path=ROUTES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stub = StubClient()
+        # this run, for the report
+        self.stats = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+        # recent outcomes and running totals across runs, persisted to path
+        self.history = defaultdict(lambda: deque(maxlen=ROUTE_WINDOW))
+        self.totals = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable route stats {self.path}: {e}")
+            return
+        for route, entry in saved.items():
+            self.history[route].extend(entry.get("history", []))
+            self.totals[route].update({k: entry.get(k, 0) for k in self.FIELDS})
+
+    def save(self):
+        with self._lock:
+            if not self.history and not self.totals:
+                return
+            routes = set(self.history) | set(self.totals)
+            data = {r: dict(self.totals[r], history=list(self.history[r])) for r in sorted(routes)}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save route stats to {self.path}: {e}")
+
+    def success_rate(self, stage, model):
+        """Share of recent successful calls, 1.0 until the route has enough samples"""
+
+        with self._lock:
+            outcomes = list(self.history[f"{stage}|{model}"])
+        if len(outcomes) < MIN_ROUTE_SAMPLES:
+            return 1.0
+        return sum(outcomes) / len(outcomes)
+
+    def choose(self, stage, prompt):
+        base, escalate_tokens = ROUTES.get(stage, DEFAULT_ROUTE)
+        tier = MODEL_TIERS.index(base)
+        if count_tokens(prompt, base) > escalate_tokens:
+            tier += 1
+        while (
+            tier < len(MODEL_TIERS) - 1
+            and self.success_rate(stage, MODEL_TIERS[tier]) < MIN_SUCCESS_RATE
+            and random.random() >= ROUTE_EXPLORE_RATE
+        ):
+            tier += 1
+        return MODEL_TIERS[min(tier, len(MODEL_TIERS) - 1)]
+
+    def record_outcome(self, stage, model, ok):
+        with self._lock:
+            self.history[f"{stage}|{model}"].append(1 if ok else 0)
+
+    def _record_call(self, stage, model, seconds, input_tokens, output_tokens, failed):
+        price_in, price_out = MODEL_PRICES.get(model, (0, 0))
+        cost = (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+        values = {
+            "calls": 1, "failures": int(failed), "seconds": seconds,
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "cost": cost,
+        }
+        route = f"{stage}|{model}"
+        with self._lock:
+            for target in (self.stats[route], self.totals[route]):
+                for k, v in values.items():
+                    target[k] += v
+
+    def complete(self, client, stage, prompt, text_format=None, model=None, outcome=True):
+        """One responses call on the routed model; returns the output text.
+        outcome=False leaves judging the answer to the caller (structured_call does)"""
+
+        model = model or self.choose(stage, prompt)
+        backend = self._stub if LLM_BACKEND == "stub" else client
+        kwargs = {"text": {"format": text_format}} if text_format else {}
+
+        started = time.perf_counter()
+        try:
+            response = backend.responses.create(model=model, input=prompt, **kwargs)
+            output = response.output_text.strip()
+        except Exception:
+            self._record_call(stage, model, time.perf_counter() - started, count_tokens(prompt, model), 0, True)
+            self.record_outcome(stage, model, False)
+            raise
+
+        self._record_call(stage, model, time.perf_counter() - started, *_usage(response, prompt, output, model), False)
+        if outcome:
+            self.record_outcome(stage, model, True)
+        return output
+
+    def report(self):
+        if not self.stats:
+            return {}
+        print(f"\n🚦 LLM routes ({'stub backend' if LLM_BACKEND == 'stub' else LLM_BACKEND}):")
+        print(
+            f"  {'stage':<20}{'model':<12}{'calls':>6}{'ok (recent)':>13}"
+            f"{'avg s':>8}{'tok in':>9}{'tok out':>9}{'est $':>10}"
+        )
+        with self._lock:
+            stats = {route: dict(s) for route, s in self.stats.items()}
+        for route, s in sorted(stats.items()):
+            stage, model = route.split("|", 1)
+            history = list(self.history[route])
+            ok = f"{sum(history) / len(history):.0%}" if history else "-"
+            print(
+                f"  {stage:<20}{model:<12}{s['calls']:>6}{ok:>13}"
+                f"{s['seconds'] / (s['calls'] or 1):>8.2f}{s['input_tokens']:>9}"
+                f"{s['output_tokens']:>9}{s['cost']:>10.4f}"
+            )
+        self.save()
+        return stats
+
+
+ROUTER = ModelRouter()
+atexit.register(ROUTER.save)
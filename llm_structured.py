@@ -0,0 +1,486 @@
+import json
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from fex_minify import count_tokens
+from llm_router import ROUTER, BATCH_IDS_PREFIX
+
+
+# first tier of every structured route, see llm_router.ROUTES
+STRUCTURED_MODEL = "gpt-5-nano"
+REPAIR_CONTEXT_CHARS = 4000
+
+# items bigger than this always get a request of their own
+BATCH_ITEM_TOKENS = 1500
+BATCH_MAX_TOKENS = 6000
+BATCH_MAX_ITEMS = 8
+BATCH_WORKERS = 4
+
+
+def _string_list():
+    return {"type": "array", "items": {"type": "string"}}
+
+
+METADATA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "report_name": {"type": "string"},
+        "description": {"type": "string"},
+        "author": {"type": "string"},
+        "inputs": _string_list(),
+        "datasources": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "table_name": {"type": "string"},
+                    "type": {"type": "string", "enum": ["explicit", "inferred"]},
+                },
+                "required": ["table_name", "type"],
+                "additionalProperties": False,
+            },
+        },
+        "joins": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "left_table": {"type": "string"},
+                    "left_column": {"type": "string"},
+                    "right_table": {"type": "string"},
+                    "right_column": {"type": "string"},
+                    "join_type": {"type": "string", "enum": ["inner", "left", "right", "full", "unknown"]},
+                    "identified_from": {"type": "string", "enum": ["explicit", "inferred"]},
+                },
+                "required": [
+                    "left_table", "left_column", "right_table", "right_column",
+                    "join_type", "identified_from",
+                ],
+                "additionalProperties": False,
+            },
+        },
+        "filters": _string_list(),
+        "output_columns": _string_list(),
+        "output_type": {"type": "string"},
+        "dependencies": _string_list(),
+        "performance_risks": _string_list(),
+        "recommendations": _string_list(),
+    },
+    "required": [
+        "report_name", "description", "author", "inputs", "datasources", "joins", "filters",
+        "output_columns", "output_type", "dependencies", "performance_risks", "recommendations",
+    ],
+    "additionalProperties": False,
+}
+
+RELATIONSHIPS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "relationships": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "FromTable": {"type": "string"},
+                    "FromColumn": {"type": "string"},
+                    "ToTable": {"type": "string"},
+                    "ToColumn": {"type": "string"},
+                    "Cardinality": {"type": "string", "enum": ["ManyToOne", "OneToMany", "OneToOne", "ManyToMany"]},
+                    "CrossFilterDirection": {"type": "string", "enum": ["Single", "Both"]},
+                    "Active": {"type": "boolean"},
+                },
+                "required": [
+                    "FromTable", "FromColumn", "ToTable", "ToColumn",
+                    "Cardinality", "CrossFilterDirection", "Active",
+                ],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["relationships"],
+    "additionalProperties": False,
+}
+
+
+QUERY_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "needs_data": {"type": "boolean"},
+        "table": {"type": "string"},
+        "joins": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "table": {"type": "string"},
+                    "left_on": {"type": "string"},
+                    "right_on": {"type": "string"},
+                    "how": {"type": "string", "enum": ["inner", "left"]},
+                },
+                "required": ["table", "left_on", "right_on", "how"],
+                "additionalProperties": False,
+            },
+        },
+        "filters": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "column": {"type": "string"},
+                    "op": {"type": "string", "enum": ["eq", "ne", "gt", "ge", "lt", "le", "in", "contains"]},
+                    "values": _string_list(),
+                },
+                "required": ["column", "op", "values"],
+                "additionalProperties": False,
+            },
+        },
+        "columns": _string_list(),
+        "group_by": _string_list(),
+        "aggregates": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "column": {"type": "string"},
+                    "func": {"type": "string", "enum": ["sum", "mean", "min", "max", "count", "nunique"]},
+                    "alias": {"type": "string"},
+                },
+                "required": ["column", "func", "alias"],
+                "additionalProperties": False,
+            },
+        },
+        "order_by": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "column": {"type": "string"},
+                    "descending": {"type": "boolean"},
+                },
+                "required": ["column", "descending"],
+                "additionalProperties": False,
+            },
+        },
+        "limit": {"type": "integer"},
+    },
+    "required": [
+        "needs_data", "table", "joins", "filters", "columns", "group_by", "aggregates", "order_by", "limit",
+    ],
+    "additionalProperties": False,
+}
+
+
+class StructuredStats:
+    """Per-stage counts of calls, parse/validation failures and repairs"""
+
+    FIELDS = ("calls", "parse_failures", "invalid", "repairs", "repaired", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+
+    def add(self, stage, field):
+        with self._lock:
+            self.counts[stage][field] += 1
+
+    def report(self):
+        if not self.counts:
+            return {}
+        print("\n📈 LLM structured output:")
+        print(f"  {'stage':<20}{'calls':>6}{'parse fail':>12}{'invalid':>9}{'repaired':>10}{'failed':>8}")
+        for stage, c in self.counts.items():
+            calls = c["calls"] or 1
+            print(
+                f"  {stage:<20}{c['calls']:>6}"
+                f"{c['parse_failures'] / calls:>11.0%} {c['invalid'] / calls:>8.0%}"
+                f"{c['repaired']:>6}/{c['repairs']:<3}{c['failed']:>8}"
+            )
+        return {stage: dict(c) for stage, c in self.counts.items()}
+
+
+STATS = StructuredStats()
+
+
+def _is_type(value, kind):
+    if kind == "object":
+        return isinstance(value, dict)
+    if kind == "array":
+        return isinstance(value, list)
+    if kind == "string":
+        return isinstance(value, str)
+    if kind == "boolean":
+        return isinstance(value, bool)
+    if kind == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == "null":
+        return value is None
+    return True
+
+
+def validate(value, schema, path=()):
+    """Returns [(path, message)] for the subset of JSON Schema the stage schemas use"""
+
+    kinds = schema.get("type")
+    kinds = kinds if isinstance(kinds, list) else [kinds] if kinds else []
+    if kinds and not any(_is_type(value, k) for k in kinds):
+        return [(path, f"expected {'/'.join(kinds)}, got {type(value).__name__}")]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append((path, f"must be one of {schema['enum']}"))
+
+    if isinstance(value, dict):
+        props = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append((path + (key,), "missing required field"))
+        for key, item in value.items():
+            if key in props:
+                errors += validate(item, props[key], path + (key,))
+            elif schema.get("additionalProperties") is False:
+                errors.append((path + (key,), "unexpected field"))
+
+    if isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors += validate(item, schema["items"], path + (i,))
+
+    return errors
+
+
+def format_path(path):
+    out = "$"
+    for part in path:
+        out += f"[{part}]" if isinstance(part, int) else f".{part}"
+    return out
+
+
+def _sub_schema(schema, path):
+    for part in path:
+        schema = schema.get("items", {}) if isinstance(part, int) else schema.get("properties", {}).get(part, {})
+    return schema
+
+
+def _get(doc, path):
+    for part in path:
+        doc = doc[part]
+    return doc
+
+
+def _set(doc, path, value):
+    if not path:
+        return value
+    _get(doc, path[:-1])[path[-1]] = value
+    return doc
+
+
+def _safe_get(doc, path):
+    try:
+        return _get(doc, path)
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def _fragments(doc, errors):
+    """Smallest enclosing objects/array items that need fixing, without nested duplicates"""
+
+    paths = []
+    for path, message in errors:
+        # a bad scalar or a missing/unexpected key is fixed by resending its parent
+        if message in ("missing required field", "unexpected field"):
+            path = path[:-1]
+        while path and not isinstance(_safe_get(doc, path), (dict, list)):
+            path = path[:-1]
+        paths.append(path)
+
+    paths = sorted(set(paths), key=len)
+    kept = []
+    for p in paths:
+        if not any(p[:len(k)] == k for k in kept):
+            kept.append(p)
+    return kept
+
+
+def _call(client, stage, model, prompt, text_format):
+    return ROUTER.complete(client, stage, prompt, text_format, model=model, outcome=False)
+
+
+def _repair_parse(client, stage, model, raw, schema, error):
+    prompt = f"""
+This output was meant to be JSON matching the schema below but does not parse ({error}).
+Return ONLY the corrected JSON document.
+
+SCHEMA:
+{json.dumps(schema)}
+
+OUTPUT:
+{raw[:REPAIR_CONTEXT_CHARS]}
+"""
+    return json.loads(_call(client, stage, model, prompt, {"type": "json_object"}))
+
+
+def _repair_fragments(client, stage, model, doc, schema, errors):
+    fragments = _fragments(doc, errors)
+    items = []
+    for path in fragments:
+        items.append({
+            "path": format_path(path),
+            "errors": [f"{format_path(p)}: {m}" for p, m in errors if p[:len(path)] == path],
+            "value": _get(doc, path),
+            "schema": _sub_schema(schema, path),
+        })
+
+    prompt = f"""
+Some fragments of a JSON document do not match their schema.
+Fix each fragment and return ONLY JSON in this format:
+{{"fixes": [{{"path": "<path as given>", "value": <corrected fragment>}}]}}
+
+FRAGMENTS:
+{json.dumps(items, default=str)[:REPAIR_CONTEXT_CHARS * 2]}
+"""
+    fixes = json.loads(_call(client, stage, model, prompt, {"type": "json_object"})).get("fixes", [])
+
+    by_path = {format_path(p): p for p in fragments}
+    for fix in fixes:
+        path = by_path.get(fix.get("path"))
+        if path is not None and "value" in fix:
+            doc = _set(doc, path, fix["value"])
+    return doc
+
+
+def structured_call(client, stage, prompt, schema, name):
+    """Schema-constrained LLM call, validated locally, with at most one targeted repair call"""
+
+    STATS.add(stage, "calls")
+    model = ROUTER.choose(stage, prompt)
+    raw = _call(client, stage, model, prompt, {"type": "json_schema", "name": name, "schema": schema, "strict": True})
+
+    try:
+        doc = json.loads(raw)
+        parse_error = None
+    except ValueError as e:
+        STATS.add(stage, "parse_failures")
+        doc, parse_error = None, e
+
+    errors = validate(doc, schema) if parse_error is None else []
+    if parse_error is None and not errors:
+        ROUTER.record_outcome(stage, model, True)
+        return doc
+
+    # anything short of a clean first answer counts against the route
+    ROUTER.record_outcome(stage, model, False)
+
+    if errors:
+        STATS.add(stage, "invalid")
+        print(f"⚠️ {stage}: {len(errors)} schema error(s), e.g. {format_path(errors[0][0])}: {errors[0][1]}")
+
+        # extra keys are dropped locally, no need to ask the model about them
+        for path, message in errors:
+            if message == "unexpected field":
+                del _get(doc, path[:-1])[path[-1]]
+        errors = validate(doc, schema)
+        if not errors:
+            return doc
+
+    STATS.add(stage, "repairs")
+    try:
+        doc = _repair_parse(client, stage, model, raw, schema, parse_error) if parse_error else \
+            _repair_fragments(client, stage, model, doc, schema, errors)
+    except Exception as e:
+        STATS.add(stage, "failed")
+        raise Exception(f"❌ {stage}: repair call failed: {e}")
+
+    errors = validate(doc, schema)
+    if errors:
+        STATS.add(stage, "failed")
+        raise Exception(
+            f"❌ {stage}: output still invalid after repair: {format_path(errors[0][0])}: {errors[0][1]}"
+        )
+
+    STATS.add(stage, "repaired")
+    return doc
+
+
+def batch_schema(item_schema):
+    return {
+        "type": "object",
+        "properties": {
+            "items": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "string"}, "result": item_schema},
+                    "required": ["id", "result"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["items"],
+        "additionalProperties": False,
+    }
+
+
+def _pack(sizes):
+    """Groups item ids into batches under BATCH_MAX_TOKENS / BATCH_MAX_ITEMS, largest first"""
+
+    batches, current, used = [], [], 0
+    for item_id in sorted(sizes, key=sizes.get, reverse=True):
+        if current and (used + sizes[item_id] > BATCH_MAX_TOKENS or len(current) >= BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item_id)
+        used += sizes[item_id]
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batched_call(client, stage, items, prompt_for, item_schema, name, workers=BATCH_WORKERS):
+    """Answers many small independent items with multi-item requests.
+
+    items is {key: payload text}; prompt_for({id: payload}) builds the prompt of one batch.
+    Returns ({key: result}, [keys left for one request each]): items too big to share a
+    request, single-item batches and anything a batch answer failed or left out."""
+
+    keys = list(items)
+    ids = {str(i + 1): key for i, key in enumerate(keys)}
+    sizes = {item_id: count_tokens(str(items[key])) for item_id, key in ids.items()}
+
+    leftovers = [ids[i] for i, n in sizes.items() if n > BATCH_ITEM_TOKENS]
+    batches = []
+    for batch in _pack({i: n for i, n in sizes.items() if n <= BATCH_ITEM_TOKENS}):
+        if len(batch) > 1:
+            batches.append(batch)
+        else:
+            leftovers.append(ids[batch[0]])
+
+    schema = batch_schema(item_schema)
+
+    def run(batch):
+        prompt = prompt_for({i: items[ids[i]] for i in batch})
+        prompt += f"\nReturn exactly one item per id.\n{BATCH_IDS_PREFIX} {json.dumps(batch)}\n"
+        try:
+            doc = structured_call(client, f"{stage}_batch", prompt, schema, name)
+        except Exception as e:
+            print(f"⚠️ {stage}: batch of {len(batch)} failed ({e}); sending its items one by one")
+            return {}
+        return {item["id"]: item["result"] for item in doc["items"] if item["id"] in batch}
+
+    results = {}
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            for batch, answered in zip(batches, pool.map(run, batches)):
+                for item_id in batch:
+                    if item_id in answered:
+                        results[ids[item_id]] = answered[item_id]
+                    else:
+                        leftovers.append(ids[item_id])
+
+    print(
+        f"📦 {stage}: {len(results)} item(s) answered by {len(batches)} batched request(s), "
+        f"{len(leftovers)} left for single requests"
+    )
+    leftovers = set(leftovers)
+    return results, [key for key in keys if key in leftovers]
@@ -1,16 +1,49 @@
 from openai import OpenAI
 import os
+import sys
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from csvflow import handle_csv_flow
-from excelflow import handle_excel_flow
-from Tmdl_genrator import build_tmdl_with_relationships
-from sqlflow import handle_sql_flow
+from csvflow import prompt_csv_paths, load_csv_tables, validate_csv_tables
+from excelflow import prompt_excel_path, load_excel_tables, validate_excel_tables
+from Tmdl_genrator import build_tmdl_with_relationships, relationships_for, TMDL_DIR, MANIFEST_FILE
+from sqlflow import (
+    connect_sql, prompt_sql_tables, load_sql_tables, validate_sql_tables, sql_predicates
+)
 from build_pbix import build_pbix_from_tmdl
+from model_validator import validate_model, is_valid
+from fex_minify import prepare_fex_for_prompt, count_tokens
+from fex_chunker import split_fex_requests, count_requests, merge_metadata
+from fex_includes import IncludeResolver, find_includes
+from pipeline import TaskGraph
+from table_store import TableStore, schema_of, column_types_of, MEMORY_BUDGET_ENV
+from fex_projection import referenced_columns
+from fex_engine import run_fex_locally
+from reconcile import reconcile, write_reconciliation_report
+from fex_dax import translate_fex, suggest_visuals
+from lineage_catalog import LineageCatalog, FEX_EXTENSIONS
+from report_writer import write_report, wait_for_reports
+from llm_structured import (
+    structured_call, batched_call, METADATA_SCHEMA, QUERY_PLAN_SCHEMA, STRUCTURED_MODEL, STATS as LLM_STATS
+)
+from llm_router import ROUTER
+from qa_query import QueryEngine, result_text, QUERY_ROW_LIMIT
+from fex_dedup import plan_batch, derive_metadata
+from checkpoint import RunCheckpoint, RUNS_DIR, fingerprint, file_fingerprint, content_fingerprint
+from relationship_candidates import type_family
+from fex_watch import PollingWatcher, list_fex_files, local_metadata
 
 Agent_Name = "Analysis Master"
 client = OpenAI(api_key="OpenAIApiKey")
 
+CHUNKED_MODE_TOKENS = 8000
+CHUNKED_MODE_REQUESTS = 3
+CHUNK_WORKERS = 4
+
+# -INCLUDEs are resolved under this folder; None means the folder of the FEX itself
+FEX_REPOSITORY_ROOT = None
+
 
 
 def analyze_fex(file_path):
@@ -22,9 +55,8 @@ def analyze_fex(file_path):
 
 
 
-def getmetadata(fexcontent):
-
-    metadata_prompt = f"""
+def metadata_instructions():
+    return f"""
 You are {Agent_Name}, a WebFOCUS FEX expert.
 
 Your task:
@@ -71,58 +103,157 @@ Inference Rules:
 - If JOIN keywords missing but matching keys exist → infer join
 - If nothing exists → return best intelligent guess
 
+"""
+
+
+def extract_metadata(fexcontent, verbose=True):
+
+    metadata_prompt = f"""{metadata_instructions()}
 FEX CONTENT:
 {fexcontent}
 """
 
-    response = client.responses.create(
-        model="gpt-5-nano",
-        input=metadata_prompt
+    try:
+        metadata = structured_call(client, "metadata", metadata_prompt, METADATA_SCHEMA, "fex_metadata")
+    except Exception as e:
+        print("\n❌ Metadata extraction failed:", e)
+        return None
+
+    if verbose:
+        print("\n===== INITIAL AI OUTPUT =====\n")
+        print(json.dumps(metadata, indent=2))
+
+    return metadata
+
+
+def extract_metadata_chunked(fexcontent):
+    chunks = split_fex_requests(fexcontent)
+    print(f"\n🧩 Chunked mode: {len(chunks)} chunk(s), up to {CHUNK_WORKERS} in parallel")
+
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as pool:
+        parts = list(pool.map(lambda c: extract_metadata(c, verbose=False), chunks))
+
+    failed = sum(1 for p in parts if p is None)
+    if failed:
+        print(f"⚠️ {failed} of {len(chunks)} chunk(s) returned unparseable metadata")
+
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+
+    return merge_metadata(parts)
+
+
+def extract_metadata_auto(fexcontent):
+    if (
+        count_tokens(fexcontent) > CHUNKED_MODE_TOKENS
+        or count_requests(fexcontent) >= CHUNKED_MODE_REQUESTS
+    ):
+        return extract_metadata_chunked(fexcontent)
+    return extract_metadata(fexcontent)
+
+
+_include_resolvers = {}
+
+
+def get_include_resolver(file_path):
+    repo_root = FEX_REPOSITORY_ROOT or os.path.dirname(os.path.abspath(file_path))
+    if repo_root not in _include_resolvers:
+        _include_resolvers[repo_root] = IncludeResolver(
+            repo_root, extract_metadata_auto, model=STRUCTURED_MODEL, schema=METADATA_SCHEMA
+        )
+    return _include_resolvers[repo_root]
+
+
+def getmetadata(fexcontent, file_path=None):
+
+    if file_path and find_includes(fexcontent):
+        metadata = get_include_resolver(file_path).expanded_metadata(file_path)
+    else:
+        metadata = extract_metadata_auto(fexcontent)
+
+    if metadata is None:
+        # a canned placeholder would let the whole run continue on garbage
+        raise Exception("❌ Metadata extraction failed, no valid metadata returned")
+
+    df = pd.json_normalize(metadata)
+    print("\n✅ Metadata JSON parsed and validated")
+    return metadata, df
+
+
+def metadata_fingerprint(fex_content, file_path):
+    """FEX text, every -INCLUDEd file, the model and the schema the answer must match"""
+
+    parts = [fex_content, STRUCTURED_MODEL, METADATA_SCHEMA]
+    if file_path and find_includes(fex_content):
+        try:
+            for path in sorted(get_include_resolver(file_path).build_graph(file_path)):
+                with open(path, "r", encoding="utf-8", errors="replace") as fh:
+                    parts.append([path, fingerprint(fh.read())])
+        except Exception as e:
+            # left to getmetadata to report; the key just can't cover the includes
+            parts.append(str(e))
+    return fingerprint(*parts)
+
+
+def checkpointed_metadata(run, fex_content, file_path):
+    metadata = run.stage(
+        "metadata",
+        metadata_fingerprint(fex_content, file_path),
+        lambda: getmetadata(fex_content, file_path)[0],
     )
+    return metadata, pd.json_normalize(metadata)
 
-    raw = response.output_text.strip()
-    print("\n===== INITIAL AI RAW OUTPUT =====\n")
-    print(raw)
 
-    try:
-        metadata = json.loads(raw)
-        df = pd.json_normalize(metadata)
-        print("\n✅ Metadata JSON parsed successfully")
-        return metadata, df
-    except Exception as e:
-        print("\n❌ Metadata JSON parsing failed. Creating fallback JSON.")
-        print(e)
+def pbix_outputs(pbix_file, model_fp):
+    """The PBIX as built from this exact TMDL model"""
 
-        metadata = {
-            "report_name": "Unknown Report",
-            "description": "AI failed to extract details",
-            "author": "",
-            "inputs": [],
-            "datasources": [{"table_name": "Unknown", "type": "inferred"}],
-            "joins": [],
-            "filters": [],
-            "output_columns": [],
-            "output_type": "",
-            "dependencies": [],
-            "performance_risks": [],
-            "recommendations": []
-        }
+    return {"file": pbix_file, "model": model_fp, "fingerprint": file_fingerprint([pbix_file])}
 
-        return metadata, pd.json_normalize(metadata)
 
+def checkpointed_tables(run, fp, loader, *args):
+    """Table data from the run directory when the source files are unchanged, else a fresh load"""
 
+    tables = run.load_tables(fp) if fp else None
+    if tables is None:
+        tables = loader(*args)
+    return tables
 
-if __name__ == "__main__":
 
-    print("\n👋 Hi, this is the FEXA Agent!")
-    file_path = input("Enter FEX file path: ").strip()
-    print("\n📡 Analyzing FEX... Please wait...\n")
+def checkpointed_relationships(run, tables):
+    types = column_types_of(tables)
+    # keyed on type families: a column flipping between category and string storage is the same schema
+    schema_fp = fingerprint({t: {c: type_family(d) for c, d in cols.items()} for t, cols in types.items()})
+    run.save("schema", schema_fp, types)
+    relationships = run.load("relationships", schema_fp)
+    if relationships:
+        return relationships, True
 
-    fex_content = analyze_fex(file_path)
+    # reuses the last build's relationships when the schemas haven't changed
+    stats = {}
+    relationships = relationships_for(schema_of(tables), column_types=types, stats=stats)
+    # an empty or partly failed prediction is asked again on the next run
+    if stats["reusable"]:
+        run.save("relationships", schema_fp, relationships)
+    return relationships, stats["reusable"]
+
+
+def run_analysis(fex_content):
+    """Measures, calculated columns and visuals translated locally from the FEX"""
+
+    dax = translate_fex(fex_content)
 
-    metadata, metadata_df = getmetadata(fex_content)
+    columns = ["name", "table", "expression", "format_string", "description", "fex_expression"]
+    measures_df = pd.DataFrame(dax["measures"], columns=columns)
+    calc_df = pd.DataFrame(dax["calculated_columns"], columns=columns)
+    visuals_df = pd.DataFrame(suggest_visuals(fex_content), columns=["visual", "reason"])
 
-    print("\n💾 Creating Advanced Metadata Analysis Excel...")
+    return measures_df, calc_df, visuals_df
+
+
+def write_metadata_excel(metadata, metadata_df, analysis, excel_file=None):
+
+    measures_df, calc_df, visuals_df = analysis
 
     report_name = metadata.get("report_name", "FEX_Report")
 
@@ -131,299 +262,604 @@ if __name__ == "__main__":
     filters = metadata.get("filters", [])
     outputs = metadata.get("output_columns", [])
 
-    analysis_prompt = f"""
-You are a Power BI and Data Modeling Expert.
+    excel_file = excel_file or f"{report_name}_Metadata_Analysis.xlsx"
 
-Return ONLY JSON in EXACTLY this structure.
-No extra text.
+    sheets = []
 
-{{
- "measures": [
-   {{ "name": "", "description": "", "expression_idea": "" }}
- ],
- "calculated_columns": [
-   {{ "name": "", "description": "", "expression_idea": "" }}
- ],
- "visuals": [
-   {{ "visual": "", "reason": "" }}
- ]
-}}
+    if metadata_df is not None and not metadata_df.empty:
+        sheets.append(("Metadata Summary", metadata_df))
 
-Metadata:
-{json.dumps(metadata)}
-"""
+    if datasources:
+        sheets.append(("Datasources", pd.DataFrame(datasources)))
 
-    ai = client.responses.create(
-        model="gpt-5-nano",
-        input=analysis_prompt
-    )
+    if joins:
+        sheets.append(("Joins", pd.DataFrame(joins)))
+
+    if filters:
+        sheets.append(("Filters", pd.DataFrame(filters, columns=["Filters"])))
+
+    if outputs:
+        sheets.append(("Output Columns", pd.DataFrame(outputs, columns=["Output Columns"])))
+
+    if not measures_df.empty:
+        sheets.append(("Measures", measures_df))
+
+    if not calc_df.empty:
+        sheets.append(("Calculated Columns", calc_df))
 
+    if not visuals_df.empty:
+        sheets.append(("Visuals", visuals_df))
+
+    if not sheets:
+        sheets.append(("Summary", pd.DataFrame(["No Metadata Found"])))
+
+    excel_file = write_report(excel_file, sheets, label="Metadata Analysis")
+    print(f"\n🎯 DONE! Metadata analysis queued → {excel_file}")
+    return excel_file
+
+
+def update_catalog(file_path, fex_content, metadata):
+    catalog = LineageCatalog()
     try:
-        ai_json = json.loads(ai.output_text)
+        if catalog.upsert_report(file_path, fex_content, metadata):
+            print(f"📚 Lineage catalog updated → {catalog.path}")
+    finally:
+        catalog.close()
+
 
-        measures_df = pd.DataFrame(ai_json.get("measures", []))
-        calc_df = pd.DataFrame(ai_json.get("calculated_columns", []))
-        visuals_df = pd.DataFrame(ai_json.get("visuals", []))
+def batch_metadata_prompt(batch):
+    fexes = "\n\n".join(f"=== FEX {i} ===\n{fex}" for i, fex in batch.items())
+    return f"""{metadata_instructions()}
+The FEX files below are independent reports. Analyse each one on its own and return
+its metadata JSON (format above) as that FEX's result.
 
-    except:
-        measures_df = pd.DataFrame()
-        calc_df = pd.DataFrame()
-        visuals_df = pd.DataFrame()
+{fexes}
+"""
 
 
-    excel_file = f"{report_name}_Metadata_Analysis.xlsx"
+def run_batch(folder):
+    """Metadata for every FEX under a folder; near-duplicate variants are derived, not re-analysed"""
 
-    with pd.ExcelWriter(excel_file, engine="openpyxl") as writer:
+    paths = sorted(
+        os.path.join(d, f) for d, _, names in os.walk(folder) for f in names
+        if f.lower().endswith(FEX_EXTENSIONS)
+    )
+    if not paths:
+        print(f"❌ No FEX files found under {folder}")
+        return
 
-        if metadata_df is not None and not metadata_df.empty:
-            metadata_df.to_excel(writer, sheet_name="Metadata Summary", index=False)
+    contents = {path: analyze_fex(path) for path in paths}
+    analyse, derived = plan_batch(contents)
+    print(f"\n🧬 {len(paths)} FEX files -> {len(analyse)} to analyse, {len(derived)} derived from a variant")
 
-        if datasources:
-            pd.DataFrame(datasources).to_excel(
-                writer, sheet_name="Datasources", index=False
-            )
+    prepared = {path: prepare_fex_for_prompt(contents[path], model="gpt-5-nano")[0] for path in analyse}
 
-        if joins:
-            pd.DataFrame(joins).to_excel(
-                writer, sheet_name="Joins", index=False
-            )
+    def analyse_one(path):
+        return getmetadata(prepared[path], path)[0]
 
-        if filters:
-            pd.DataFrame(filters, columns=["Filters"]).to_excel(
-                writer, sheet_name="Filters", index=False
-            )
+    # small self-contained reports share a request; the rest go through the usual path
+    results, single = batched_call(
+        client, "metadata",
+        {path: fex for path, fex in prepared.items() if not find_includes(fex)},
+        batch_metadata_prompt, METADATA_SCHEMA, "fex_metadata",
+    )
+    single += [path for path in analyse if path not in results and path not in single]
 
-        if outputs:
-            pd.DataFrame(outputs, columns=["Output Columns"]).to_excel(
-                writer, sheet_name="Output Columns", index=False
-            )
+    failed = []
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as pool:
+        futures = {path: pool.submit(analyse_one, path) for path in single}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                print(f"{e} ({path})")
+                failed.append(path)
+
+    for path, (rep, subs) in derived.items():
+        if rep not in results:
+            failed.append(path)
+            continue
+        results[path] = dict(derive_metadata(results[rep], subs), derived_from=os.path.relpath(rep, folder))
+
+    for path in paths:
+        if path not in results:
+            continue
+        metadata = results[path]
+        # variants usually share a report name, so batch files are named after the FEX
+        excel_file = f"{os.path.splitext(os.path.basename(path))[0]}_Metadata_Analysis.xlsx"
+        write_metadata_excel(metadata, pd.json_normalize(metadata), run_analysis(contents[path]), excel_file)
+        update_catalog(path, contents[path], metadata)
+
+    print(
+        f"\n📦 Batch done: {len(results)}/{len(paths)} reports, "
+        f"{len(derived)} LLM analyses saved by near-duplicate detection"
+    )
+    if failed:
+        print(f"⚠️ {len(failed)} report(s) failed: {', '.join(os.path.basename(p) for p in failed)}")
+    LLM_STATS.report()
+    ROUTER.report()
+    wait_for_reports()
 
-        if not measures_df.empty:
-            measures_df.to_excel(writer, sheet_name="Measures", index=False)
 
-        if not calc_df.empty:
-            calc_df.to_excel(writer, sheet_name="Calculated Columns", index=False)
+def watch_metadata(file_path, fex_content):
+    """Checkpointed LLM metadata of this exact FEX text when there is one, else the local parse"""
 
-        if not visuals_df.empty:
-            visuals_df.to_excel(writer, sheet_name="Visuals", index=False)
+    prepared, _ = prepare_fex_for_prompt(fex_content, model="gpt-5-nano")
+    if os.path.isdir(os.path.join(RUNS_DIR, fingerprint(prepared)[:16])):
+        metadata = RunCheckpoint(prepared).load("metadata", metadata_fingerprint(prepared, file_path))
+        if metadata is not None:
+            return prepared, metadata
+    return prepared, local_metadata(fex_content, file_path)
 
-        if (
-            metadata_df is None
-            and measures_df.empty
-            and calc_df.empty
-            and visuals_df.empty
-        ):
-            pd.DataFrame(["No Metadata Found"]).to_excel(
-                writer, sheet_name="Summary", index=False
-            )
 
-    print(f"\n🎯 DONE! Excel Generated Successfully → {excel_file}")
-    print("\n📌 Please select your data source")
-    print("Options: csv | excel | sql | quit")
+def run_watch(root):
+    """Re-analyses FEX files and reloads source extracts as they change, without any prompts"""
 
+    print("\n👀 Watch mode: FEX files under", root)
     source = ""
-    while source not in ["csv", "excel", "sql", "quit"]:
-        source = input("Enter Source Type (csv/excel/sql/quit): ").strip().lower()
+    while source not in ["csv", "excel"]:
+        source = input("Enter Source Type to watch (csv/excel): ").strip().lower()
+
+    if source == "csv":
+        source_files = prompt_csv_paths()
+        validate_tables = validate_csv_tables
+    else:
+        source_files = [prompt_excel_path()]
+        validate_tables = validate_excel_tables
 
-    data_df = None
-    matched = False
-    tables = {}
+    # every column is loaded: the watched FEX files may each use different ones
+    def load(path):
+        return load_csv_tables([path]) if source == "csv" else load_excel_tables(path)
+
+    if source == "csv":
+        tables = load_csv_tables(source_files)
+        table_of = {os.path.abspath(p): [os.path.splitext(os.path.basename(p))[0]] for p in source_files}
+    else:
+        tables = load(source_files[0])
+        table_of = {os.path.abspath(source_files[0]): list(tables)}
+
+    fexes = {}
+    active = None
+
+    def refresh_fex(path):
+        fex_content = analyze_fex(path)
+        prepared, metadata = watch_metadata(path, fex_content)
+        fexes[path] = (prepared, metadata)
+        update_catalog(path, fex_content, metadata)
+        excel_file = f"{os.path.splitext(os.path.basename(path))[0]}_Metadata_Analysis.xlsx"
+        write_metadata_excel(metadata, pd.json_normalize(metadata), run_analysis(prepared), excel_file)
+
+    def rebuild():
+        prepared, metadata = fexes[active]
+        print(f"\n🏗️ Rebuilding model for {os.path.basename(active)}")
+        relationships = relationships_for(
+            schema_of(tables), column_types=column_types_of(tables), local_only=True
+        )
+        dax = translate_fex(prepared, schema_of(tables), relationships)
+        build_tmdl_with_relationships(tables, metadata, relationships=relationships, dax=dax, confirm=False)
+        validate_model(TMDL_DIR)
+        validate_tables(tables, metadata, pd.json_normalize(metadata))
+
+    for path in list_fex_files(root):
+        refresh_fex(path)
+        active = path
+    if active is None:
+        print(f"❌ No FEX files found under {root}")
+        return
+    rebuild()
+    wait_for_reports()
+
+    watcher = PollingWatcher(root, source_files)
+    print("\n👀 Watching for changes... (Ctrl+C to stop)")
+
+    try:
+        while True:
+            changed = watcher.wait_for_changes()
+            started = time.perf_counter()
+
+            for path in sorted(changed & set(table_of)):
+                print(f"\n🔄 Source changed: {os.path.basename(path)}")
+                if not os.path.exists(path):
+                    print("⚠️ Source file removed, keeping its last loaded tables")
+                    continue
+                try:
+                    loaded = load(path)
+                except Exception as e:
+                    print(f"❌ Reload failed, keeping the previous tables: {e}")
+                    continue
+                for name in set(table_of[path]) - set(loaded):
+                    del tables[name]
+                table_of[path] = list(loaded)
+                for name in loaded:
+                    tables[name] = loaded[name]
+
+            for path in sorted(changed - set(table_of)):
+                if not os.path.exists(path):
+                    print(f"\n🗑️ FEX removed: {os.path.basename(path)}")
+                    fexes.pop(path, None)
+                    catalog = LineageCatalog()
+                    try:
+                        catalog.remove_report(path)
+                    finally:
+                        catalog.close()
+                    continue
+                print(f"\n🔄 FEX changed: {os.path.basename(path)}")
+                refresh_fex(path)
+                active = path
+
+            if active not in fexes:
+                if not fexes:
+                    print("⚠️ No FEX files left to model, waiting for one")
+                    continue
+                active = sorted(fexes)[-1]
+
+            rebuild()
+            wait_for_reports()
+            print(f"\n⚡ Updated in {time.perf_counter() - started:.2f}s")
+
+    except KeyboardInterrupt:
+        print("\n👋 Watch mode stopped.")
+
+
+def start_source(graph, source, fex_content, run, saved=None):
+    """Prompts for the source location (or reuses the checkpointed answer) and starts loading it
+
+    Returns the validation function and the fingerprint of the source data (None for SQL).
+    """
+
+    # parsed locally so loading never waits for the metadata LLM call
+    refs = referenced_columns(fex_content)
+    saved = saved or {}
 
     if source == "csv":
         print("\n📂 CSV Source Selected")
         print("\n📂 CSV Assistant is called.......")
+        csv_files = saved.get("paths")
+        if not csv_files or not all(os.path.exists(p) for p in csv_files):
+            csv_files = prompt_csv_paths()
+        run.save("source", run.run_id, {"type": source, "paths": csv_files})
+        fp = fingerprint(source, file_fingerprint(csv_files))
+        graph.submit("load_tables", checkpointed_tables, run, fp, load_csv_tables, csv_files, refs)
+        return validate_csv_tables, fp
+
+    if source == "excel":
+        print("\n📘 Excel Source Selected")
+        print("\n📘 Excel Assistant called.....")
+        excel_path = saved.get("path")
+        if not excel_path or not os.path.exists(excel_path):
+            excel_path = prompt_excel_path()
+        run.save("source", run.run_id, {"type": source, "path": excel_path})
+        fp = fingerprint(source, file_fingerprint([excel_path]))
+        graph.submit("load_tables", checkpointed_tables, run, fp, load_excel_tables, excel_path, refs)
+        return validate_excel_tables, fp
+
+    print("\n🗄️ SQL Server Source Selected")
+    print("📘 SQL Server Assistant has been called........")
+    conn, db_type = connect_sql()
+    table_names = saved.get("tables") or prompt_sql_tables()
+    run.save("source", run.run_id, {"type": source, "tables": table_names})
+    # database rows can change without any local trace, so SQL tables are always reloaded
+    graph.submit(
+        "load_tables", load_sql_tables, conn, table_names, db_type,
+        sql_predicates(fex_content), refs,
+    )
+    return validate_sql_tables, None
 
-        data_df, matched, tables = handle_csv_flow(
-            fex_content,
-            metadata,
-            metadata_df
-        )
 
-        if not tables:
-            print("❌ No tables returned from CSV Assistant. Cannot proceed.")
-            exit()
+def run_local_engine(fex_content, tables, report_name):
 
-        print("\n🤖 TMDL Assistant is ready...")
+    try:
+        results = run_fex_locally(fex_content, tables)
+    except Exception as e:
+        print("❌ Local FEX execution failed:", e)
+        return []
 
-        proceed = input(
-            "\n❓ Do you want to generate TMDL + BIM model now? (yes/no): "
-        ).strip().lower()
+    for i, (df, _) in enumerate(results, start=1):
+        out_file = f"{report_name}_Expected_Output_{i}.csv"
+        df.to_csv(out_file, index=False)
+        print(f"📄 Expected output written → {out_file}")
 
-        if proceed in ["yes", "y"]:
-            print("\n🤖 TMDL Assistant is called...")
-            build_tmdl_with_relationships(tables, metadata)
-        else:
-            print("\n👍 Skipping TMDL creation. Process completed.")
+    return results
 
-        print("\n❓ Do you want to generate Power BI PBIX file now? (yes/no): ")
-        pbix_confirm = input().strip().lower()
-        
-        if pbix_confirm in ["yes","y"]:
-            try:
-                pbix_file = build_pbix_from_tmdl()
-                print(f"\n🎯 Power BI file ready: {pbix_file}")
 
-            except Exception as e:
-                print("❌ PBIX build failed:", e)
+def run_reconciliation(expected_outputs, tables, metadata_df, report_name):
+    """Compares each expected output against a migrated extract (CSV path or loaded table)"""
+
+    for i, (expected, keys) in enumerate(expected_outputs, start=1):
+        target = input(
+            f"\n📥 Migrated output for request {i} (CSV path or table name, blank to skip): "
+        ).strip().strip('"')
+
+        if not target:
+            continue
 
+        if target in tables:
+            actual = tables[target]
+        elif os.path.exists(target):
+            actual = target
         else:
-            print("👍 Skipping PBIX creation.")
+            print(f"❌ Not found: {target}")
+            continue
+
+        try:
+            # numeric BY fields (YEAR, ORDER_ID) are keys, not measures
+            summary, mismatch_df = reconcile(expected, actual, key_cols=keys)
+        except Exception as e:
+            print("❌ Reconciliation failed:", e)
+            continue
 
-        print("\n💬 You can now ask questions about this FEX, data, or model.")
-        print("Type 'quit' to end the session.\n")
+        write_reconciliation_report(
+            summary, mismatch_df, metadata_df,
+            path=f"{report_name}_Reconciliation_Report_{i}.xlsx",
+        )
 
-        while True:
-            user_q = input("You: ").strip()
 
-            if user_q.lower() in ["quit", "exit"]:
-                print("\n👋 Session ended. Goodbye!")
-                break
+def plan_query(user_q, column_types):
+    """Asks the model for a query plan; needs_data is false for questions about the FEX or model"""
 
-            schema_summary = {
-                table: list(df.columns)
-                for table, df in tables.items()
-            }
+    prompt = f"""
+You translate questions about loaded tables into a query plan that runs locally.
+Set needs_data to false (and leave the rest empty) when the question is about the
+FEX logic, metadata or model rather than the data itself.
 
-            qa_prompt = f"""
-    You are an expert BI & Power BI assistant.
+Rules:
+- Only use the tables and columns listed below; qualify a column as TABLE.COLUMN when
+  several joined tables have it
+- Filter values are strings; "in" takes several values, every other op the first one
+- An aggregate over column "*" with func "count" counts rows
+- order_by may use an aggregate alias
+- limit is at most {QUERY_ROW_LIMIT}, 0 means the default
 
-    Context:
-    - FEX logic:
-    {fex_content}
+TABLES AND COLUMN TYPES:
+{json.dumps(column_types)}
 
-    - Extracted Metadata:
-    {json.dumps(metadata, indent=2)}
+QUESTION:
+{user_q}
+"""
+    return structured_call(client, "query_plan", prompt, QUERY_PLAN_SCHEMA, "query_plan")
 
-    - Source Tables & Columns:
-    {json.dumps(schema_summary, indent=2)}
 
-    User Question:
-    {user_q}
+def answer_from_data(user_q, plan, df, matched):
+    prompt = f"""
+You are an expert BI & Power BI assistant.
+The question below was answered by running this query plan on the source tables:
+{json.dumps(plan)}
 
-    Answer clearly and concisely.
-    """
+RESULT (CSV):
+{result_text(df, matched)}
+
+Question:
+{user_q}
+
+Answer clearly and concisely from the result only.
+"""
+    return ROUTER.complete(client, "qa_answer", prompt)
+
+
+def run_qa_session(fex_content, metadata, tables):
+
+    print("\n💬 You can now ask questions about this FEX, data, or model.")
+    print("Type 'quit' to end the session.\n")
+
+    schema_summary = schema_of(tables)
+    column_types = column_types_of(tables)
+    engine = QueryEngine(tables)
+
+    while True:
+        user_q = input("You: ").strip()
+
+        if user_q.lower() in ["quit", "exit"]:
+            print("\n👋 Session ended. Goodbye!")
+            break
+
+        # data questions run locally; only the small result goes back to the model
+        try:
+            plan = plan_query(user_q, column_types)
+        except Exception as e:
+            print("⚠️ Query planning failed, answering without data:", e)
+            plan = {"needs_data": False}
 
+        if plan["needs_data"]:
             try:
-                response = client.responses.create(
-                    model="gpt-5-nano",
-                    input=qa_prompt
+                df, matched, seconds, cached = engine.run(plan)
+                print(
+                    f"🔎 Query ran locally: {matched} matching row(s), {len(df)} returned, "
+                    f"{'cached' if cached else f'{seconds * 1000:.1f} ms'}"
                 )
-                print("\n🤖 Agent:", response.output_text.strip(), "\n")
+                print("\n🤖 Agent:", answer_from_data(user_q, plan, df, matched), "\n")
+                continue
             except Exception as e:
-                print("⚠️ AI error:", e)
+                print("⚠️ Query could not run, answering without data:", e)
 
+        qa_prompt = f"""
+You are an expert BI & Power BI assistant.
 
-    elif source == "excel":
-        print("\n📘 Excel Source Selected")
-        print("\n📘 Excel Assistant called.....")
+Context:
+- FEX logic:
+{fex_content}
 
-        data_df, matched, tables = handle_excel_flow(
-            fex_content,
-            metadata,
-            metadata_df
-        )
+- Extracted Metadata:
+{json.dumps(metadata, indent=2)}
 
-        if not tables:
-            print("❌ No tables returned from Excel Assistant. Cannot proceed.")
-            exit()
+- Source Tables & Columns:
+{json.dumps(schema_summary, indent=2)}
 
+User Question:
+{user_q}
 
-        proceed = input(
-            "\n❓ Do you want to generate TMDL + BIM model now? (yes/no): "
-        ).strip().lower()
+Answer clearly and concisely.
+"""
 
-        if proceed in ["yes", "y"]:
-            print("\n🤖 TMDL Assistant is called ......")
-            build_tmdl_with_relationships(tables, metadata)
-        else:
-            print("\n👍 Skipping TMDL creation. Process completed.")
+        try:
+            print("\n🤖 Agent:", ROUTER.complete(client, "qa", qa_prompt), "\n")
+        except Exception as e:
+            print("⚠️ AI error:", e)
 
-        print("\n❓ Do you want to generate Power BI PBIX file now? (yes/no): ")
-        pbix_confirm = input().strip().lower()
-        
-        if pbix_confirm in ["yes","y"]:
-            try:
-                pbix_file = build_pbix_from_tmdl()
-                print(f"\n🎯 Power BI file ready: {pbix_file}")
 
-            except Exception as e:
-                print("❌ PBIX build failed:", e)
+if __name__ == "__main__":
 
-        else:
-            print("👍 Skipping PBIX creation.")
+    # python main.py --resume [fex path]: reuse every checkpointed stage without asking
+    # python main.py --watch [fex file or folder]: re-analyse on every save
+    # python main.py --memory-budget=MB ...: in-memory budget of loaded tables before they spill
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    resume = "--resume" in sys.argv[1:]
+    for a in sys.argv[1:]:
+        if a.startswith("--memory-budget="):
+            os.environ[MEMORY_BUDGET_ENV] = a.split("=", 1)[1]
 
-        print("\n💬 You can now ask questions about this FEX, data, or model.")
-        print("Type 'quit' to end the session.\n")
+    print("\n👋 Hi, this is the FEXA Agent!")
+    file_path = args[0] if args else input("Enter FEX file path: ").strip()
 
-        while True:
-            user_q = input("You: ").strip()
+    if "--watch" in sys.argv[1:]:
+        run_watch(file_path)
+        exit()
 
-            if user_q.lower() in ["quit", "exit"]:
-                print("\n👋 Session ended. Goodbye!")
-                break
+    # a folder is a batch run: metadata only, one LLM analysis per family of variants
+    if os.path.isdir(file_path):
+        run_batch(file_path)
+        exit()
 
-            schema_summary = {
-                table: list(df.columns)
-                for table, df in tables.items()
-            }
+    print("\n📡 Analyzing FEX... Please wait...\n")
 
-            qa_prompt = f"""
-            You are an expert BI & Power BI assistant.
+    fex_content = analyze_fex(file_path)
 
-            Context:
-            - FEX logic:
-            {fex_content}
+    # the reduced FEX is what every prompt below (metadata, Q&A) sees
+    fex_content, fex_stats = prepare_fex_for_prompt(fex_content, model="gpt-5-nano")
 
-            - Extracted Metadata:
-            {json.dumps(metadata, indent=2)}
+    run = RunCheckpoint(fex_content)
+    if run.completed() and not resume:
+        answer = input(
+            f"\n♻️ Found checkpoints for this FEX ({', '.join(run.completed())}). Resume from them? (yes/no): "
+        ).strip().lower()
+        if answer not in ["yes", "y"]:
+            run.reset()
+
+    # Slow LLM and file work runs on the task graph while the user answers prompts:
+    #   analysis (local DAX translation)
+    #   metadata + analysis -> metadata_excel
+    #   metadata -> catalog                     (lineage catalog upsert)
+    #   load_tables -> relationships            (needs schemas only)
+    #   load_tables -> checkpoint_tables        (parquet copy in the run directory)
+    #   load_tables + metadata -> validation
+    graph = TaskGraph()
+
+    graph.submit("metadata", checkpointed_metadata, run, fex_content, file_path)
+    graph.submit("analysis", run_analysis, fex_content)
+    graph.submit(
+        "metadata_excel",
+        lambda: write_metadata_excel(*graph.result("metadata"), graph.result("analysis")),
+        after=["metadata", "analysis"],
+    )
+    graph.submit(
+        "catalog",
+        lambda: update_catalog(file_path, fex_content, graph.result("metadata")[0]),
+        after=["metadata"],
+    )
 
-            - Source Tables & Columns:
-            {json.dumps(schema_summary, indent=2)}
+    print("\n📌 Please select your data source")
+    print("Options: csv | excel | sql | quit")
+
+    saved_source = run.load("source", run.run_id) or {}
+    source = saved_source.get("type", "")
+    while source not in ["csv", "excel", "sql", "quit"]:
+        source = input("Enter Source Type (csv/excel/sql/quit): ").strip().lower()
 
-            User Question:
-            {user_q}
+    if source == "quit":
+        graph.shutdown(wait=False)
+        print("\n👋 Session Ended. Goodbye!")
+        exit()
 
-            Answer clearly and concisely.
-        """
+    validate_tables, source_fp = start_source(graph, source, fex_content, run, saved_source)
 
-        try:
-            response = client.responses.create(
-                model="gpt-5-nano",
-                input=qa_prompt
-            )
-            print("\n🤖 Agent:", response.output_text.strip(), "\n")
-        except Exception as e:
-            print("⚠️ AI error:", e)
+    graph.submit(
+        "relationships",
+        lambda: checkpointed_relationships(run, graph.result("load_tables")),
+        after=["load_tables"],
+    )
+    if source_fp and not run.valid("tables", source_fp):
+        graph.submit(
+            "checkpoint_tables",
+            lambda: run.save_tables(source_fp, graph.result("load_tables")),
+            after=["load_tables"],
+        )
+    graph.submit(
+        "validation",
+        # keep only the match flag, the combined frame would pin every table in memory
+        lambda: validate_tables(graph.result("load_tables"), *graph.result("metadata"))[1],
+        after=["load_tables", "metadata"],
+    )
 
+    try:
+        tables = graph.result("load_tables")
+    except Exception as e:
+        print(f"❌ Failed to load {source} source: {e}")
+        tables = {}
 
-    elif source == "sql":
-        print("\n🗄️ SQL Server Source Selected")
-        print("📘 SQL Server Assistant has been called........")
+    if not tables:
+        print(f"❌ No tables returned from {source} source. Cannot proceed.")
+        graph.shutdown(wait=False)
+        exit()
 
-        data_df, matched, tables = handle_sql_flow(
-        fex_content,
-        metadata,
-        metadata_df
-        )
-        if tables:
-            proceed = input(
-                "\n❓ Do you want to generate TMDL + BIM model now? (yes/no): "
-            ).strip().lower()
+    if isinstance(tables, TableStore):
+        tables.memory_report()
 
-        if proceed in ["yes", "y"]:
-            print("🤖 TMDL Assistant is called ......")
-            build_tmdl_with_relationships(tables, metadata)
+    try:
+        metadata, metadata_df = graph.result("metadata")
+    except Exception as e:
+        print(e)
+        LLM_STATS.report()
+        ROUTER.report()
+        graph.shutdown(wait=False)
+        exit()
 
+    print("\n🤖 TMDL Assistant is ready...")
+
+    try:
+        relationships, reusable = graph.result("relationships")
+    except Exception as e:
+        print("⚠️ Relationship prediction failed:", e)
+        relationships, reusable = [], False
+
+    dax = translate_fex(fex_content, schema_of(tables), relationships)
+    tmdl_fp = fingerprint(metadata, column_types_of(tables), relationships, dax)
+
+    # TMDL_Model/ and the PBIX are shared with every other FEX: only reuse them
+    # while they are still the files this run wrote
+    if run.valid("tmdl", tmdl_fp, outputs=content_fingerprint([MANIFEST_FILE])):
+        print("\n♻️ tmdl: TMDL + BIM model unchanged since the checkpoint, skipping rebuild")
+        run.reused.append("tmdl")
+    else:
+        proceed = input(
+            "\n❓ Do you want to generate TMDL + BIM model now? (yes/no): "
+        ).strip().lower()
+
+        if proceed in ["yes", "y"]:
+            print("\n🤖 TMDL Assistant is called...")
+            build_tmdl_with_relationships(
+                tables, metadata, relationships=relationships, dax=dax, reusable=reusable
+            )
+            run.mark("tmdl", tmdl_fp, content_fingerprint([MANIFEST_FILE]))
         else:
             print("\n👍 Skipping TMDL creation. Process completed.")
 
+    model_issues = validate_model(TMDL_DIR) if os.path.isdir(TMDL_DIR) else None
+
+    model_fp = content_fingerprint([MANIFEST_FILE])
+    built = run.outputs("pbix").get("file", "")
+    if model_fp and os.path.exists(built) and run.valid("pbix", tmdl_fp, outputs=pbix_outputs(built, model_fp)):
+        print(f"♻️ Power BI file from the checkpoint is up to date: {built}")
+        run.reused.append("pbix")
+    elif model_issues is not None and not is_valid(model_issues):
+        print("⏭️ Skipping PBIX creation: the model has validation errors, fix them and rerun.")
+    else:
         print("\n❓ Do you want to generate Power BI PBIX file now? (yes/no): ")
         pbix_confirm = input().strip().lower()
-        
+
         if pbix_confirm in ["yes","y"]:
             try:
-                pbix_file = build_pbix_from_tmdl()
+                pbix_file = build_pbix_from_tmdl(issues=model_issues)
                 print(f"\n🎯 Power BI file ready: {pbix_file}")
+                run.mark("pbix", tmdl_fp, pbix_outputs(pbix_file, model_fp))
 
             except Exception as e:
                 print("❌ PBIX build failed:", e)
@@ -431,46 +867,40 @@ Metadata:
         else:
             print("👍 Skipping PBIX creation.")
 
-        print("\n💬 You can now ask questions about this FEX, data, or model.")
-        print("Type 'quit' to end the session.\n")
-        while True:
-            user_q = input("You: ").strip()
-            if user_q.lower() in ["quit", "exit"]:
-                print("\n👋 Session ended. Goodbye!")
-                break
-            schema_summary = {
-            table: list(df.columns)
-            for table, df in tables.items()
-            }
-            qa_prompt = f"""
-                    You are an expert BI & Power BI assistant.
-
-                    Context:
-                    - FEX logic:
-                    {fex_content}
-
-                    - Extracted Metadata:
-                    {json.dumps(metadata, indent=2)}
-
-                    - Source Tables & Columns:
-                    {json.dumps(schema_summary, indent=2)}
-
-                    User Question:
-                    {user_q}
-
-                    Answer clearly and concisely.
-                    """
-            
-            response = client.responses.create(
-            model="gpt-5-nano",
-            input=qa_prompt
+    engine_confirm = input(
+        "\n❓ Do you want to run the FEX locally to compute the expected report output? (yes/no): "
+    ).strip().lower()
+
+    expected_outputs = []
+    if engine_confirm in ["yes", "y"]:
+        expected_outputs = run_local_engine(
+            fex_content, tables, metadata.get("report_name", "FEX_Report")
+        )
+
+    if expected_outputs:
+        recon_confirm = input(
+            "\n❓ Do you want to reconcile the expected output against migrated data? (yes/no): "
+        ).strip().lower()
+
+        if recon_confirm in ["yes", "y"]:
+            run_reconciliation(
+                expected_outputs, tables, metadata_df, metadata.get("report_name", "FEX_Report")
             )
-            
-            print("\n🤖 Agent:", response.output_text.strip(), "\n")
 
+    for name in ["metadata_excel", "validation", "catalog", "checkpoint_tables"]:
+        if not graph.has(name):
+            continue
+        try:
+            graph.result(name)
+        except Exception as e:
+            print(f"⚠️ Background task '{name}' failed:", e)
 
-    elif source == "quit":
-        print("\n👋 Session Ended. Goodbye!")
-        exit()
+    graph.report()
+    LLM_STATS.report()
+    ROUTER.report()
+    run.report()
 
+    run_qa_session(fex_content, metadata, tables)
 
+    graph.shutdown()
+    wait_for_reports()
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+from collections import defaultdict
+
+
+TMDL_DIR = "TMDL_Model"
+BIM_FILE = "FEX_Semantic_Model.bim"
+
+CARDINALITIES = {"ManyToOne", "OneToMany", "OneToOne", "ManyToMany"}
+DIRECTIONS = {"Single", "Both"}
+TYPE_FAMILIES = {
+    "double": "numeric", "int64": "numeric", "decimal": "numeric", "integer": "numeric",
+    "datetime": "datetime", "date": "datetime",
+    "string": "string", "boolean": "boolean",
+}
+DAX_REFERENCE = re.compile(r"(?:'([^']+)'|\b([A-Za-z_]\w*))?\[([^\]]+)\]")
+DAX_STRING = re.compile(r'"(?:[^"]|"")*"')
+ITEM_START = re.compile(r"^  - (\w+): ?(.*)$")
+ITEM_FIELD = re.compile(r"^    (\w+): ?(.*)$")
+TOP_FIELD = re.compile(r"^  (\w+): ?(.*)$")
+
+
+def type_family(data_type):
+    return TYPE_FAMILIES.get(str(data_type or "").lower(), str(data_type or "").lower())
+
+
+def parse_tmdl(text):
+    """Reads the Table:/Model: files the generator writes into {field: value, section: [items]}"""
+
+    doc, section, item = {}, None, None
+    for line in text.splitlines():
+        if not line.strip() or not line.startswith(" "):
+            continue
+        m = ITEM_START.match(line)
+        if m and section:
+            item = {m.group(1): m.group(2)}
+            doc.setdefault(section, []).append(item)
+            continue
+        m = ITEM_FIELD.match(line)
+        if m and item is not None:
+            item[m.group(1)] = m.group(2)
+            continue
+        m = TOP_FIELD.match(line)
+        if m:
+            if m.group(2):
+                doc[m.group(1)] = m.group(2)
+                section, item = None, None
+            else:
+                section, item = m.group(1), None
+                doc.setdefault(section, [])
+    return doc
+
+
+class ModelGraph:
+    """Tables, columns, measures and relationships indexed by case-insensitive name"""
+
+    def __init__(self, source):
+        self.source = source
+        self.tables = {}
+        self.relationships = []
+        self.issues = []
+
+    def error(self, where, message):
+        self.issues.append(("error", f"{self.source}: {where}", message))
+
+    def warn(self, where, message):
+        self.issues.append(("warning", f"{self.source}: {where}", message))
+
+    def add_table(self, name):
+        key = str(name).lower()
+        if key in self.tables:
+            self.error(f"table {name}", "duplicate table name")
+            return self.tables[key]
+        self.tables[key] = {"name": name, "columns": {}, "measures": {}}
+        return self.tables[key]
+
+    def add_column(self, table, name, data_type, calculated=False, expression=None):
+        key = str(name).lower()
+        if not str(name).strip():
+            self.error(f"table {table['name']}", "column with an empty name")
+            return
+        if key in table["columns"]:
+            self.error(f"{table['name']}[{name}]", "duplicate column name")
+            return
+        table["columns"][key] = {
+            "name": name, "dataType": data_type, "calculated": calculated, "expression": expression,
+        }
+
+    def add_measure(self, table, name, expression):
+        key = str(name).lower()
+        if key in table["measures"]:
+            self.error(f"{table['name']}[{name}]", "duplicate measure name")
+            return
+        table["measures"][key] = {"name": name, "expression": expression}
+
+    def column(self, table, column):
+        t = self.tables.get(str(table).lower())
+        return t["columns"].get(str(column).lower()) if t else None
+
+
+def load_tmdl(tmdl_dir=TMDL_DIR):
+    graph = ModelGraph("TMDL")
+    tables_dir = os.path.join(tmdl_dir, "Tables")
+    if os.path.isdir(tables_dir):
+        for folder in sorted(os.listdir(tables_dir)):
+            path = os.path.join(tables_dir, folder, "table.tmd")
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                doc = parse_tmdl(f.read())
+            table = graph.add_table(doc.get("Name", folder))
+            for c in doc.get("Columns", []):
+                graph.add_column(
+                    table, c.get("Name", ""), c.get("DataType"),
+                    calculated=c.get("Type") == "calculated", expression=c.get("Expression"),
+                )
+            for m in doc.get("Measures", []):
+                graph.add_measure(table, m.get("Name", ""), m.get("Expression"))
+
+    model_path = os.path.join(tmdl_dir, "model.tmd")
+    if os.path.exists(model_path):
+        with open(model_path, "r", encoding="utf-8") as f:
+            doc = parse_tmdl(f.read())
+        for r in doc.get("Relationships", []):
+            graph.relationships.append({
+                "name": r.get("Name"),
+                "FromTable": r.get("FromTable"), "FromColumn": r.get("FromColumn"),
+                "ToTable": r.get("ToTable"), "ToColumn": r.get("ToColumn"),
+                "Cardinality": r.get("Cardinality"),
+                "CrossFilterDirection": r.get("CrossFilterDirection"),
+                "Active": str(r.get("IsActive", "true")).lower() == "true",
+            })
+    else:
+        graph.error(model_path, "model.tmd not found")
+    return graph
+
+
+def load_bim(bim_file=BIM_FILE):
+    graph = ModelGraph("BIM")
+    try:
+        with open(bim_file, "r", encoding="utf-8") as f:
+            bim = json.load(f)
+    except (OSError, ValueError) as e:
+        graph.error(bim_file, f"cannot be read: {e}")
+        return graph
+
+    model = bim.get("model", {})
+    for t in model.get("tables", []):
+        table = graph.add_table(t.get("name", ""))
+        for c in t.get("columns", []):
+            graph.add_column(
+                table, c.get("name", ""), c.get("dataType"),
+                calculated=c.get("type") == "calculated", expression=c.get("expression"),
+            )
+        for m in t.get("measures", []):
+            graph.add_measure(table, m.get("name", ""), m.get("expression"))
+
+    directions = {"bothDirections": "Both", "oneDirection": "Single"}
+    for r in model.get("relationships", []):
+        graph.relationships.append({
+            "name": r.get("name"),
+            "FromTable": r.get("fromTable"), "FromColumn": r.get("fromColumn"),
+            "ToTable": r.get("toTable"), "ToColumn": r.get("toColumn"),
+            "Cardinality": None,
+            "CrossFilterDirection": directions.get(r.get("crossFilteringBehavior", "oneDirection")),
+            "Active": r.get("isActive", True),
+        })
+    return graph
+
+
+def _check_names(graph):
+    measure_owner = {}
+    for table in graph.tables.values():
+        for key, m in table["measures"].items():
+            if key in table["columns"]:
+                graph.error(f"{table['name']}[{m['name']}]", "measure has the same name as a column")
+            # measure names are global in a tabular model
+            if key in measure_owner:
+                graph.error(f"{table['name']}[{m['name']}]", f"measure name already used in {measure_owner[key]}")
+            measure_owner[key] = table["name"]
+        if not table["columns"]:
+            graph.warn(f"table {table['name']}", "has no columns")
+
+
+def _check_relationships(graph):
+    seen = set()
+    active_pairs = defaultdict(list)
+    for r in graph.relationships:
+        where = f"relationship {r['FromTable']}.{r['FromColumn']} -> {r['ToTable']}.{r['ToColumn']}"
+
+        from_col = graph.column(r["FromTable"], r["FromColumn"])
+        to_col = graph.column(r["ToTable"], r["ToColumn"])
+        for side, table, column, col in (
+            ("from", r["FromTable"], r["FromColumn"], from_col), ("to", r["ToTable"], r["ToColumn"], to_col),
+        ):
+            if str(table).lower() not in graph.tables:
+                graph.error(where, f"{side} table '{table}' does not exist")
+            elif col is None:
+                graph.error(where, f"{side} column '{table}[{column}]' does not exist")
+
+        if from_col and to_col and type_family(from_col["dataType"]) != type_family(to_col["dataType"]):
+            graph.error(where, f"type mismatch: {from_col['dataType']} vs {to_col['dataType']}")
+
+        if str(r["FromTable"]).lower() == str(r["ToTable"]).lower():
+            graph.error(where, "relationship from a table to itself")
+        if r["Cardinality"] is not None and r["Cardinality"] not in CARDINALITIES:
+            graph.error(where, f"unknown cardinality '{r['Cardinality']}'")
+        if r["CrossFilterDirection"] not in DIRECTIONS:
+            graph.error(where, f"unknown cross filter direction '{r['CrossFilterDirection']}'")
+
+        key = frozenset([
+            (str(r["FromTable"]).lower(), str(r["FromColumn"]).lower()),
+            (str(r["ToTable"]).lower(), str(r["ToColumn"]).lower()),
+        ])
+        if key in seen:
+            graph.error(where, "duplicate relationship")
+        seen.add(key)
+
+        if r["Active"]:
+            active_pairs[frozenset([str(r["FromTable"]).lower(), str(r["ToTable"]).lower()])].append(where)
+
+    for pair, rels in active_pairs.items():
+        if len(rels) > 1:
+            graph.error(rels[1], f"second active relationship between {' and '.join(sorted(pair))}")
+
+
+def _check_expressions(graph):
+    for table in graph.tables.values():
+        items = [(c["name"], c["expression"]) for c in table["columns"].values() if c["calculated"]]
+        items += [(m["name"], m["expression"]) for m in table["measures"].values()]
+        for name, expression in items:
+            where = f"{table['name']}[{name}]"
+            if not expression:
+                graph.error(where, "calculated item without an expression")
+                continue
+            for quoted, bare, ref in DAX_REFERENCE.findall(DAX_STRING.sub('""', expression)):
+                ref_table = quoted or bare
+                if ref_table:
+                    target = graph.tables.get(ref_table.lower())
+                    if target is None:
+                        # function calls like SUM(x[y]) are caught by the table lookup too
+                        graph.error(where, f"references unknown table '{ref_table}'")
+                    elif ref.lower() not in target["columns"] and ref.lower() not in target["measures"]:
+                        graph.error(where, f"references unknown column '{ref_table}[{ref}]'")
+                elif ref.lower() not in table["columns"] and not any(
+                    ref.lower() in t["measures"] for t in graph.tables.values()
+                ):
+                    graph.error(where, f"references unknown column or measure [{ref}]")
+
+
+def _compare(tmdl, bim):
+    issues = []
+    for key in set(tmdl.tables) ^ set(bim.tables):
+        name = (tmdl.tables.get(key) or bim.tables.get(key))["name"]
+        issues.append(("error", "TMDL/BIM", f"table '{name}' is only in the {'TMDL' if key in tmdl.tables else 'BIM'}"))
+    for key in set(tmdl.tables) & set(bim.tables):
+        a, b = tmdl.tables[key]["columns"], bim.tables[key]["columns"]
+        for col in set(a) ^ set(b):
+            issues.append(("error", "TMDL/BIM", f"column '{tmdl.tables[key]['name']}[{(a.get(col) or b.get(col))['name']}]' differs"))
+
+    def rel_keys(graph):
+        return {
+            (str(r["FromTable"]).lower(), str(r["FromColumn"]).lower(), str(r["ToTable"]).lower(), str(r["ToColumn"]).lower())
+            for r in graph.relationships
+        }
+    if rel_keys(tmdl) != rel_keys(bim):
+        issues.append(("error", "TMDL/BIM", "relationships differ between the TMDL and the BIM"))
+    return issues
+
+
+def validate_model(tmdl_dir=TMDL_DIR, bim_file=BIM_FILE, verbose=True):
+    """Checks the generated model in-process; returns a list of (severity, where, message)"""
+
+    started = time.perf_counter()
+    if not os.path.isdir(tmdl_dir):
+        return [("error", tmdl_dir, "TMDL folder not found, run the TMDL generator first")]
+
+    tmdl, bim = load_tmdl(tmdl_dir), load_bim(bim_file)
+    for graph in (tmdl, bim):
+        _check_names(graph)
+        _check_relationships(graph)
+        _check_expressions(graph)
+
+    issues = tmdl.issues + bim.issues + _compare(tmdl, bim)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    if verbose:
+        errors = [i for i in issues if i[0] == "error"]
+        warnings = [i for i in issues if i[0] == "warning"]
+        status = "✅ Model valid" if not errors else f"❌ Model invalid: {len(errors)} error(s)"
+        print(
+            f"\n🔍 {status}, {len(warnings)} warning(s) — {len(tmdl.tables)} tables, "
+            f"{len(tmdl.relationships)} relationships checked in {elapsed:.1f} ms"
+        )
+        for severity, where, message in errors + warnings:
+            print(f"  {'❌' if severity == 'error' else '⚠️'} {where}: {message}")
+
+    return issues
+
+
+def is_valid(issues):
+    return not any(severity == "error" for severity, _, _ in issues)
@@ -0,0 +1,52 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskGraph:
+    """Runs named tasks on a thread pool, each one starting once its dependencies finish"""
+
+    def __init__(self, max_workers=6):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def submit(self, name, fn, *args, after=(), **kwargs):
+        deps = [self._futures[d] for d in after]
+
+        def run():
+            for dep in deps:
+                dep.result()
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._timings[name] = time.perf_counter() - start
+
+        self._futures[name] = self._pool.submit(run)
+        return self._futures[name]
+
+    def has(self, name):
+        return name in self._futures
+
+    def done(self, name):
+        return name in self._futures and self._futures[name].done()
+
+    def result(self, name, timeout=None):
+        return self._futures[name].result(timeout=timeout)
+
+    def report(self):
+        wall = time.perf_counter() - self._started
+        busy = sum(self._timings.values())
+
+        print("\n⏱️ Stage timings:")
+        for name, seconds in sorted(self._timings.items(), key=lambda kv: -kv[1]):
+            print(f"  {name:<20} {seconds:8.2f}s")
+        print(f"  {'(sum of stages)':<20} {busy:8.2f}s")
+        print(f"  {'(wall time)':<20} {wall:8.2f}s")
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,205 @@
+import json
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+import pandas as pd
+
+
+QUERY_ROW_LIMIT = 50
+QUERY_CACHE_SIZE = 64
+# result cells sent back to the model, whatever the plan asks for
+MAX_RESULT_CHARS = 6000
+
+OPS = {
+    "eq": lambda s, v: s == v,
+    "ne": lambda s, v: s != v,
+    "gt": lambda s, v: s > v,
+    "ge": lambda s, v: s >= v,
+    "lt": lambda s, v: s < v,
+    "le": lambda s, v: s <= v,
+}
+
+
+class QueryPlan:
+    """A validated query plan: every table and column resolved against the loaded tables"""
+
+    def __init__(self, plan, schemas):
+        self.plan = plan
+        self._tables = {str(t).lower(): t for t in schemas}
+        self.base = self._table(plan["table"])
+        self.joins = []
+        involved = [self.base]
+        for j in plan["joins"]:
+            table = self._table(j["table"])
+            involved.append(table)
+            self.joins.append((table, j["left_on"], j["right_on"], j["how"]))
+
+        # 'TABLE.COLUMN' or a bare column that only one involved table has
+        self._qualified, self._bare = {}, defaultdict(list)
+        for t in involved:
+            for c in schemas[t]:
+                self._qualified[f"{t}.{c}".lower()] = (t, c)
+                self._bare[str(c).lower()].append((t, c))
+
+        # a bare join key belongs to the tables joined so far (left) or the joined table (right)
+        self.joins = [
+            (table, self.column(left, involved[:i + 1]), self.column(right, [table]), how)
+            for i, (table, left, right, how) in enumerate(self.joins)
+        ]
+
+    def _table(self, name):
+        table = self._tables.get(str(name).lower())
+        if table is None:
+            raise Exception(f"❌ Unknown table '{name}', available: {', '.join(map(str, self._tables.values()))}")
+        return table
+
+    def column(self, name, within=None):
+        key = str(name).lower()
+        if key in self._qualified:
+            return self._qualified[key]
+
+        found = [tc for tc in self._bare.get(key, []) if within is None or tc[0] in within]
+        if len(found) > 1:
+            raise Exception(f"❌ Column '{name}' is ambiguous, qualify it as TABLE.COLUMN")
+        if not found:
+            raise Exception(f"❌ Unknown column '{name}'")
+        return found[0]
+
+
+def _qualified(table, column):
+    return f"{table}.{column}"
+
+
+def _coerce(series, values):
+    """Plan values arrive as strings; compare them as the column's own type"""
+
+    if pd.api.types.is_bool_dtype(series):
+        return series, [str(v).lower() in ("true", "1", "yes", "y") for v in values]
+    if pd.api.types.is_numeric_dtype(series):
+        return series, [pd.to_numeric(v) for v in values]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, [pd.Timestamp(v) for v in values]
+    return series.astype("string"), [str(v) for v in values]
+
+
+def _apply_filter(df, column, op, values):
+    series, values = _coerce(df[column], values)
+    if op == "in":
+        return df[series.isin(values).fillna(False)]
+    if not values:
+        raise Exception(f"❌ Filter on '{column}' has no value")
+    if op == "contains":
+        return df[series.astype("string").str.contains(str(values[0]), case=False, regex=False).fillna(False)]
+    return df[OPS[op](series, values[0]).fillna(False)]
+
+
+def execute_plan(plan, tables, row_limit=QUERY_ROW_LIMIT):
+    """Runs a query plan on the loaded tables; returns (result frame, matching row count)"""
+
+    qp = QueryPlan(plan, {t: list(tables[t].columns) for t in tables})
+
+    refs = [qp.column(f["column"]) for f in plan["filters"]]
+    refs += [qp.column(c) for c in plan["columns"] + plan["group_by"]]
+    refs += [qp.column(a["column"]) for a in plan["aggregates"] if a["column"] != "*"]
+    refs += [qp.column(o["column"]) for o in plan["order_by"] if not _is_alias(plan, o["column"])]
+    for _, left, right, _ in qp.joins:
+        refs += [left, right]
+
+    # only the referenced columns of each table are copied into the working frame
+    def frame(table):
+        cols = list(dict.fromkeys(c for t, c in refs if t == table))
+        if not cols and table == qp.base:
+            cols = list(tables[table].columns)
+        return tables[table][cols].rename(columns=lambda c: _qualified(table, c))
+
+    df = frame(qp.base)
+    for table, left, right, how in qp.joins:
+        df = df.merge(frame(table), how=how, left_on=_qualified(*left), right_on=_qualified(*right))
+
+    for f in plan["filters"]:
+        df = _apply_filter(df, _qualified(*qp.column(f["column"])), f["op"], f["values"])
+
+    group = [_qualified(*qp.column(c)) for c in plan["group_by"]]
+    aggs = plan["aggregates"]
+    if group or aggs:
+        named = {}
+        for a in aggs:
+            alias = a["alias"] or f"{a['func']}_{a['column']}".replace("*", "rows")
+            if a["column"] == "*":
+                named[alias] = pd.NamedAgg(column=df.columns[0], aggfunc="size")
+            else:
+                named[alias] = pd.NamedAgg(column=_qualified(*qp.column(a["column"])), aggfunc=a["func"])
+        if not named:
+            named["rows"] = pd.NamedAgg(column=df.columns[0], aggfunc="size")
+        if group:
+            df = df.groupby(group, observed=True, dropna=False).agg(**named).reset_index()
+        else:
+            df = pd.DataFrame({k: [_aggregate(df[v.column], v.aggfunc)] for k, v in named.items()})
+    elif plan["columns"]:
+        df = df[[_qualified(*qp.column(c)) for c in plan["columns"]]]
+
+    if plan["order_by"]:
+        by = [o["column"] if _is_alias(plan, o["column"]) else _qualified(*qp.column(o["column"]))
+              for o in plan["order_by"]]
+        df = df.sort_values(by, ascending=[not o["descending"] for o in plan["order_by"]])
+
+    matched = len(df)
+    limit = min(plan["limit"], row_limit) if plan["limit"] and plan["limit"] > 0 else row_limit
+    df = df.head(limit).reset_index(drop=True)
+
+    # bare column names read better wherever they are unambiguous
+    bare = [c.split(".", 1)[1] if "." in c else c for c in df.columns]
+    if len(set(bare)) == len(bare):
+        df.columns = bare
+    return df, matched
+
+
+def _is_alias(plan, name):
+    return any(a["alias"] and a["alias"] == name for a in plan["aggregates"])
+
+
+def _aggregate(series, func):
+    return len(series) if func == "size" else getattr(series, func)()
+
+
+class QueryEngine:
+    """Executes query plans against the session's tables with an LRU result cache"""
+
+    def __init__(self, tables, row_limit=QUERY_ROW_LIMIT, cache_size=QUERY_CACHE_SIZE):
+        self.tables = tables
+        self.row_limit = row_limit
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def run(self, plan):
+        """Returns (result frame, matching rows, seconds, cached)"""
+
+        key = json.dumps(plan, sort_keys=True)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                df, matched = self._cache[key]
+                return df, matched, 0.0, True
+
+        started = time.perf_counter()
+        df, matched = execute_plan(plan, self.tables, self.row_limit)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._cache[key] = (df, matched)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return df, matched, elapsed, False
+
+
+def result_text(df, matched):
+    """The result as compact CSV for the answer prompt, truncated to MAX_RESULT_CHARS"""
+
+    text = df.to_csv(index=False)
+    if len(text) > MAX_RESULT_CHARS:
+        text = text[:MAX_RESULT_CHARS].rsplit("\n", 1)[0] + "\n..."
+    if matched > len(df):
+        text += f"\n({len(df)} of {matched} rows shown)"
+    return text
@@ -0,0 +1,288 @@
+import os
+import time
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from report_writer import write_report
+
+
+RECON_PARTITIONS = 16
+RECON_CHUNK_ROWS = 500_000
+RECON_DECIMALS = 6
+RECON_SAMPLE_ROWS = 200
+RECON_REPORT = "FEX_Reconciliation_Report.xlsx"
+# constant key of outputs without keys (grand totals), compared as a single group
+NO_KEY = "__all"
+
+
+def iter_chunks(source, chunk_rows=RECON_CHUNK_ROWS):
+    """Yields frames from a DataFrame, a CSV path or an iterable of frames"""
+
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_rows):
+            yield source.iloc[start:start + chunk_rows]
+    elif isinstance(source, str):
+        yield from pd.read_csv(source, chunksize=chunk_rows, low_memory=False)
+    else:
+        yield from source
+
+
+def _match_columns(df, names):
+    by_lower = {str(c).lower(): c for c in df.columns}
+    missing = [n for n in names if n.lower() not in by_lower]
+    if missing:
+        raise KeyError(f"Columns {missing} not found; available: {list(df.columns)}")
+    return [by_lower[n.lower()] for n in names]
+
+
+def guess_columns(df, key_cols=None):
+    """Text/date columns become keys and numeric columns become measures; key_cols
+    (the request's BY/ACROSS fields) are keys whatever their type"""
+
+    keys = _match_columns(df, key_cols) if key_cols else []
+    keys, measures = [str(c) for c in keys], []
+    for c in df.columns:
+        if str(c) in keys:
+            continue
+        if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]):
+            measures.append(str(c))
+        else:
+            keys.append(str(c))
+    return keys, measures
+
+
+def normalize_chunk(df, key_cols, measure_cols, decimals=RECON_DECIMALS):
+    """Canonical form both sides are hashed in: trimmed upper-case keys, rounded measures"""
+
+    keys = _match_columns(df, key_cols)
+    measures = _match_columns(df, measure_cols)
+
+    out = pd.DataFrame(index=df.index)
+    for name, col in zip(key_cols, keys):
+        s = df[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            s = s.dt.strftime("%Y-%m-%d %H:%M:%S").str.replace(" 00:00:00", "", regex=False)
+        elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            # 2023 and 2023.0 are the same key on both sides
+            s = pd.to_numeric(s, errors="coerce").astype("float64").round(decimals)
+        out[name] = s.astype("string").fillna("").str.strip().str.upper()
+    for name, col in zip(measure_cols, measures):
+        out[name] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("float64").round(decimals)
+    return out.reset_index(drop=True)
+
+
+def _column_hash(series):
+    values = series.to_numpy(dtype=object if series.dtype == "string" else None)
+    # high-cardinality keys: factorizing first only adds a pass
+    return pd.util.hash_array(values, categorize=False)
+
+
+def _combine(hashes, rows):
+    out = np.full(rows, 0x345678, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for h in hashes:
+            out = (out ^ h) * np.uint64(1000003)
+    return out
+
+
+def _hashes(norm, key_cols):
+    """Per-row key hash (for partitioning) and full-row hash (for partition fingerprints)"""
+
+    key_hash = _combine([_column_hash(norm[c]) for c in key_cols], len(norm))
+    measure_cols = [c for c in norm.columns if c not in key_cols]
+    row_hash = _combine([key_hash] + [_column_hash(norm[c]) for c in measure_cols], len(norm))
+    return key_hash, row_hash
+
+
+class _SidePartitions:
+    """Spills one side of the comparison into key-hash partitions on disk"""
+
+    def __init__(self, side, workdir, partitions):
+        self.side = side
+        self.workdir = workdir
+        self.partitions = partitions
+        self.files = [[] for _ in range(partitions)]
+        self.key_files = [[] for _ in range(partitions)]
+        self.counts = np.zeros(partitions, dtype=np.int64)
+        self.group_hash = np.zeros(partitions, dtype=np.uint64)
+        self.rows = 0
+
+    def add(self, norm, key_cols):
+        key_hash, row_hash = _hashes(norm, key_cols)
+        part = key_hash % np.uint64(self.partitions)
+
+        # order independent per-partition fingerprint: count + wrapping sum of row hashes
+        np.add.at(self.counts, part, 1)
+        with np.errstate(over="ignore"):
+            np.add.at(self.group_hash, part, row_hash)
+
+        for p in np.unique(part):
+            in_part = part == p
+            path = os.path.join(self.workdir, f"{self.side}_{p}_{len(self.files[p])}")
+            norm[in_part].to_pickle(path + ".pkl")
+            self.files[p].append(path + ".pkl")
+            # distinct key hashes, so identical partitions count keys without reloading rows
+            np.save(path + ".npy", np.unique(key_hash[in_part]))
+            self.key_files[p].append(path + ".npy")
+
+        self.rows += len(norm)
+
+    def distinct_keys(self, p):
+        if not self.key_files[p]:
+            return 0
+        return len(np.unique(np.concatenate([np.load(f) for f in self.key_files[p]])))
+
+    def load(self, p, columns):
+        if not self.files[p]:
+            return pd.DataFrame(columns=columns)
+        return pd.concat([pd.read_pickle(f) for f in self.files[p]], ignore_index=True)
+
+
+def _compare_partition(exp, act, key_cols, measure_cols, tolerance):
+    def collapse(df):
+        if df.empty:
+            return pd.DataFrame(columns=key_cols + measure_cols + ["__rows"])
+        grouped = df.groupby(key_cols, dropna=False, sort=False)
+        out = grouped[measure_cols].sum() if measure_cols else grouped.size().to_frame("__drop")
+        out["__rows"] = grouped.size()
+        return out.drop(columns=["__drop"], errors="ignore").reset_index()
+
+    merged = collapse(exp).merge(
+        collapse(act), on=key_cols, how="outer", suffixes=("_expected", "_actual"), indicator=True
+    )
+
+    missing_actual = merged[merged["_merge"] == "left_only"]
+    missing_expected = merged[merged["_merge"] == "right_only"]
+    both = merged[merged["_merge"] == "both"]
+
+    diff_mask = pd.Series(False, index=both.index)
+    per_measure = {}
+    for m in measure_cols + ["__rows"]:
+        d = (both[f"{m}_expected"].astype(float) - both[f"{m}_actual"].astype(float)).abs() > tolerance
+        per_measure[m] = int(d.sum())
+        diff_mask |= d
+
+    return {
+        "keys_compared": len(merged),
+        "keys_matched": int((~diff_mask).sum()),
+        "missing_in_actual": missing_actual,
+        "missing_in_expected": missing_expected,
+        "value_mismatches": both[diff_mask],
+        "per_measure": per_measure,
+    }
+
+
+def reconcile(expected, actual, key_cols=None, measure_cols=None, partitions=RECON_PARTITIONS,
+              chunk_rows=RECON_CHUNK_ROWS, decimals=RECON_DECIMALS, sample_rows=RECON_SAMPLE_ROWS):
+    """Streams both sides, partitions them by key hash and compares only differing partitions.
+    key_cols are always keys (numeric BY fields included); other text/date columns join them
+    and numeric columns become measures unless measure_cols is given"""
+
+    started = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix="fex_recon_")
+    tolerance = 10 ** -decimals
+
+    try:
+        exp_side = _SidePartitions("expected", workdir, partitions)
+        act_side = _SidePartitions("actual", workdir, partitions)
+
+        resolved, shown_keys = False, list(key_cols or [])
+        for side, source in ((exp_side, expected), (act_side, actual)):
+            for chunk in iter_chunks(source, chunk_rows):
+                if not resolved:
+                    guessed_keys, guessed = guess_columns(chunk, key_cols)
+                    if measure_cols is None:
+                        key_cols, measure_cols = guessed_keys, guessed
+                    elif key_cols is None:
+                        key_cols = [c for c in guessed_keys if c not in measure_cols]
+                    shown_keys, key_cols = key_cols, key_cols or [NO_KEY]
+                    resolved = True
+                if key_cols == [NO_KEY]:
+                    chunk = chunk.assign(**{NO_KEY: ""})
+                side.add(normalize_chunk(chunk, key_cols, measure_cols, decimals), key_cols)
+
+        print(f"🔑 Keys: {shown_keys} | 📏 Measures: {measure_cols}")
+
+        columns = key_cols + measure_cols
+        samples = {"missing_in_actual": [], "missing_in_expected": [], "value_mismatch": []}
+        totals = {"keys_compared": 0, "keys_matched": 0, "missing_in_actual": 0,
+                  "missing_in_expected": 0, "value_mismatches": 0}
+        per_measure = {m: 0 for m in measure_cols + ["__rows"]}
+        identical = 0
+
+        for p in range(partitions):
+            if (exp_side.counts[p] == act_side.counts[p]
+                    and exp_side.group_hash[p] == act_side.group_hash[p]):
+                identical += 1
+                # every key of an identical partition is a compared and matched key
+                keys = exp_side.distinct_keys(p)
+                totals["keys_compared"] += keys
+                totals["keys_matched"] += keys
+                continue
+
+            result = _compare_partition(
+                exp_side.load(p, columns), act_side.load(p, columns),
+                key_cols, measure_cols, tolerance,
+            )
+            totals["keys_compared"] += result["keys_compared"]
+            totals["keys_matched"] += result["keys_matched"]
+            for name, label in (("missing_in_actual", "missing_in_actual"),
+                                ("missing_in_expected", "missing_in_expected"),
+                                ("value_mismatches", "value_mismatch")):
+                frame = result[name]
+                totals[name] += len(frame)
+                taken = sum(len(s) for s in samples[label])
+                if taken < sample_rows and len(frame):
+                    samples[label].append(frame.head(sample_rows - taken).assign(Issue=label))
+            for m, n in result["per_measure"].items():
+                per_measure[m] += n
+
+        elapsed = time.perf_counter() - started
+        status = "MATCH" if not (totals["missing_in_actual"] or totals["missing_in_expected"]
+                                 or totals["value_mismatches"]) else "MISMATCH"
+
+        summary = {
+            "Status": status,
+            "Expected Rows": exp_side.rows,
+            "Actual Rows": act_side.rows,
+            "Partitions": partitions,
+            "Identical Partitions": identical,
+            "Keys Compared": totals["keys_compared"],
+            "Keys Matched": totals["keys_matched"],
+            "Missing In Actual": totals["missing_in_actual"],
+            "Missing In Expected": totals["missing_in_expected"],
+            "Value Mismatches": totals["value_mismatches"],
+            "Row Count Mismatches": per_measure.pop("__rows"),
+            "Key Columns": ", ".join(shown_keys) or "(none, compared as one total)",
+            "Measure Columns": ", ".join(measure_cols),
+            "Seconds": round(elapsed, 3),
+        }
+        for m, n in per_measure.items():
+            summary[f"Mismatches: {m}"] = n
+
+        parts = [f for frames in samples.values() for f in frames]
+        mismatch_df = pd.concat(parts, ignore_index=True).drop(columns=["_merge"], errors="ignore") \
+            if parts else pd.DataFrame()
+
+        print(
+            f"\n🤝 Reconciliation {status}: {exp_side.rows} expected vs {act_side.rows} actual rows, "
+            f"{identical}/{partitions} partitions identical by hash, {elapsed:.2f}s"
+        )
+        return summary, mismatch_df
+
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def write_reconciliation_report(summary, mismatch_df, metadata_df=None, path=RECON_REPORT):
+
+    print("\n💾 Creating reconciliation report...")
+
+    sheets = [("FEX_Metadata", metadata_df), ("Reconciliation_Summary", pd.DataFrame([summary]))]
+    if not mismatch_df.empty:
+        sheets.append(("Mismatch_Samples", mismatch_df))
+
+    return write_report(path, sheets, label="Reconciliation Report")
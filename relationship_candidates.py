@@ -0,0 +1,259 @@
+import re
+import difflib
+from collections import defaultdict
+
+
+KEY_COLUMN = re.compile(r"(^id$|id$|key$|code$|_no$|num$|number$|_sk$)", re.I)
+KEY_SUFFIX = re.compile(r"(id|key|code|no|num|number|sk)$")
+NAME_SIMILARITY = 0.85
+CLUSTER_MAX_PAIRS = 40
+
+
+def normalize_name(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def singular(table):
+    t = normalize_name(table)
+    if t.endswith("ies"):
+        return t[:-3] + "y"
+    if t.endswith("ses") or t.endswith("xes"):
+        return t[:-2]
+    if t.endswith("s") and not t.endswith("ss"):
+        return t[:-1]
+    return t
+
+
+def is_key_like(column):
+    return bool(KEY_COLUMN.search(str(column)))
+
+
+def _entity_names(table):
+    """'dim_customers' -> {'dimcustomer', 'customer'}"""
+
+    words = [w for w in re.split(r"[^a-z0-9]+", str(table).lower()) if w]
+    return {singular(table), singular(words[-1]) if words else ""} - {""}
+
+
+def primary_key_score(table, column):
+    """2 = the table's own identifier (ID, CUSTOMER_ID in DIM_CUSTOMERS), 1 = key-like, 0 = neither"""
+
+    col = normalize_name(column)
+    if col in ("id", "key"):
+        return 2
+    m = KEY_SUFFIX.search(col)
+    stem = col[:m.start()] if m else ""
+    if len(stem) >= 3 and any(name.endswith(stem) for name in _entity_names(table) | {normalize_name(table)}):
+        return 2
+    return 1 if is_key_like(column) else 0
+
+
+def type_family(dtype):
+    if dtype is None:
+        return None
+    dtype = str(dtype).lower()
+    if "int" in dtype or "float" in dtype or "decimal" in dtype or dtype == "double":
+        return "numeric"
+    if "date" in dtype or "time" in dtype:
+        return "datetime"
+    return "string"
+
+
+def types_compatible(a, b):
+    fa, fb = type_family(a), type_family(b)
+    return fa is None or fb is None or fa == fb
+
+
+def _index_names(table, column):
+    """Names a key column is looked up under; a bare ID also stands for <table>_ID"""
+
+    col = normalize_name(column)
+    if col in ("id", "key"):
+        # two bare IDs name different entities, so only the qualified form is indexed
+        return {name + col for name in _entity_names(table)}
+    return {col}
+
+
+def generate_candidates(table_schemas, column_types=None, stats=None):
+    """Candidate (from, to) column pairs from key-like names, similar names and compatible types"""
+
+    column_types = column_types or {}
+    stats = stats if stats is not None else {}
+
+    columns = [(t, c) for t, cols in table_schemas.items() for c in cols]
+    keys = [(t, c) for t, c in columns if is_key_like(c)]
+    stats["columns"] = len(columns)
+    stats["key_like_columns"] = len(keys)
+    stats["all_pairs"] = len(columns) * (len(columns) - 1) // 2
+
+    index = defaultdict(list)
+    for t, c in keys:
+        for name in _index_names(t, c):
+            index[name].append((t, c))
+
+    # similar (not equal) key names are linked on the distinct names only, not on every column
+    names = sorted(index)
+    similar = defaultdict(set)
+    for name in names:
+        for match in difflib.get_close_matches(name, names, n=5, cutoff=NAME_SIMILARITY):
+            if match != name:
+                similar[name].add(match)
+
+    # every pair needs a primary-key side, so pairs are only grown from primary keys;
+    # foreign key to foreign key (two facts sharing CUSTOMER_ID) is never a relationship
+    raw = set()
+    for name, members in index.items():
+        peers = list(members)
+        for other in similar[name]:
+            peers += [m for m in index[other] if primary_key_score(*m) < 2]
+        for a in members:
+            if primary_key_score(*a) < 2:
+                continue
+            for b in peers:
+                if a[0] != b[0]:
+                    raw.add(tuple(sorted([a, b])))
+    stats["name_index_pairs"] = len(raw)
+
+    candidates = []
+    for (ta, ca), (tb, cb) in sorted(raw):
+        if not types_compatible(column_types.get(ta, {}).get(ca), column_types.get(tb, {}).get(cb)):
+            continue
+
+        sa, sb = primary_key_score(ta, ca), primary_key_score(tb, cb)
+        # the 'one' side is the table whose own identifier the column is
+        if sa > sb:
+            (ta, ca, sa), (tb, cb, sb) = (tb, cb, sb), (ta, ca, sa)
+
+        exact = bool(_index_names(ta, ca) & _index_names(tb, cb))
+        score = (2 if exact else 1) + sb + (1 if sb > sa else 0)
+        candidates.append({
+            "FromTable": ta, "FromColumn": ca,
+            "ToTable": tb, "ToColumn": cb,
+            "score": score,
+            "directed": sb > sa,
+        })
+    stats["type_compatible_pairs"] = len(candidates)
+
+    candidates.sort(key=lambda c: (-c["score"], c["FromTable"], c["FromColumn"], c["ToTable"]))
+    return candidates
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        self.parent[ra] = rb
+        return True
+
+
+def cluster_candidates(candidates, max_pairs=CLUSTER_MAX_PAIRS):
+    """Groups candidates into connected table clusters, splitting clusters that are too big for one prompt"""
+
+    uf = _UnionFind()
+    for c in candidates:
+        uf.union(c["FromTable"], c["ToTable"])
+
+    groups = defaultdict(list)
+    for c in candidates:
+        groups[uf.find(c["FromTable"])].append(c)
+
+    clusters = []
+    for members in groups.values():
+        for start in range(0, len(members), max_pairs):
+            clusters.append(members[start:start + max_pairs])
+    return clusters
+
+
+def _reachable(edges, start, goal):
+    seen, stack = {start}, [start]
+    while stack:
+        node = stack.pop()
+        if node == goal:
+            return True
+        for nxt in edges[node]:
+            if nxt not in seen:
+                seen.add(nxt)
+                stack.append(nxt)
+    return False
+
+
+def _filter_edges(r):
+    """Filters flow from the one side (To) to the many side (From); Both adds the reverse"""
+
+    edges = [(r["ToTable"], r["FromTable"])]
+    if r["CrossFilterDirection"] == "Both":
+        edges.append((r["FromTable"], r["ToTable"]))
+    return edges
+
+
+def _creates_ambiguity(edges, r):
+    for u, v in _filter_edges(r):
+        # a second filter path u -> v, or a loop back v -> u
+        if u == v or _reachable(edges, u, v) or _reachable(edges, v, u):
+            return True
+    return False
+
+
+def resolve_relationships(relationships, candidates):
+    """Drops duplicates and unknown pairs, then keeps one active filter path between any two tables"""
+
+    known = {}
+    for c in candidates:
+        known[(c["FromTable"], c["FromColumn"], c["ToTable"], c["ToColumn"])] = (c, False)
+        known[(c["ToTable"], c["ToColumn"], c["FromTable"], c["FromColumn"])] = (c, True)
+
+    chosen = {}
+    for r in relationships:
+        try:
+            key = (r["FromTable"], r["FromColumn"], r["ToTable"], r["ToColumn"])
+        except (KeyError, TypeError):
+            continue
+        if key not in known:
+            continue
+        cand, reversed_pair = known[key]
+        # a directed candidate already knows which side is the key
+        if reversed_pair and cand["directed"]:
+            r = dict(r, FromTable=cand["FromTable"], FromColumn=cand["FromColumn"],
+                     ToTable=cand["ToTable"], ToColumn=cand["ToColumn"])
+        pair = frozenset([(cand["FromTable"], cand["FromColumn"]), (cand["ToTable"], cand["ToColumn"])])
+        if pair not in chosen or cand["score"] > chosen[pair][1]:
+            chosen[pair] = (r, cand["score"])
+
+    ranked = sorted(chosen.values(), key=lambda x: -x[1])
+
+    edges = defaultdict(set)
+    resolved, demoted = [], 0
+    for r, _ in ranked:
+        r = {
+            "FromTable": r["FromTable"],
+            "FromColumn": r["FromColumn"],
+            "ToTable": r["ToTable"],
+            "ToColumn": r["ToColumn"],
+            "Cardinality": r.get("Cardinality", "ManyToOne"),
+            "CrossFilterDirection": "Both" if r.get("CrossFilterDirection") == "Both" else "Single",
+            "Active": bool(r.get("Active", True)),
+        }
+
+        if r["Active"] and _creates_ambiguity(edges, r) and r["CrossFilterDirection"] == "Both":
+            r["CrossFilterDirection"] = "Single"
+        if r["Active"] and _creates_ambiguity(edges, r):
+            r["Active"] = False
+            demoted += 1
+
+        if r["Active"]:
+            for u, v in _filter_edges(r):
+                edges[u].add(v)
+        resolved.append(r)
+
+    return resolved, demoted
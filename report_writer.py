@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+try:
+    import xlsxwriter
+    HAS_XLSXWRITER = True
+except ImportError:
+    HAS_XLSXWRITER = False
+
+
+# xlsx | parquet | jsonl
+REPORT_FORMAT = "xlsx"
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-writer")
+_pending = []
+_lock = threading.Lock()
+
+
+def _cell(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if isinstance(value, float) and value != value else value
+    if isinstance(value, (str, int, float, bool, pd.Timestamp)):
+        return value
+    # lists/dicts from json_normalize and anything else Excel has no type for
+    return json.dumps(value, default=str) if isinstance(value, (list, dict)) else str(value)
+
+
+def _rows(df):
+    yield [str(c) for c in df.columns]
+    for row in df.itertuples(index=False, name=None):
+        yield [_cell(v) for v in row]
+
+
+def _file_name(sheet):
+    return re.sub(r"[^\w\-]+", "_", sheet).strip("_") or "sheet"
+
+
+def write_xlsx(path, sheets):
+    """Streams rows straight to the file, nothing is held per cell"""
+
+    if HAS_XLSXWRITER:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "nan_inf_to_errors": True})
+        for name, df in sheets:
+            ws = workbook.add_worksheet(name[:31])
+            for r, row in enumerate(_rows(df)):
+                ws.write_row(r, 0, row)
+        workbook.close()
+        return path
+
+    workbook = Workbook(write_only=True)
+    for name, df in sheets:
+        ws = workbook.create_sheet(name[:31])
+        for row in _rows(df):
+            ws.append(row)
+    workbook.save(path)
+    return path
+
+
+def write_parquet(path, sheets):
+    out_dir = os.path.splitext(path)[0]
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in sheets:
+        df = df.rename(columns=str)
+        target = os.path.join(out_dir, f"{_file_name(name)}.parquet")
+        try:
+            df.to_parquet(target, index=False)
+        except (TypeError, ValueError):
+            # mixed-type object columns are written as text
+            mixed = {c: df[c].map(_cell).astype("string") for c in df.columns if df[c].dtype == object}
+            df.assign(**mixed).to_parquet(target, index=False)
+    return out_dir
+
+
+def write_jsonl(path, sheets):
+    out_dir = os.path.splitext(path)[0]
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in sheets:
+        df.rename(columns=str).to_json(
+            os.path.join(out_dir, f"{_file_name(name)}.jsonl"),
+            orient="records", lines=True, date_format="iso", force_ascii=False,
+        )
+    return out_dir
+
+
+BACKENDS = {
+    "xlsx": write_xlsx,
+    "parquet": write_parquet,
+    "jsonl": write_jsonl,
+}
+
+
+def output_path(path, fmt=None):
+    """Where a report ends up: the .xlsx file itself, or a folder of per-sheet files"""
+
+    fmt = fmt or REPORT_FORMAT
+    return path if fmt == "xlsx" else os.path.splitext(path)[0]
+
+
+def _write(path, sheets, fmt, label):
+    started = time.perf_counter()
+    try:
+        target = BACKENDS[fmt](path, sheets)
+    except Exception as e:
+        print(f"❌ {label} failed to write ({fmt}): {e}")
+        raise
+    print(f"✅ {label} Generated: {target} ({time.perf_counter() - started:.2f}s in background)")
+    return target
+
+
+def write_report(path, sheets, label="Report", fmt=None):
+    """Queues [(sheet name, DataFrame)] for the background writer; returns the output path"""
+
+    fmt = fmt or REPORT_FORMAT
+    if fmt not in BACKENDS:
+        raise Exception(f"❌ Unknown report format '{fmt}', expected one of {', '.join(BACKENDS)}")
+
+    sheets = [(name, df) for name, df in sheets if df is not None]
+    with _lock:
+        _pending.append(_writer.submit(_write, path, sheets, fmt, label))
+    return output_path(path, fmt)
+
+
+def wait_for_reports():
+    """Blocks until every queued report is on disk"""
+
+    with _lock:
+        pending = list(_pending)
+        _pending.clear()
+    for future in pending:
+        try:
+            future.result()
+        except Exception:
+            pass  # already reported by the writer thread
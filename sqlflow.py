@@ -3,6 +3,26 @@ import json
 import os
 from sql_auth import build_sql_connections
 from csvflow import semantic_csv_analysis
+from table_store import TableStore, schema_of
+from fex_chunker import count_requests
+from report_writer import write_report
+from fex_projection import referenced_columns, project_columns, describe_projection
+from fex_parser import parse_fex, parse_expression, expression_identifiers, column_name, tokenize
+from fex_engine import evaluate
+from fex_filters import (
+    collect_predicates,
+    predicates_for_table,
+    build_where_clause,
+    apply_filters_client,
+    quote_ident,
+    literal_values,
+    PLACEHOLDERS,
+)
+
+SQL_NUMERIC_TYPES = {
+    "bit", "tinyint", "smallint", "mediumint", "int", "integer", "bigint",
+    "decimal", "numeric", "float", "real", "double", "money", "smallmoney",
+}
 
 
 def load_sql_creds():
@@ -22,22 +42,165 @@ def load_sql_creds():
         return creds
 
 
-def load_table(conn, table_name, db_type):
-    """Loads table based on database type"""
+def numeric_columns(conn, table_name, db_type):
+    """Numeric columns of a table from INFORMATION_SCHEMA, or None when they can't be read"""
+
+    schema, _, table = str(table_name).rpartition(".")
+    strip = "[]`\""
+    ph = PLACEHOLDERS[db_type]
+    sql = f"SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = {ph}"
+    params = [table.strip(strip)]
+    if schema:
+        sql += f" AND TABLE_SCHEMA = {ph}"
+        params.append(schema.rpartition(".")[2].strip(strip))
+    try:
+        types = pd.read_sql(sql, conn, params=params)
+    except Exception as e:
+        print(f"⚠️ Could not read column types of {table_name} ({e}); numeric filter values stay as typed")
+        return None
+    if types.empty:
+        return None
+    return {
+        name for name, data_type in zip(types.iloc[:, 0], types.iloc[:, 1])
+        if str(data_type).lower() in SQL_NUMERIC_TYPES
+    }
+
+
+def _expressions_for_table(expressions, table_name, columns):
+    """Expression filters of a table whose every field is one of its columns"""
+
+    by_lower = {str(c).lower() for c in columns}
+    selected = []
+    for table, text, node, names in expressions:
+        if table.lower() != str(table_name).lower():
+            continue
+        if all(column_name(n).lower() in by_lower for n in names):
+            selected.append((text, node, names))
+        else:
+            print(f"⚠️ Filter '{text}' uses fields outside {table_name}, loading unfiltered for it")
+    return selected
 
-    if db_type == "sqlserver":
-        query = f"SELECT * FROM [{table_name}]"
 
-    elif db_type == "mysql":
-        query = f"SELECT * FROM `{table_name}`"
+def load_table(conn, table_name, db_type, filters=None, refs=None):
+    """Loads table based on database type, pushing FEX filters and columns down when possible.
+    filters is (predicates, expression filters) from sql_predicates"""
 
-    else:
+    if db_type not in ("sqlserver", "mysql"):
         raise Exception("❌ Unsupported DB type. Use: sqlserver or mysql")
 
-    return pd.read_sql(query, conn)
+    source = quote_ident(table_name, db_type)
+    predicates, expressions = filters or ([], [])
 
+    if not predicates and not expressions and refs is None:
+        return pd.read_sql(f"SELECT * FROM {source}", conn)
 
-def handle_sql_flow(fex_content, metadata, metadata_df):
+    columns = pd.read_sql(f"SELECT * FROM {source} WHERE 1 = 0", conn).columns
+
+    # '00123' stays text against a varchar column, 123 against a numeric one
+    numeric = numeric_columns(conn, table_name, db_type) if predicates else None
+    applicable = predicates_for_table(predicates, table_name, columns, numeric)
+    if numeric is None:
+        applicable = [
+            dict(p, values=literal_values(p, None)) if p["kinds"] == {"literal"} else p for p in applicable
+        ]
+    where, params, client_side = build_where_clause(applicable, db_type)
+    if where:
+        print(f"⬇️ Pushed down to {table_name}:{where}")
+    client_expressions = _expressions_for_table(expressions, table_name, columns)
+
+    selected = project_columns(refs, table_name, columns)
+    describe_projection(table_name, selected, columns)
+
+    if selected is None:
+        select_list = "*"
+    else:
+        # client side filters may need columns the report itself never prints
+        needed = {p["column"] for p in client_side}
+        needed |= {v for p in client_side if "column" in p["kinds"] for v in p["values"]}
+        needed_lower = {column_name(n).lower() for _, _, names in client_expressions for n in names}
+        needed |= {c for c in columns if str(c).lower() in needed_lower}
+        selected += [c for c in columns if c in needed and c not in selected]
+        select_list = ", ".join(quote_ident(c, db_type) for c in selected)
+
+    df = pd.read_sql(f"SELECT {select_list} FROM {source}{where}", conn, params=params or None)
+
+    if client_side:
+        print(f"🧮 Filtering {table_name} client side: {[p['text'] for p in client_side]}")
+        df = apply_filters_client(df, client_side)
+
+    for text, node, _ in client_expressions:
+        try:
+            mask = evaluate(node, df)
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"⚠️ Could not evaluate filter '{text}' ({e}), loading unfiltered for it")
+            continue
+        print(f"🧮 Filtering {table_name} client side: {text}")
+        df = df[pd.Series(mask, index=df.index).fillna(False).astype(bool)]
+
+    return df
+
+
+def _optional_tables(joins):
+    """Tables on the optional side of an outer JOIN, plus whatever is joined through them:
+    filtering those before the join changes which rows the join keeps"""
+
+    optional = set()
+    for j in joins:
+        left, right = j["left_table"].lower(), j["right_table"].lower()
+        optional |= {"left": {right}, "right": {left}, "full": {left, right}}.get(j["join_type"], set())
+
+    frontier = set(optional)
+    while frontier:
+        frontier = {j["right_table"].lower() for j in joins if j["left_table"].lower() in frontier} - optional
+        optional |= frontier
+    return optional
+
+
+def sql_predicates(fex_content):
+    """Record-level FEX filters that are safe to push into a table load. Unqualified
+    fields belong to the request's TABLE FILE table; outer-joined tables are never filtered"""
+
+    if count_requests(fex_content) > 1:
+        print("ℹ️ FEX has several requests with their own filters, loading tables unfiltered")
+        return [], []
+
+    parsed = parse_fex(fex_content)
+    if not parsed["requests"]:
+        return [], []
+    request = parsed["requests"][0]
+    host = request["file"]
+    optional = _optional_tables(parsed["joins"])
+
+    predicates, skipped = collect_predicates(request["filters"])
+
+    # filters SQL can't express run in pandas after the load, on the host table only
+    expressions = []
+    for text in skipped:
+        tokens = tokenize(text)
+        names = expression_identifiers(tokens)
+        tables = {n.rpartition(".")[0].lower() for n in names} - {""}
+        try:
+            node = parse_expression(tokens)
+        except ValueError:
+            node = None
+        if node is None or "&" in text or not host or tables - {host.lower()} or host.lower() in optional:
+            print(f"⚠️ Could not translate filter, loading unfiltered for it: {text}")
+            continue
+        expressions.append((host, text, node, names))
+
+    bound = []
+    for pred in predicates:
+        table = pred["table"] or host
+        if not table:
+            continue
+        if table.lower() in optional:
+            print(f"ℹ️ Not pushing down '{pred['text']}': {table} is on the optional side of an outer JOIN")
+            continue
+        bound.append(dict(pred, table=table))
+    return bound, expressions
+
+
+def connect_sql():
 
     print("\n🗄️ SQL Mode Selected")
     creds = load_sql_creds()
@@ -47,6 +210,10 @@ def handle_sql_flow(fex_content, metadata, metadata_df):
 
     conn = build_sql_connections(creds)
     print("✅ Database connection successful!")
+    return conn, db_type
+
+
+def prompt_sql_tables():
     while True:
         table_input = input("\nEnter table name(s) separated by comma: ").strip()
         tables = [t.strip() for t in table_input.split(",") if t.strip()]
@@ -55,14 +222,22 @@ def handle_sql_flow(fex_content, metadata, metadata_df):
             print("❌ Enter at least one table name")
             continue
 
-        break
-    tables_dict = {}
+        return tables
+
+
+def load_sql_tables(conn, tables, db_type, filters=None, refs=None, memory_budget_mb=None):
+    tables_dict = TableStore(memory_budget_mb)
 
     for table in tables:
         print(f"\n📥 Loading table: {table}")
-        df = load_table(conn, table, db_type)
+        df = load_table(conn, table, db_type, filters, refs)
         print(f"👍 Loaded {len(df)} rows, {len(df.columns)} columns")
         tables_dict[table] = df
+
+    return tables_dict
+
+
+def validate_sql_tables(tables_dict, metadata, metadata_df):
     raw_meta_cols = metadata.get("output_columns", []) or []
     metadata_columns = []
 
@@ -77,8 +252,8 @@ def handle_sql_flow(fex_content, metadata, metadata_df):
 
 # ---------------- Collect Source Columns ----------------
     all_source_columns = set()
-    for df in tables_dict.values():
-        all_source_columns.update(df.columns)
+    for cols in schema_of(tables_dict).values():
+        all_source_columns.update(cols)
 
     meta_set = {c.lower() for c in metadata_columns if c}
     source_set = {c.lower() for c in all_source_columns}
@@ -103,16 +278,26 @@ def handle_sql_flow(fex_content, metadata, metadata_df):
     semantic_df = semantic_csv_analysis(any_df, metadata_columns)
     print("\n💾 Creating SQL validation report...")
 
-    with pd.ExcelWriter("FEX_SQL_Validation_Report.xlsx", engine="openpyxl") as writer:
+    sheets = [("FEX_Metadata", metadata_df), ("Column_Validation", validation_df)]
+    if not semantic_df.empty:
+        sheets.append(("Semantic_Analysis", semantic_df))
+
+    write_report("FEX_SQL_Validation_Report.xlsx", sheets, label="SQL Validation Report")
 
-        if metadata_df is not None:
-            metadata_df.to_excel(writer, sheet_name="FEX_Metadata", index=False)
+    return any_df, matched
 
-        validation_df.to_excel(writer, sheet_name="Column_Validation", index=False)
 
-        if not semantic_df.empty:
-            semantic_df.to_excel(writer, sheet_name="Semantic_Analysis", index=False)
+def handle_sql_flow(fex_content, metadata, metadata_df):
+
+    conn, db_type = connect_sql()
+    tables = prompt_sql_tables()
+    tables_dict = load_sql_tables(
+        conn, tables, db_type,
+        sql_predicates(fex_content),
+        referenced_columns(fex_content, metadata),
+    )
 
-    print("✅ SQL Validation Report Generated: FEX_SQL_Validation_Report.xlsx")
+    any_df, matched = validate_sql_tables(tables_dict, metadata, metadata_df)
 
     return any_df, matched, tables_dict
+
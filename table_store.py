@@ -0,0 +1,218 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+SPILL_DIR = ".table_spill"
+MEMORY_BUDGET_MB = 2048
+# overrides MEMORY_BUDGET_MB for stores created without an explicit budget (main.py --memory-budget=MB)
+MEMORY_BUDGET_ENV = "FEXA_MEMORY_BUDGET_MB"
+CATEGORY_RATIO = 0.5
+
+
+def default_memory_budget():
+    value = os.environ.get(MEMORY_BUDGET_ENV, "").strip()
+    if not value:
+        return MEMORY_BUDGET_MB
+    try:
+        return float(value)
+    except ValueError:
+        print(f"⚠️ Ignoring {MEMORY_BUDGET_ENV}={value!r}, using {MEMORY_BUDGET_MB} MB")
+        return MEMORY_BUDGET_MB
+
+
+def schema_of(tables):
+    """Column names per table; a TableStore answers without rehydrating spilled tables"""
+    if isinstance(tables, TableStore):
+        return tables.schema()
+    return {table: list(df.columns) for table, df in tables.items()}
+
+
+def column_types_of(tables):
+    if isinstance(tables, TableStore):
+        return tables.column_types()
+    return {table: {col: str(dtype) for col, dtype in df.dtypes.items()} for table, df in tables.items()}
+
+
+def frame_memory(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def optimize_frame(df):
+    """Downcasts numerics and shrinks string columns without changing any values"""
+
+    out = {}
+    for col in df.columns:
+        s = df[col]
+
+        if pd.api.types.is_integer_dtype(s) and not pd.api.types.is_extension_array_dtype(s):
+            s = pd.to_numeric(s, downcast="integer")
+
+        elif pd.api.types.is_float_dtype(s):
+            small = s.astype("float32")
+            # only keep float32 when it round-trips, measures must stay exact
+            if ((small.astype("float64") == s) | s.isna()).all():
+                s = small
+
+        elif s.dtype == object or pd.api.types.is_string_dtype(s):
+            # a string dtype (Arrow CSV reader) needs no per-value check for mixed objects
+            if s.dtype == object:
+                non_null = s.dropna()
+                if len(non_null) and not non_null.map(lambda v: isinstance(v, str)).all():
+                    out[col] = s
+                    continue
+
+            if len(s) and s.nunique(dropna=True) / len(s) <= CATEGORY_RATIO:
+                s = s.astype("category")
+            elif HAS_PYARROW:
+                s = s.astype("string[pyarrow]")
+
+        out[col] = s
+
+    return pd.DataFrame(out, index=df.index)
+
+
+class TableStore(MutableMapping):
+    """dict-like table holder that optimises frames on load and spills LRU tables to disk"""
+
+    def __init__(self, memory_budget_mb=None, spill_dir=SPILL_DIR):
+        if memory_budget_mb is None:
+            memory_budget_mb = default_memory_budget()
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.spill_dir = spill_dir
+        self._frames = OrderedDict()
+        self._spilled = {}
+        self._columns = {}
+        self._stats = {}
+        self._lock = threading.RLock()
+
+    def __setitem__(self, name, df):
+        with self._lock:
+            before = frame_memory(df)
+            df = optimize_frame(df)
+            after = frame_memory(df)
+
+            self._drop_spill(name)
+            self._frames[name] = df
+            self._frames.move_to_end(name)
+            self._columns[name] = {col: str(dtype) for col, dtype in df.dtypes.items()}
+            self._stats[name] = {"rows": len(df), "before": before, "after": after}
+
+            print(
+                f"🗜️ {name}: {before / 1048576:.1f} MB → {after / 1048576:.1f} MB in memory"
+            )
+            self._enforce_budget(keep=name)
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name in self._frames:
+                self._frames.move_to_end(name)
+                return self._frames[name]
+
+            if name not in self._spilled:
+                raise KeyError(name)
+
+            df = self._rehydrate(name)
+            self._frames[name] = df
+            self._enforce_budget(keep=name)
+            return df
+
+    def __delitem__(self, name):
+        with self._lock:
+            if name not in self._columns:
+                raise KeyError(name)
+            self._frames.pop(name, None)
+            self._drop_spill(name)
+            del self._columns[name]
+            del self._stats[name]
+
+    def __iter__(self):
+        return iter(list(self._columns))
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def schema(self):
+        """Column names per table, without rehydrating spilled tables"""
+        return {name: list(cols) for name, cols in self._columns.items()}
+
+    def column_types(self):
+        """dtype name per column per table, also without rehydrating"""
+        return {name: dict(cols) for name, cols in self._columns.items()}
+
+    def resident_bytes(self):
+        return sum(self._stats[n]["after"] for n in self._frames)
+
+    def _spill_path(self, name):
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(name))
+        # names that sanitise alike ("a b", "a_b") still get their own file
+        digest = hashlib.sha1(str(name).encode("utf-8")).hexdigest()[:8]
+        ext = "parquet" if HAS_PYARROW else "pkl"
+        return os.path.join(self.spill_dir, f"{safe}_{digest}.{ext}")
+
+    def _enforce_budget(self, keep=None):
+        while self.resident_bytes() > self.memory_budget:
+            victim = next((n for n in self._frames if n != keep), None)
+            if victim is None:
+                break
+            self._spill(victim)
+
+    def _spill(self, name):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(name)
+        df = self._frames.pop(name)
+
+        if HAS_PYARROW:
+            df.to_parquet(path)
+        else:
+            df.to_pickle(path)
+
+        self._spilled[name] = path
+        print(f"💽 Spilled '{name}' to {path}")
+
+    def _rehydrate(self, name):
+        path = self._spilled.pop(name)
+        print(f"📤 Rehydrating '{name}' from {path}")
+
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_pickle(path)
+
+        os.remove(path)
+        return df
+
+    def _drop_spill(self, name):
+        path = self._spilled.pop(name, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def memory_report(self):
+        rows = []
+        for name, st in self._stats.items():
+            rows.append({
+                "Table": name,
+                "Rows": st["rows"],
+                "Before MB": round(st["before"] / 1048576, 2),
+                "After MB": round(st["after"] / 1048576, 2),
+                "Saved %": round((1 - st["after"] / st["before"]) * 100, 1) if st["before"] else 0.0,
+                "State": "spilled" if name in self._spilled else "in memory",
+            })
+
+        report = pd.DataFrame(rows)
+        print("\n📏 Table memory (before → after optimisation):")
+        print(report.to_string(index=False) if not report.empty else "  (no tables)")
+        return report
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csvflow  # noqa: E402
+import table_store  # noqa: E402
+
+
+def write_late_accent(path, encoding):
+    rows = "".join(f"{i},plain\n" for i in range(120000))
+    with open(path, "wb") as f:
+        f.write(("ID,NAME\n" + rows).encode("ascii") + "120000,Café\n".encode(encoding))
+
+
+def test_utf8_accent_after_the_encoding_sample(tmp_path):
+    path = tmp_path / "late_utf8.csv"
+    write_late_accent(path, "utf-8")
+
+    df = csvflow.smart_read_csv(str(path))
+
+    assert len(df) == 120001
+    assert df["NAME"].iloc[-1] == "Café"
+
+
+def test_windows_1252_accent_after_the_encoding_sample(tmp_path):
+    path = tmp_path / "late_cp1252.csv"
+    write_late_accent(path, "cp1252")
+
+    df = csvflow.smart_read_csv(str(path))
+
+    assert df["NAME"].iloc[-1] == "Café"
+
+
+def test_semantic_analysis_reads_only_tables_with_matched_columns(tmp_path):
+    store = csvflow.TableStore(memory_budget_mb=0, spill_dir=str(tmp_path))
+    store["ORDERS"] = pd.DataFrame({"ORDER_ID": [1, 2], "ORDER_AMOUNT": [5.0, 6.0]})
+    store["CUSTOMERS"] = pd.DataFrame({"CUSTOMER_ID": [1], "CUSTOMER_NAME": ["Ann"]})
+
+    result = csvflow.semantic_csv_analysis(store, ["CUSTOMER_NAME"])
+
+    assert result["Detected Data Type"].tolist() == ["string"]
+    assert "ORDERS" in store._spilled
+
+
+def test_memory_budget_from_the_environment(monkeypatch):
+    monkeypatch.setenv(table_store.MEMORY_BUDGET_ENV, "64")
+    assert csvflow.TableStore().memory_budget == 64 * 1024 * 1024
+    assert csvflow.TableStore(memory_budget_mb=1).memory_budget == 1024 * 1024
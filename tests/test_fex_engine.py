@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fex_dax import translate_fex  # noqa: E402
+from fex_engine import run_fex_locally  # noqa: E402
+
+
+ORDERS = pd.DataFrame({
+    "REGION": pd.Categorical(["NORTH", "NORTH", "EUROPE", "SOUTH"]),
+    "ORDER_DATE": pd.Categorical(["2022-05-01", "2023-03-01", "2022-01-01", "2024-01-01"]),
+    "ORDER_AMOUNT": [10.0, 20.0, 30.0, 40.0],
+    "COST": [1.0, 3.0, 5.0, 7.0],
+})
+
+
+def run(fex):
+    (df, keys), = run_fex_locally(fex, {"ORDERS": ORDERS})
+    return df, keys
+
+
+def test_ordered_expression_filter_on_categoricals():
+    df, _ = run("""TABLE FILE ORDERS
+PRINT ORDER_AMOUNT
+WHERE ORDER_DATE GE '2023-01-01' OR REGION EQ 'EUROPE';
+END""")
+
+    assert df["ORDER_AMOUNT"].tolist() == [20.0, 30.0, 40.0]
+
+
+def test_bare_compute_operand_is_the_sum_next_to_a_prefixed_aggregate():
+    fex = """TABLE FILE ORDERS
+SUM ORDER_AMOUNT AVE.COST
+BY REGION
+COMPUTE RATIO = ORDER_AMOUNT / COST;
+COMPUTE DOUBLE_AVE = AVE.COST * 2;
+END"""
+    df, keys = run(fex)
+    north = df[df["REGION"] == "NORTH"].iloc[0]
+
+    assert keys == ["REGION"]
+    assert list(df.columns) == ["REGION", "ORDER_AMOUNT", "AVE.COST", "RATIO", "DOUBLE_AVE"]
+    assert north["RATIO"] == 30.0 / 4.0
+    assert north["DOUBLE_AVE"] == 4.0
+
+    measures = {m["name"]: m["expression"] for m in translate_fex(fex)["measures"]}
+    assert measures["RATIO"] == "DIVIDE([Total ORDER_AMOUNT], SUM('ORDERS'[COST]), 0)"
+    assert measures["DOUBLE_AVE"] == "[Average COST] * 2"
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fex_filters import apply_filters_client, parse_filter, predicates_for_table  # noqa: E402
+
+
+STATUS = pd.DataFrame({"STATUS": ["OK", "CANCELLED", None, "OPEN"]})
+
+
+def kept(text, df=STATUS):
+    return apply_filters_client(df, parse_filter(text))["STATUS"].tolist()
+
+
+def test_negated_filters_drop_missing_values_like_sql():
+    assert kept("STATUS NE 'CANCELLED'") == ["OK", "OPEN"]
+    assert kept("STATUS NE 'CANCELLED' OR 'OPEN'") == ["OK"]
+    assert kept("STATUS OMITS 'CANC'") == ["OK", "OPEN"]
+
+
+def test_missing_tests_still_see_missing_values():
+    missing = apply_filters_client(STATUS, parse_filter("STATUS IS MISSING"))["STATUS"]
+    assert len(missing) == 1 and missing.isna().all()
+    assert kept("STATUS IS-NOT MISSING") == ["OK", "CANCELLED", "OPEN"]
+
+
+def test_numeric_looking_literals_follow_the_column_type():
+    df = pd.DataFrame({"AMT": [10, 20, 30], "CODE": ["00123", "123", "9"]})
+
+    assert apply_filters_client(df, parse_filter("CODE EQ 00123"))["CODE"].tolist() == ["00123"]
+    assert apply_filters_client(df, parse_filter("AMT GE 020"))["AMT"].tolist() == [20, 30]
+
+    code, amt = parse_filter("CODE EQ 00123") + parse_filter("AMT GE 020")
+    pushed = predicates_for_table([code, amt], "ORDERS", ["AMT", "CODE"], numeric_columns={"AMT"})
+    assert [p["values"] for p in pushed] == [["00123"], [20]]
@@ -0,0 +1,42 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fex_includes import IncludeResolver  # noqa: E402
+
+
+def write_repo(tmp_path):
+    (tmp_path / "common.fex").write_text("DEFINE FILE ORDERS\nNET/D12.2 = ORDER_AMOUNT - COST;\nEND\n")
+    (tmp_path / "report.fex").write_text(
+        "-INCLUDE common\n-INCLUDE missing_piece\nTABLE FILE ORDERS\nPRINT NET\nEND\n"
+    )
+    return str(tmp_path / "report.fex")
+
+
+def test_cache_is_keyed_on_model_and_schema(tmp_path):
+    root = write_repo(tmp_path)
+    calls = []
+
+    def extract(content):
+        calls.append(content)
+        return {"output_columns": ["NET"]}
+
+    for model, schema in (("gpt-5-nano", {"v": 1}), ("gpt-5-nano", {"v": 1}),
+                          ("gpt-5-mini", {"v": 1}), ("gpt-5-mini", {"v": 2})):
+        IncludeResolver(str(tmp_path), extract, model=model, schema=schema).expanded_metadata(root)
+
+    # two files per extraction; the repeated model and schema is served from the cache
+    assert len(calls) == 2 * 3
+
+
+def test_parallel_resolution_records_each_unresolved_include_once(tmp_path):
+    root = write_repo(tmp_path)
+    resolver = IncludeResolver(str(tmp_path), lambda content: {"output_columns": []})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: resolver.expanded_metadata(root), range(16)))
+
+    assert resolver._unresolved == {root: ["missing_piece"]}
+    assert results[-1]["dependencies"].count("missing_piece (unresolved)") == 1
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fex_minify  # noqa: E402
+
+
+class OfflineTiktoken:
+    def encoding_for_model(self, model):
+        raise KeyError(model)
+
+    def get_encoding(self, name):
+        raise ConnectionError("could not download o200k_base")
+
+
+def test_token_count_falls_back_when_the_encoding_cannot_download(monkeypatch):
+    monkeypatch.setattr(fex_minify, "tiktoken", OfflineTiktoken())
+    monkeypatch.setattr(fex_minify, "_ENCODINGS", {})
+
+    reduced, stats = fex_minify.prepare_fex_for_prompt("TABLE FILE ORDERS\nPRINT ORDER_ID\nEND\n", model="offline")
+
+    assert stats["reduced_tokens"] == (len(reduced) + 3) // 4
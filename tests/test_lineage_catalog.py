@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lineage_catalog import LineageCatalog, lineage_rows, ANY_TABLE  # noqa: E402
+
+
+JOINED = """JOIN CUSTOMER_ID IN ORDERS TO CUSTOMER_ID IN CUSTOMERS AS J1
+TABLE FILE ORDERS
+PRINT CUSTOMER_NAME ORDER_AMOUNT
+BY REGION
+END
+"""
+
+SINGLE = """TABLE FILE ORDERS
+PRINT ORDER_AMOUNT
+END
+"""
+
+
+def test_unqualified_fields_of_a_joined_request_match_any_table():
+    columns = lineage_rows(JOINED)["columns"]
+
+    assert (ANY_TABLE, "CUSTOMER_NAME", "output") in columns
+    assert ("ORDERS", "CUSTOMER_NAME", "output") not in columns
+
+
+def test_unqualified_fields_without_joins_stay_on_the_host_table():
+    assert ("ORDERS", "ORDER_AMOUNT", "output") in lineage_rows(SINGLE)["columns"]
+
+
+def test_impact_finds_columns_of_joined_tables(tmp_path):
+    fex = tmp_path / "joined.fex"
+    fex.write_text(JOINED)
+    catalog = LineageCatalog(str(tmp_path / "lineage.db"))
+    catalog.index_paths([str(fex)])
+
+    assert len(catalog.impact("CUSTOMERS", "CUSTOMER_NAME")) == 1
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reconcile import reconcile  # noqa: E402
+
+
+def test_numeric_by_fields_are_keys():
+    expected = pd.DataFrame({"YEAR": [2022, 2023, 2024], "ORDER_AMOUNT": [10.0, 20.0, 30.0]})
+    actual = pd.DataFrame({"YEAR": [2024, 2023, 2022], "ORDER_AMOUNT": [30.0, 25.0, 10.0]})
+
+    summary, mismatches = reconcile(expected, actual, key_cols=["YEAR"])
+
+    assert summary["Status"] == "MISMATCH"
+    assert summary["Key Columns"] == "YEAR"
+    assert summary["Keys Compared"] == 3
+    assert summary["Keys Matched"] == 2
+    assert summary["Value Mismatches"] == 1
+    assert mismatches["YEAR"].tolist() == ["2023.0"]
+
+
+def test_numeric_keys_match_across_int_and_float():
+    expected = pd.DataFrame({"ORDER_ID": [1, 2, 3], "ORDER_AMOUNT": [5.0, 6.0, 7.0]})
+    actual = pd.DataFrame({"ORDER_ID": [1.0, 2.0, 3.0], "ORDER_AMOUNT": [5.0, 6.0, 7.0]})
+
+    summary, _ = reconcile(expected, actual, key_cols=["ORDER_ID"])
+
+    assert summary["Status"] == "MATCH"
+    assert summary["Keys Compared"] == summary["Keys Matched"] == 3
+
+
+def test_grand_total_without_keys_is_compared():
+    expected = pd.DataFrame({"ORDER_AMOUNT": [100.0]})
+    actual = pd.DataFrame({"ORDER_AMOUNT": [200.0]})
+
+    summary, _ = reconcile(expected, actual, key_cols=[])
+
+    assert summary["Status"] == "MISMATCH"
+    assert summary["Keys Compared"] == 1
+    assert summary["Keys Matched"] == 0
+
+
+def test_keyless_multi_row_output_is_compared_as_one_total():
+    expected = pd.DataFrame({"QUANTITY": [1, 2], "ORDER_AMOUNT": [10.0, 20.0]})
+
+    summary, _ = reconcile(expected, expected.copy(), key_cols=[])
+    assert summary["Status"] == "MATCH"
+    assert summary["Keys Compared"] == summary["Keys Matched"] == 1
+
+    changed = expected.assign(ORDER_AMOUNT=[10.0, 21.0])
+    summary, _ = reconcile(expected, changed, key_cols=[])
+    assert summary["Status"] == "MISMATCH"
+
+
+def test_identical_partitions_count_distinct_keys():
+    expected = pd.DataFrame({"REGION": ["N", "N", "S"], "ORDER_AMOUNT": [1.0, 2.0, 3.0]})
+
+    summary, _ = reconcile(expected, expected.copy())
+
+    assert summary["Identical Partitions"] == summary["Partitions"]
+    assert summary["Keys Compared"] == summary["Keys Matched"] == 2